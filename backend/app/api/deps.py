@@ -0,0 +1,23 @@
+from app.services.evaluation import EvaluationService
+from app.services.orchestrator import QueryOrchestrator
+from app.services.supabase_service import SupabaseService
+
+# One instance of each per worker process, shared by every router. Anything
+# that must be consistent across workers lives in the state backend.
+_supabase_service = None
+_orchestrator = None
+
+def get_supabase_service() -> SupabaseService:
+    global _supabase_service
+    if _supabase_service is None:
+        _supabase_service = SupabaseService()
+    return _supabase_service
+
+def get_orchestrator() -> QueryOrchestrator:
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = QueryOrchestrator(supabase_service=get_supabase_service())
+    return _orchestrator
+
+def get_evaluation_service() -> EvaluationService:
+    return get_orchestrator().evaluation_service
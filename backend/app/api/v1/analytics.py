@@ -1,13 +1,15 @@
+import asyncio
+from collections import Counter
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 
-from app.services.supabase_service import SupabaseService
+from app.api.deps import get_supabase_service, get_evaluation_service
 
 router = APIRouter()
 
-# Initialize Supabase service
-supabase_service = SupabaseService()
+# Shared Supabase service
+supabase_service = get_supabase_service()
 
 @router.get("/trends")
 async def get_analytics_trends(days: int = 30):
@@ -127,19 +129,38 @@ async def get_query_metrics(query_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get query metrics: {str(e)}")
 
+async def _compute_query_metrics(query_id: str, metrics: List[str]):
+    """Compute only the named metrics over a query's answered responses"""
+    query = await supabase_service.get_query(query_id)
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+    
+    responses = [
+        {'id': str(r.id), 'response_text': r.text, 'provider': r.provider, 'model': r.model}
+        for r in await supabase_service.get_responses_for_query(query_id)
+        if r.text
+    ]
+    # Metrics are CPU-bound; keep them off the event loop
+    context = await asyncio.to_thread(
+        get_evaluation_service().compute_metrics, responses, metrics, query.category
+    )
+    return responses, context
+
 @router.get("/queries/{query_id}/similarity")
 async def get_similarity_analysis(query_id: str):
     """Get similarity analysis for a query"""
     try:
-        # For now, return basic similarity data
-        # TODO: Implement similarity analysis using evaluation metrics
+        responses, context = await _compute_query_metrics(query_id, ["similarity"])
+        similarity = context["similarity"]
         return {
             "query_id": query_id,
-            "similarity_matrix": [],
-            "providers": [],
-            "average_similarity": 0.0
+            "similarity_matrix": similarity["similarity_matrix"] if len(responses) >= 2 else [],
+            "providers": [r['provider'] for r in responses],
+            "average_similarity": similarity["average_similarity"] if len(responses) >= 2 else 0.0
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get similarity analysis: {str(e)}")
 
@@ -147,18 +168,27 @@ async def get_similarity_analysis(query_id: str):
 async def get_keyword_analysis(query_id: str):
     """Get keyword analysis for a query"""
     try:
-        # For now, return basic keyword data
-        # TODO: Implement keyword analysis using evaluation metrics
+        _, context = await _compute_query_metrics(query_id, ["keywords"])
+        
+        # Number of responses mentioning each keyword, tool and SEO term
+        keywords, tools, seo_terms = Counter(), Counter(), Counter()
+        for analysis in context["keywords"]:
+            keywords.update(analysis['keywords'])
+            tools.update(analysis['tools'])
+            seo_terms.update(analysis['seo_terms'])
+        
         return {
             "query_id": query_id,
-            "keywords": {},
-            "tools": {},
-            "seo_terms": {},
-            "total_keywords": 0,
-            "total_tools": 0,
-            "total_seo_terms": 0
+            "keywords": dict(keywords.most_common()),
+            "tools": dict(tools.most_common()),
+            "seo_terms": dict(seo_terms.most_common()),
+            "total_keywords": len(keywords),
+            "total_tools": len(tools),
+            "total_seo_terms": len(seo_terms)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get keyword analysis: {str(e)}")
 
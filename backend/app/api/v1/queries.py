@@ -1,47 +1,199 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Header, Request, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from uuid import UUID
 
 from app.schemas.query import QueryCreate, QueryResponse, QueryStatus, QueryUpdate
 from app.schemas.response import QueryResults
-from app.services.orchestrator import QueryOrchestrator
-from app.services.supabase_service import SupabaseService
+from app.schemas.sweep import SweepCreate, SweepResponse, SweepResults
+from app.api.deps import get_orchestrator, get_supabase_service
+from app.services.idempotency import IdempotencyStore, request_fingerprint, IN_PROGRESS
+from app.services.batch import parse_batch_items, stream_batch_progress, BatchParseError
+from app.services.query_state import InvalidTransition, can_transition
+from app.core.config import settings
 
 router = APIRouter()
 
-# Initialize Supabase service
-supabase_service = SupabaseService()
+# Shared Supabase service
+supabase_service = get_supabase_service()
 
-# Lazy initialization of orchestrator
-_orchestrator = None
-
-def get_orchestrator():
-    global _orchestrator
-    if _orchestrator is None:
-        _orchestrator = QueryOrchestrator()
-    return _orchestrator
+# Idempotency keys for query submission
+idempotency_store = IdempotencyStore()
 
 @router.post("/", response_model=QueryResponse)
 async def create_query(
     query_data: QueryCreate,
-    background_tasks: BackgroundTasks
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Create a new query and start processing"""
+    """Create a new query and start processing
+    
+    Requests repeated with the same Idempotency-Key return the original query
+    instead of creating and processing a new one.
+    """
+    scope = query_data.user_id or "anonymous"
+    fingerprint = request_fingerprint(query_data.model_dump())
+    reserved = False
+    
     try:
+        if idempotency_key:
+            existing = await idempotency_store.reserve(scope, idempotency_key, fingerprint)
+            if existing:
+                if existing.get("fingerprint") != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+                if existing.get("status") == IN_PROGRESS:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="A request with this Idempotency-Key is still being processed",
+                        headers={"Retry-After": "1"}
+                    )
+                return QueryResponse(**existing["response"])
+            reserved = True
+        
         # Get orchestrator
         orchestrator = get_orchestrator()
         
-        # Create query in Supabase
-        query = await orchestrator.create_query(query_data)
+        # Reject new work while the system is overloaded
+        decision = orchestrator.admission.try_admit()
+        if not decision.admitted:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is overloaded ({decision.reason}), please retry later",
+                headers={"Retry-After": str(decision.retry_after)}
+            )
+        
+        try:
+            # Create query in Supabase
+            query = await orchestrator.create_query(query_data)
+        except Exception:
+            orchestrator.admission.release(decision.ticket)
+            raise
+        
+        if reserved:
+            await idempotency_store.complete(scope, idempotency_key, fingerprint, query.model_dump(mode="json"))
+            reserved = False
         
-        # Start processing in background
-        background_tasks.add_task(orchestrator.process_query, query.id, query_data.providers)
+        # Queue for processing behind the fair-share scheduler
+        orchestrator.scheduler.submit(
+            query.id,
+            query_data.providers,
+            user_id=query_data.user_id,
+            priority=query_data.priority,
+            ticket=decision.ticket
+        )
         
         return query
         
+    except HTTPException:
+        if reserved:
+            await idempotency_store.release(scope, idempotency_key)
+        raise
     except Exception as e:
+        if reserved:
+            await idempotency_store.release(scope, idempotency_key)
         raise HTTPException(status_code=500, detail=f"Failed to create query: {str(e)}")
 
+@router.post("/batch")
+async def create_query_batch(
+    request: Request,
+    category: Optional[str] = None,
+    user_id: Optional[str] = None,
+    providers: List[str] = Query(default=[])
+):
+    """Submit many queries at once from a JSONL or CSV body
+    
+    Every line needs a prompt and may set category, tags and providers; the
+    query parameters fill in whatever a line leaves out. The response streams
+    NDJSON: a batch header, then an item line per finished query followed by
+    the aggregate progress.
+    """
+    try:
+        defaults = {"providers": providers}
+        if category:
+            defaults["category"] = category
+        if user_id:
+            defaults["user_id"] = user_id
+        
+        try:
+            queries_data = parse_batch_items(await request.body(), request.headers.get("content-type"), defaults)
+        except (BatchParseError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid batch: {str(e)}")
+        
+        if not queries_data:
+            raise HTTPException(status_code=422, detail="Batch contains no queries")
+        if len(queries_data) > settings.max_batch_size:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.max_batch_size} queries")
+        
+        orchestrator = get_orchestrator()
+        
+        # Every query of the batch takes a queue slot
+        decision = orchestrator.admission.try_admit(slots=len(queries_data))
+        if not decision.admitted:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is overloaded ({decision.reason}), please retry later",
+                headers={"Retry-After": str(decision.retry_after)}
+            )
+        
+        batch_id, queries, jobs = await orchestrator.submit_batch(queries_data, ticket=decision.ticket)
+        
+        return StreamingResponse(
+            stream_batch_progress(orchestrator, batch_id, queries, jobs),
+            media_type="application/x-ndjson",
+            headers={"X-Batch-Id": batch_id}
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create query batch: {str(e)}")
+
+@router.post("/sweeps", response_model=SweepResponse)
+async def create_sweep(sweep: SweepCreate):
+    """Run prompts across a grid of providers, models and generation settings"""
+    try:
+        orchestrator = get_orchestrator()
+        
+        try:
+            plan = orchestrator.plan_sweep(sweep)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        # Every prompt of the sweep becomes a query and takes a queue slot
+        prompts, _, _ = plan
+        decision = orchestrator.admission.try_admit(slots=len(prompts))
+        if not decision.admitted:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is overloaded ({decision.reason}), please retry later",
+                headers={"Retry-After": str(decision.retry_after)}
+            )
+        
+        try:
+            return await orchestrator.submit_sweep(sweep, ticket=decision.ticket, plan=plan)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create sweep: {str(e)}")
+
+@router.get("/sweeps/{sweep_id}", response_model=SweepResults)
+async def get_sweep_results(sweep_id: str):
+    """Get the comparison table of a sweep, one row per cell"""
+    try:
+        orchestrator = get_orchestrator()
+        results = await orchestrator.get_sweep_results(sweep_id)
+        if not results:
+            raise HTTPException(status_code=404, detail="Sweep not found")
+        
+        return results
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get sweep results: {str(e)}")
+
 @router.get("/{query_id}", response_model=QueryResponse)
 async def get_query(query_id: str):
     """Get a specific query by ID"""
@@ -102,7 +254,9 @@ async def update_query(
         
         # Update allowed fields using Supabase
         update_data = {}
-        if query_update.status is not None:
+        if query_update.status is not None and query_update.status != query.status:
+            if not can_transition(query.status, query_update.status):
+                raise HTTPException(status_code=409, detail=f"Query cannot move from '{query.status}' to '{query_update.status}'")
             update_data["status"] = query_update.status
         if query_update.prompt is not None:
             update_data["prompt"] = query_update.prompt
@@ -110,9 +264,8 @@ async def update_query(
             update_data["category"] = query_update.category
         if query_update.tags is not None:
             update_data["tags"] = query_update.tags
-        # Note: providers field is not stored in database, so we skip it
-        # if query_update.providers is not None:
-        #     update_data["providers"] = query_update.providers
+        if query_update.providers is not None:
+            update_data["providers"] = query_update.providers
         
         if update_data:
             # Add updated_at timestamp
@@ -135,32 +288,70 @@ async def update_query(
         raise HTTPException(status_code=500, detail=f"Failed to update query: {str(e)}")
 
 @router.post("/{query_id}/retry")
-async def retry_query(
-    query_id: str,
-    background_tasks: BackgroundTasks
-):
-    """Retry processing a failed query"""
+async def retry_query(query_id: str):
+    """Retry the providers of a query that errored or never responded"""
     try:
-        query = await supabase_service.get_query(query_id)
-        if not query:
+        orchestrator = get_orchestrator()
+        
+        decision = orchestrator.admission.try_admit()
+        if not decision.admitted:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is overloaded ({decision.reason}), please retry later",
+                headers={"Retry-After": str(decision.retry_after)}
+            )
+        
+        try:
+            providers = await orchestrator.retry_query(query_id)
+        except Exception:
+            orchestrator.admission.release(decision.ticket)
+            raise
+        
+        if providers is None:
+            orchestrator.admission.release(decision.ticket)
             raise HTTPException(status_code=404, detail="Query not found")
         
-        # Reset status and start processing
-        await supabase_service.update_query_status(query_id, "pending")
+        if not providers:
+            orchestrator.admission.release(decision.ticket)
+            return {"message": "All providers already succeeded", "query_id": query_id, "providers": []}
         
-        # Start processing in background
-        orchestrator = get_orchestrator()
-        # For retry, we'll use the providers from the original query creation
-        # This is a simplified approach - in a real app, you might want to store providers
-        background_tasks.add_task(orchestrator.process_query, query_id, ["openai", "anthropic"])
+        # Queue only the failed providers, for the query's owner and in its original class
+        try:
+            query = await orchestrator.supabase_service.get_query(query_id)
+            orchestrator.resubmit(query, providers, ticket=decision.ticket)
+        except Exception:
+            orchestrator.admission.release(decision.ticket)
+            raise
         
-        return {"message": "Query retry started", "query_id": query_id}
+        return {"message": "Query retry started", "query_id": query_id, "providers": providers}
         
     except HTTPException:
         raise
+    except InvalidTransition as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retry query: {str(e)}")
 
+@router.delete("/{query_id}")
+@router.post("/{query_id}/cancel")
+async def cancel_query(query_id: str):
+    """Cancel a query and stop its in-flight provider calls"""
+    try:
+        orchestrator = get_orchestrator()
+        cancelled = await orchestrator.cancel_query(query_id)
+        if cancelled is None:
+            raise HTTPException(status_code=404, detail="Query not found")
+        
+        if not cancelled:
+            raise HTTPException(status_code=409, detail="Query has already finished")
+        
+        return {"message": "Query cancelled", "query_id": query_id}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel query: {str(e)}")
+
 @router.get("/", response_model=List[QueryResponse])
 async def list_queries(skip: int = 0, limit: int = 100):
     """List all queries with pagination"""
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, HTTPException
+from typing import List
+
+from app.schemas.recurring import RecurringQueryCreate, RecurringQueryUpdate, RecurringQueryResponse, DriftReport
+from app.services.recurring import next_run_time
+from app.api.deps import get_orchestrator, get_supabase_service
+
+router = APIRouter()
+
+# Shared Supabase service
+supabase_service = get_supabase_service()
+
+@router.post("/", response_model=RecurringQueryResponse)
+async def create_recurring_query(recurring_data: RecurringQueryCreate):
+    """Create a query that reruns on a schedule to track drift"""
+    try:
+        orchestrator = get_orchestrator()
+        return await orchestrator.recurring.create(recurring_data)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create recurring query: {str(e)}")
+
+@router.get("/", response_model=List[RecurringQueryResponse])
+async def list_recurring_queries(skip: int = 0, limit: int = 100):
+    """List recurring queries with pagination"""
+    try:
+        return await supabase_service.get_recurring_queries(limit=limit, offset=skip)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list recurring queries: {str(e)}")
+
+@router.get("/{recurring_id}", response_model=RecurringQueryResponse)
+async def get_recurring_query(recurring_id: str):
+    """Get a recurring query by ID"""
+    try:
+        recurring = await supabase_service.get_recurring_query(recurring_id)
+        if not recurring:
+            raise HTTPException(status_code=404, detail="Recurring query not found")
+        return recurring
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get recurring query: {str(e)}")
+
+@router.patch("/{recurring_id}", response_model=RecurringQueryResponse)
+async def update_recurring_query(recurring_id: str, recurring_update: RecurringQueryUpdate):
+    """Change the interval of a recurring query or pause/resume it"""
+    try:
+        recurring = await supabase_service.get_recurring_query(recurring_id)
+        if not recurring:
+            raise HTTPException(status_code=404, detail="Recurring query not found")
+        
+        update_data = {}
+        if recurring_update.enabled is not None:
+            update_data["enabled"] = recurring_update.enabled
+        if recurring_update.interval_seconds is not None:
+            update_data["interval_seconds"] = recurring_update.interval_seconds
+            # Reschedule from the last run so a shorter interval takes effect now
+            last_run = recurring.last_run_at or recurring.created_at
+            update_data["next_run_at"] = next_run_time(recurring_update.interval_seconds, last_run.replace(tzinfo=None)).isoformat()
+        
+        if not update_data:
+            return recurring
+        
+        updated = await supabase_service.update_recurring_query(recurring_id, update_data)
+        if not updated:
+            raise HTTPException(status_code=500, detail="Failed to update recurring query")
+        return updated
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update recurring query: {str(e)}")
+
+@router.delete("/{recurring_id}")
+async def disable_recurring_query(recurring_id: str):
+    """Stop a recurring query; its past runs and drift reports are kept"""
+    try:
+        updated = await supabase_service.update_recurring_query(recurring_id, {"enabled": False})
+        if not updated:
+            raise HTTPException(status_code=404, detail="Recurring query not found")
+        return {"message": "Recurring query disabled", "recurring_id": recurring_id}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to disable recurring query: {str(e)}")
+
+@router.get("/{recurring_id}/drift", response_model=List[DriftReport])
+async def get_drift_reports(recurring_id: str, limit: int = 50):
+    """Get the drift between consecutive runs, most recent first"""
+    try:
+        recurring = await supabase_service.get_recurring_query(recurring_id)
+        if not recurring:
+            raise HTTPException(status_code=404, detail="Recurring query not found")
+        return await supabase_service.get_drift_reports(recurring_id, limit=limit)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get drift reports: {str(e)}")
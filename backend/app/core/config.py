@@ -41,6 +41,64 @@ class Settings(BaseSettings):
     # Rate Limiting
     rate_limit_per_hour: int = 100
     
+    # Deployment: worker processes and where they share state ("redis" or "memory")
+    workers: int = 1
+    state_backend: str = "redis"
+    state_sync_seconds: float = 1.0
+    state_retry_seconds: float = 1.0  # first back-off before retrying an unreachable Redis
+    state_retry_max_seconds: float = 30.0
+    
+    # Admission Control
+    max_queue_depth: int = 50
+    max_inflight_provider_calls: int = 100
+    max_upstream_throttle_rate: float = 0.5
+    throttle_window_seconds: int = 60
+    
+    # Scheduling
+    max_concurrent_queries: int = 8
+    interactive_reserved_slots: int = 2
+    user_weights: dict = {}  # user_id -> share, users not listed get 1.0
+    
+    # Bulk submission
+    max_batch_size: int = 5000
+    
+    # Parameter sweeps
+    max_sweep_cells: int = 1000
+    sweep_max_concurrency: int = 8
+    
+    # Cancellation
+    cancellation_poll_seconds: float = 2.0
+    cancellation_ttl_seconds: int = 3600
+    
+    # Query status: provider progress is batched into one write per query per flush
+    status_flush_seconds: float = 0.5
+    
+    # Shutdown: running queries get this long to finish before they are handed
+    # off; workers look for handed-off queries every recovery_poll_seconds
+    shutdown_drain_seconds: float = 30.0
+    recovery_poll_seconds: float = 30.0
+    
+    # Idempotency keys for query submission
+    idempotency_ttl_seconds: int = 3600
+    
+    # Query pipeline stage overrides, e.g. {"evaluate": {"concurrency": 2, "timeout": 60}}
+    pipeline_stages: dict = {}
+    
+    # Local write-ahead spool for provider responses
+    response_spool_path: str = "data/response_spool.jsonl"
+    response_spool_batch_size: int = 100
+    response_spool_flush_seconds: float = 1.0
+    
+    # Provider latency sketches used for completion estimates
+    latency_sketch_accuracy: float = 0.01
+    latency_flush_seconds: float = 30.0
+    eta_quantile: float = 0.5
+    
+    # Recurring queries and response cache
+    recurring_poll_seconds: float = 30.0
+    recurring_jitter_fraction: float = 0.1
+    response_cache_ttl_seconds: int = 3600
+    
     # LLM Settings
     default_models: dict = {
         "openai": "gpt-4",
@@ -49,9 +107,44 @@ class Settings(BaseSettings):
         "google": "gemini-1.5-pro"
     }
     
+    # Cheap-first mode: fast models tried before default_models
+    cheap_models: dict = {
+        "openai": "gpt-4o-mini",
+        "anthropic": "claude-3-5-haiku-20241022",
+        "perplexity": "sonar",
+        "google": "gemini-1.5-flash"
+    }
+    # A cheap answer below any of these is escalated to the default model;
+    # SEO terms are those of the query category's lexicon, plus SEO tools
+    escalation_min_readability: float = 0.4
+    escalation_min_seo_term_count: int = 2
+    escalation_min_length: int = 400
+    
     # Evaluation Settings
     similarity_threshold: float = 0.8
     max_response_length: int = 4000
+    # Evaluation runs off the event loop: in evaluation_workers processes (unset
+    # shares the cores between server workers, 0 keeps it in threads), or in a
+    # thread for response sets shorter than evaluation_process_min_chars
+    evaluation_workers: Optional[int] = None
+    evaluation_process_min_chars: int = 20000
+    # Evaluations requested within this window, up to this many responses,
+    # run as one batch (0 ms evaluates each query on its own)
+    evaluation_batch_window_ms: float = 5.0
+    evaluation_batch_max_texts: int = 64
+    # Per-text metrics memoized by content hash: recent ones in each worker,
+    # all of them in the state backend for the TTL
+    evaluation_cache_max_entries: int = 10000
+    evaluation_cache_ttl_seconds: int = 86400
+    # Re-evaluation of stored responses (backfill_evaluations.py): responses
+    # read per chunk, write throttle, and how long a stalled run keeps its lock
+    backfill_chunk_size: int = 500
+    backfill_max_rows_per_second: float = 200.0
+    backfill_lock_ttl_seconds: int = 600
+    # SEO lexicons: a versioned JSON file (unset uses app/data/seo_lexicons.json),
+    # checked for changes this often and reloaded without a restart
+    lexicon_path: str = ""
+    lexicon_reload_seconds: float = 10.0
     
     class Config:
         env_file = ".env"
@@ -81,7 +81,7 @@ async def init_db():
     """Initialize database tables"""
     try:
         # Import all models here to ensure they are registered
-        from app.models import query, response, metrics
+        from app.models import query, response, metrics, recurring
         
         # Create all tables using a simpler approach
         async with async_engine.begin() as conn:
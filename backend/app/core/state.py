@@ -0,0 +1,269 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, AsyncIterator
+
+from app.core.config import settings
+from app.core.redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process in shared state; unique across hosts and restarts
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+class MemoryStateBackend:
+    """Process-local state backend for single-worker deployments and tests"""
+    
+    shared = False
+    
+    def __init__(self):
+        self._values: Dict[str, object] = {}
+        self._expires: Dict[str, float] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+    
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+    
+    def _touch(self, key: str, ttl: Optional[int]):
+        if ttl:
+            self._expires[key] = time.monotonic() + ttl
+        else:
+            self._expires.pop(key, None)
+    
+    async def get(self, key: str) -> Optional[str]:
+        return self._values.get(key) if self._alive(key) else None
+    
+    async def set(self, key: str, value: str, ttl: int = None, nx: bool = False) -> bool:
+        if nx and self._alive(key):
+            return False
+        self._values[key] = value
+        self._touch(key, ttl)
+        return True
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+    
+    async def mset(self, values: Dict[str, str], ttl: int = None):
+        for key, value in values.items():
+            await self.set(key, value, ttl=ttl)
+    
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+        self._expires.pop(key, None)
+    
+    async def exists(self, key: str) -> bool:
+        return self._alive(key)
+    
+    async def incr(self, key: str, amount: int = 1, ttl: int = None) -> int:
+        value = int(self._values.get(key, 0) if self._alive(key) else 0) + amount
+        self._values[key] = value
+        if ttl and key not in self._expires:
+            self._touch(key, ttl)
+        return value
+    
+    async def hincrby(self, key: str, fields: Dict[str, int], ttl: int = None):
+        values = self._values.get(key) if self._alive(key) else None
+        if not isinstance(values, dict):
+            values = {}
+            self._values[key] = values
+        for field, amount in fields.items():
+            values[field] = values.get(field, 0) + amount
+        if ttl:
+            self._touch(key, ttl)
+    
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        values = self._values.get(key) if self._alive(key) else None
+        return {field: str(value) for field, value in (values or {}).items()}
+    
+    async def sadd(self, key: str, member: str):
+        members = self._values.get(key) if self._alive(key) else None
+        if not isinstance(members, set):
+            members = set()
+            self._values[key] = members
+        members.add(member)
+    
+    async def srem(self, key: str, member: str):
+        members = self._values.get(key) if self._alive(key) else None
+        if isinstance(members, set):
+            members.discard(member)
+    
+    async def smembers(self, key: str) -> Set[str]:
+        members = self._values.get(key) if self._alive(key) else None
+        return set(members or ())
+    
+    async def publish(self, channel: str, message: str):
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+    
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].discard(queue)
+
+class RedisStateBackend:
+    """State shared by every worker through Redis
+    
+    If Redis cannot be reached, operations fall back to a process-local
+    store, so a single worker keeps working; `shared` reports whether the
+    last operation actually reached Redis. After a failure Redis is only
+    tried again once a back-off has passed, doubling up to
+    settings.state_retry_max_seconds while it stays down, so operations
+    don't each wait for a connection timeout.
+    """
+    
+    def __init__(self):
+        self._fallback = MemoryStateBackend()
+        self.shared = True
+        self._backoff = 0.0
+        self._retry_at = 0.0
+    
+    async def _call(self, operation: str, *args, **kwargs):
+        if not self.shared and time.monotonic() < self._retry_at:
+            return await getattr(self._fallback, operation)(*args, **kwargs)
+        try:
+            redis_client = await get_redis_connection()
+            result = await getattr(self, f"_redis_{operation}")(redis_client, *args, **kwargs)
+            if not self.shared:
+                logger.info("Redis state backend reachable again")
+            self.shared = True
+            self._backoff = 0.0
+            return result
+        except Exception as e:
+            if self.shared:
+                logger.warning(f"Redis unavailable for shared state, using process-local state: {e}")
+            self.shared = False
+            self._backoff = min(max(self._backoff * 2, settings.state_retry_seconds), settings.state_retry_max_seconds)
+            self._retry_at = time.monotonic() + self._backoff
+            return await getattr(self._fallback, operation)(*args, **kwargs)
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call("get", key)
+    
+    async def set(self, key: str, value: str, ttl: int = None, nx: bool = False) -> bool:
+        return await self._call("set", key, value, ttl=ttl, nx=nx)
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return await self._call("mget", keys)
+    
+    async def mset(self, values: Dict[str, str], ttl: int = None):
+        await self._call("mset", values, ttl=ttl)
+    
+    async def delete(self, key: str):
+        await self._call("delete", key)
+    
+    async def exists(self, key: str) -> bool:
+        return await self._call("exists", key)
+    
+    async def incr(self, key: str, amount: int = 1, ttl: int = None) -> int:
+        return await self._call("incr", key, amount, ttl=ttl)
+    
+    async def hincrby(self, key: str, fields: Dict[str, int], ttl: int = None):
+        await self._call("hincrby", key, fields, ttl=ttl)
+    
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return await self._call("hgetall", key)
+    
+    async def sadd(self, key: str, member: str):
+        await self._call("sadd", key, member)
+    
+    async def srem(self, key: str, member: str):
+        await self._call("srem", key, member)
+    
+    async def smembers(self, key: str) -> Set[str]:
+        return await self._call("smembers", key)
+    
+    async def publish(self, channel: str, message: str):
+        await self._call("publish", channel, message)
+    
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        """Yield messages published on a channel by any worker; reconnects after errors"""
+        while True:
+            try:
+                redis_client = await get_redis_connection()
+                pubsub = redis_client.pubsub()
+                await pubsub.subscribe(channel)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            yield message["data"]
+                finally:
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Subscription to {channel} lost, retrying: {e}")
+                await asyncio.sleep(settings.state_sync_seconds)
+    
+    async def _redis_get(self, redis_client, key):
+        return await redis_client.get(key)
+    
+    async def _redis_set(self, redis_client, key, value, ttl=None, nx=False):
+        return bool(await redis_client.set(key, value, ex=ttl, nx=nx))
+    
+    async def _redis_mget(self, redis_client, keys):
+        return await redis_client.mget(keys) if keys else []
+    
+    async def _redis_mset(self, redis_client, values, ttl=None):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+    
+    async def _redis_delete(self, redis_client, key):
+        await redis_client.delete(key)
+    
+    async def _redis_exists(self, redis_client, key):
+        return bool(await redis_client.exists(key))
+    
+    async def _redis_incr(self, redis_client, key, amount=1, ttl=None):
+        value = await redis_client.incrby(key, amount)
+        if ttl and value == amount:
+            await redis_client.expire(key, ttl)
+        return value
+    
+    async def _redis_hincrby(self, redis_client, key, fields, ttl=None):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for field, amount in fields.items():
+                pipe.hincrby(key, field, amount)
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+    
+    async def _redis_hgetall(self, redis_client, key):
+        return await redis_client.hgetall(key)
+    
+    async def _redis_sadd(self, redis_client, key, member):
+        await redis_client.sadd(key, member)
+    
+    async def _redis_srem(self, redis_client, key, member):
+        await redis_client.srem(key, member)
+    
+    async def _redis_smembers(self, redis_client, key):
+        return await redis_client.smembers(key)
+    
+    async def _redis_publish(self, redis_client, channel, message):
+        await redis_client.publish(channel, message)
+
+_state_backend = None
+
+def get_state_backend():
+    """Get the process-wide state backend selected by settings.state_backend"""
+    global _state_backend
+    if _state_backend is None:
+        if settings.state_backend == "memory":
+            _state_backend = MemoryStateBackend()
+        elif settings.state_backend == "redis":
+            _state_backend = RedisStateBackend()
+        else:
+            raise ValueError(f"Unknown state backend: {settings.state_backend}")
+    return _state_backend
@@ -6,7 +6,9 @@ import logging
 
 from app.core.config import settings
 from app.core.supabase import init_supabase
-from app.api.v1 import queries, analytics
+from app.core.state import WORKER_ID
+from app.api.v1 import queries, analytics, recurring
+from app.api.deps import get_orchestrator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,10 +26,15 @@ async def lifespan(app: FastAPI):
         logger.warning(f"⚠️ Supabase initialization failed: {e}")
         logger.info("🔄 Continuing without Supabase connection")
     
+    # Spool replay, shared state sync, recurring queries
+    await get_orchestrator().start()
+    
     yield
     
-    # Shutdown
+    # Shutdown: refuse new queries, let running ones finish within the drain
+    # timeout, hand off the rest and flush spooled responses and status writes
     logger.info("🛑 Shutting down...")
+    await get_orchestrator().stop()
     logger.info("✅ Application shutdown complete")
 
 # Create FastAPI app
@@ -50,6 +57,7 @@ app.add_middleware(
 # Include API routers
 app.include_router(queries.router, prefix="/api/v1/queries", tags=["queries"])
 app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
+app.include_router(recurring.router, prefix="/api/v1/recurring", tags=["recurring"])
 
 @app.get("/")
 async def root():
@@ -65,6 +73,22 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": settings.app_name}
 
+@app.get("/metrics")
+async def metrics():
+    """Load metrics of this worker used for admission control, scheduling and pipeline tuning"""
+    orchestrator = get_orchestrator()
+    return {
+        "worker_id": WORKER_ID,
+        "shared_state": orchestrator.state.shared,
+        "admission": orchestrator.admission.get_metrics(),
+        "scheduler": orchestrator.scheduler.get_metrics(),
+        "pipeline": orchestrator.query_pipeline.get_metrics(),
+        "query_states": orchestrator.states.get_metrics(),
+        "latency": orchestrator.latency.get_metrics(),
+        "evaluation": orchestrator.evaluation_pool.get_metrics(),
+        "lexicon": orchestrator.evaluation_service.lexicon_store.get_metrics()
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -2,5 +2,6 @@
 from .query import Query
 from .response import Response
 from .metrics import EvaluationMetric
+from .recurring import RecurringQuery, DriftReport
 
-__all__ = ["Query", "Response", "EvaluationMetric"] 
\ No newline at end of file
+__all__ = ["Query", "Response", "EvaluationMetric", "RecurringQuery", "DriftReport"] 
\ No newline at end of file
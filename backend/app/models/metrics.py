@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, Float, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, Float, Text, ForeignKey, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -9,6 +9,10 @@ from app.core.database import Base
 
 class EvaluationMetric(Base):
     __tablename__ = "evaluation_metrics"
+    # One row per response and analysis version, so re-evaluations can be upserted
+    __table_args__ = (
+        UniqueConstraint("response_id", "analysis_version", name="uq_evaluation_metrics_response_version"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     query_id = Column(UUID(as_uuid=True), ForeignKey("queries.id"), nullable=False)
@@ -34,7 +38,8 @@ class EvaluationMetric(Base):
     response_complexity = Column(Float)
     
     # Metadata
-    analysis_version = Column(String(20), default="1.0")
+    analysis_version = Column(String(20), default="2.0")
+    lexicon_version = Column(String(50))  # SEO lexicons the keywords, tools and terms were found with
     computed_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -62,5 +67,6 @@ class EvaluationMetric(Base):
             "response_length": self.response_length,
             "response_complexity": self.response_complexity,
             "analysis_version": self.analysis_version,
+            "lexicon_version": self.lexicon_version,
             "computed_at": self.computed_at.isoformat() if self.computed_at else None
         } 
\ No newline at end of file
@@ -15,7 +15,11 @@ class Query(Base):
     category = Column(String(100))
     tags = Column(JSONB, default=list)
     user_id = Column(String(100))
-    status = Column(String(20), default="pending")  # pending, processing, completed, failed
+    providers = Column(JSONB, default=list)
+    batch_id = Column(String(36), index=True)  # set for queries submitted through /batch
+    mode = Column(String(20), default="standard")  # standard, cheap_first
+    status = Column(String(20), default="pending")  # pending, processing, evaluating, completed, failed, cancelled, interrupted
+    provider_states = Column(JSONB, default=dict)  # provider -> pending, running, succeeded, failed, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -34,7 +38,7 @@ class Query(Base):
     @property
     def is_complete(self) -> bool:
         """Check if query processing is complete"""
-        return self.status in ["completed", "failed"]
+        return self.status in ["completed", "failed", "cancelled"]
     
     def to_dict(self):
         """Convert model to dictionary"""
@@ -44,7 +48,11 @@ class Query(Base):
             "category": self.category,
             "tags": self.tags,
             "user_id": self.user_id,
+            "providers": self.providers,
+            "batch_id": self.batch_id,
+            "mode": self.mode,
             "status": self.status,
+            "provider_states": self.provider_states,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "response_count": self.response_count
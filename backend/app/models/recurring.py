@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, Text, DateTime, Integer, Float, Boolean, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.sql import func
+import uuid
+
+from app.core.database import Base
+
+class RecurringQuery(Base):
+    __tablename__ = "recurring_queries"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    prompt = Column(Text, nullable=False)
+    category = Column(String(100))
+    tags = Column(JSONB, default=list)
+    providers = Column(JSONB, default=list)
+    user_id = Column(String(100))
+    interval_seconds = Column(Integer, nullable=False)
+    enabled = Column(Boolean, default=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_run_at = Column(DateTime(timezone=True))
+    last_query_id = Column(String(36))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<RecurringQuery(id={self.id}, interval={self.interval_seconds}s, enabled={self.enabled})>"
+
+class DriftReport(Base):
+    __tablename__ = "drift_reports"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    recurring_query_id = Column(UUID(as_uuid=True), ForeignKey("recurring_queries.id"), nullable=False, index=True)
+    query_id = Column(UUID(as_uuid=True), ForeignKey("queries.id"), nullable=False)
+    previous_query_id = Column(UUID(as_uuid=True), ForeignKey("queries.id"))
+    drift_score = Column(Float)
+    provider_drift = Column(JSONB, default=dict)  # {provider: {component: value}}
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<DriftReport(id={self.id}, query_id={self.query_id}, drift_score={self.drift_score})>"
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Literal
 from datetime import datetime
 from uuid import UUID
 
@@ -8,9 +8,11 @@ class QueryBase(BaseModel):
     category: str = Field(..., description="Category of the query (technical, content, automation, analytics)")
     tags: List[str] = Field(default_factory=list, description="Tags for categorizing the query")
     providers: List[str] = Field(default_factory=list, description="List of LLM providers to query")
+    mode: Literal["standard", "cheap_first"] = Field("standard", description="cheap_first tries each provider's cheap model and escalates only weak answers")
 
 class QueryCreate(QueryBase):
     user_id: Optional[str] = Field(None, description="Optional user identifier")
+    priority: Literal["interactive", "batch"] = Field("interactive", description="Scheduling class; batch work yields to interactive queries")
 
 class QueryUpdate(BaseModel):
     status: Optional[str] = Field(None, description="Query status")
@@ -22,7 +24,9 @@ class QueryUpdate(BaseModel):
 class QueryResponse(QueryBase):
     id: UUID
     user_id: Optional[str]
+    batch_id: Optional[str] = None
     status: str
+    provider_states: Dict[str, str] = Field(default_factory=dict, description="Progress of each provider: pending, running, succeeded, failed or cancelled")
     created_at: datetime
     updated_at: datetime
     response_count: int = 0
@@ -35,6 +39,7 @@ class QueryStatus(BaseModel):
     id: UUID
     status: str
     completed_providers: List[str] = Field(default_factory=list)
+    provider_states: Dict[str, str] = Field(default_factory=dict)
     total_providers: int
     message: Optional[str] = None
     estimated_completion: Optional[datetime] = None
@@ -0,0 +1,39 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+from uuid import UUID
+
+class RecurringQueryCreate(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=10000, description="The query prompt to rerun")
+    category: str = Field(..., description="Category of the query (technical, content, automation, analytics)")
+    tags: List[str] = Field(default_factory=list, description="Tags copied onto every run")
+    providers: List[str] = Field(default_factory=list, description="List of LLM providers to query")
+    user_id: Optional[str] = Field(None, description="Optional user identifier")
+    interval_seconds: int = Field(604800, ge=300, description="Time between runs (default weekly)")
+
+class RecurringQueryUpdate(BaseModel):
+    interval_seconds: Optional[int] = Field(None, ge=300, description="Updated time between runs")
+    enabled: Optional[bool] = Field(None, description="Pause or resume the schedule")
+
+class RecurringQueryResponse(RecurringQueryCreate):
+    id: UUID
+    enabled: bool = True
+    next_run_at: datetime
+    last_run_at: Optional[datetime] = None
+    last_query_id: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class DriftReport(BaseModel):
+    id: UUID
+    recurring_query_id: UUID
+    query_id: UUID
+    previous_query_id: Optional[UUID] = None
+    drift_score: Optional[float] = Field(None, description="Average drift across providers (0.0 none to 1.0 complete)")
+    provider_drift: Dict[str, Dict[str, Any]] = Field(default_factory=dict, description="Drift components per provider")
+    computed_at: datetime
+    
+    class Config:
+        from_attributes = True
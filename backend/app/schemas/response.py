@@ -6,6 +6,8 @@ from uuid import UUID
 class LLMResponse(BaseModel):
     """Schema for LLM response data"""
     id: Optional[str] = Field(None, description="Response ID")
+    provider: Optional[str] = Field(None, description="LLM provider name")
+    model: Optional[str] = Field(None, description="Model name used")
     text: str = Field(..., description="Response text from LLM")
     error: Optional[str] = Field(None, description="Error message if request failed")
     response_time_ms: Optional[int] = Field(None, description="Response time in milliseconds")
@@ -0,0 +1,36 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any
+
+class SweepTarget(BaseModel):
+    provider: str = Field(..., description="LLM provider name")
+    model: Optional[str] = Field(None, description="Model to use; defaults to the provider's configured model")
+
+class GenerationGrid(BaseModel):
+    """Values to try for each generation setting; unset settings use the provider default"""
+    temperature: List[float] = Field(default_factory=list, description="Temperatures to try")
+    top_p: List[float] = Field(default_factory=list, description="top_p values to try")
+    max_tokens: List[int] = Field(default_factory=list, description="max_tokens values to try")
+
+class SweepCreate(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, description="Prompts to run through every cell of the grid")
+    category: str = Field(..., description="Category of the prompts (technical, content, automation, analytics)")
+    tags: List[str] = Field(default_factory=list, description="Tags for categorizing the queries")
+    targets: List[SweepTarget] = Field(..., min_length=1, description="Provider/model combinations to compare")
+    parameters: GenerationGrid = Field(default_factory=GenerationGrid, description="Generation settings grid")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Maximum provider calls running at once")
+    user_id: Optional[str] = Field(None, description="Optional user identifier")
+
+class SweepResponse(BaseModel):
+    sweep_id: str
+    query_ids: List[str]
+    total_cells: int
+    duplicate_cells: int
+    status: str
+
+class SweepResults(BaseModel):
+    """Compact comparison table, one row per cell that produced a response"""
+    sweep_id: str
+    status: str
+    columns: List[str]
+    rows: List[List[Any]]
+    queries: Dict[str, str] = Field(default_factory=dict, description="Status of each query in the sweep")
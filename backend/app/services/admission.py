@@ -0,0 +1,285 @@
+import json
+import math
+import time
+import itertools
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.state import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of recent provider calls before the upstream 429 rate is trusted
+MIN_THROTTLE_SAMPLES = 5
+
+# Provider call outcomes are shared between workers in buckets of this many seconds
+OUTCOME_BUCKET_SECONDS = 5
+
+def is_throttled_error(error: Optional[str]) -> bool:
+    """Check if a provider error message reports upstream rate limiting"""
+    if not error:
+        return False
+    error_lower = error.lower()
+    return '429' in error_lower or 'rate limit' in error_lower or 'too many requests' in error_lower
+
+@dataclass
+class AdmissionDecision:
+    """Result of an admission check"""
+    admitted: bool
+    ticket: Optional[int] = None
+    retry_after: int = 0
+    reason: Optional[str] = None
+
+class AdmissionController:
+    """Decides whether new queries are accepted based on the current load
+    
+    Load is measured by the number of admitted queries that have not finished,
+    the number of provider calls in flight and the share of recent provider
+    calls that were rejected upstream with 429.
+    
+    A ticket can hold several queue slots (a batch reserves one per query);
+    they are released one by one as its queries finish. A request for more
+    slots than the whole queue has is only admitted into an empty queue, so
+    it runs alone instead of never.
+    
+    Queue depth is per worker, since each worker schedules its own queries.
+    Provider calls in flight and upstream 429s are shared with the other
+    workers through the state backend by sync(), because they all use the
+    same provider accounts. Between syncs the last known totals are used.
+    """
+    
+    def __init__(self,
+                 max_queue_depth: int = None,
+                 max_inflight_calls: int = None,
+                 max_throttle_rate: float = None,
+                 throttle_window_seconds: int = None):
+        self.max_queue_depth = max_queue_depth or settings.max_queue_depth
+        self.max_inflight_calls = max_inflight_calls or settings.max_inflight_provider_calls
+        self.max_throttle_rate = max_throttle_rate or settings.max_upstream_throttle_rate
+        self.throttle_window_seconds = throttle_window_seconds or settings.throttle_window_seconds
+        
+        self.inflight_calls = 0
+        self.rejected_total = 0
+        # Set while the worker shuts down; every new query is rejected
+        self.draining = False
+        self._tickets = itertools.count(1)
+        self._admitted: Dict[int, float] = {}  # ticket -> admission time
+        self._slots: Dict[int, int] = {}  # ticket -> queue slots still held
+        self._reserved_slots = 0
+        self._call_outcomes = deque()  # (timestamp, throttled)
+        # Moving average of how long an admitted query takes, seeded with a guess
+        self._avg_query_seconds = 30.0
+        
+        # Cluster view from the last sync
+        self._unsynced_calls = 0
+        self._unsynced_throttled = 0
+        self._other_inflight_calls = 0
+        self._cluster_outcomes: List[Tuple[float, int, int]] = []  # (bucket wall time, calls, throttled)
+        self._last_sync = None
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted queries that have not finished yet"""
+        return self._reserved_slots
+    
+    def try_admit(self, slots: int = 1) -> AdmissionDecision:
+        """Admit new queries if the system has capacity, reserving a slot for each of them"""
+        now = time.monotonic()
+        self._prune_outcomes(now)
+        
+        reason = None
+        retry_after = 0
+        
+        # A worker shutting down sends new work to the others
+        if self.draining:
+            reason = "shutting_down"
+            retry_after = 1
+        
+        if self.queue_depth + slots > self.max_queue_depth and (slots <= self.max_queue_depth or self.queue_depth > 0):
+            reason = "queue_full"
+            retry_after = max(retry_after, self._seconds_until_slot_frees(now))
+        
+        if self.inflight_calls + self._other_inflight_calls >= self.max_inflight_calls:
+            reason = reason or "too_many_provider_calls"
+            retry_after = max(retry_after, self._seconds_until_slot_frees(now))
+        
+        if self.throttle_rate >= self.max_throttle_rate:
+            reason = reason or "upstream_rate_limited"
+            retry_after = max(retry_after, self._seconds_until_throttle_clears(now))
+        
+        if reason:
+            self.rejected_total += 1
+            logger.warning(f"Rejecting query ({reason}), retry after {retry_after}s")
+            return AdmissionDecision(admitted=False, retry_after=max(1, retry_after), reason=reason)
+        
+        ticket = next(self._tickets)
+        self._admitted[ticket] = now
+        self._slots[ticket] = slots
+        self._reserved_slots += slots
+        return AdmissionDecision(admitted=True, ticket=ticket)
+    
+    def release(self, ticket: int, slots: int = None):
+        """Release slots of a ticket as its queries finish, by default all of them"""
+        held = self._slots.get(ticket)
+        if held is None:
+            return
+        slots = held if slots is None else min(slots, held)
+        self._reserved_slots -= slots
+        if slots < held:
+            self._slots[ticket] = held - slots
+            return
+        
+        del self._slots[ticket]
+        started = self._admitted.pop(ticket)
+        # Queries of a multi-slot ticket wait behind each other, so only
+        # single queries say how long a query takes
+        if held == 1:
+            duration = time.monotonic() - started
+            self._avg_query_seconds = 0.8 * self._avg_query_seconds + 0.2 * duration
+    
+    def call_started(self):
+        """Record a provider call being sent"""
+        self.inflight_calls += 1
+    
+    def call_finished(self, throttled: bool = False):
+        """Record a provider call completing and whether it was rate limited upstream"""
+        self.inflight_calls = max(0, self.inflight_calls - 1)
+        now = time.monotonic()
+        self._call_outcomes.append((now, throttled))
+        self._prune_outcomes(now)
+        self._unsynced_calls += 1
+        self._unsynced_throttled += int(throttled)
+    
+    def _has_cluster_view(self) -> bool:
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= 3 * settings.state_sync_seconds
+    
+    def _outcome_counts(self) -> Tuple[int, int]:
+        """Provider calls and upstream 429s in the window, cluster-wide when synced"""
+        if self._has_cluster_view():
+            cutoff = time.time() - self.throttle_window_seconds
+            calls = self._unsynced_calls + sum(c for start, c, _ in self._cluster_outcomes if start >= cutoff)
+            throttled = self._unsynced_throttled + sum(t for start, _, t in self._cluster_outcomes if start >= cutoff)
+            return calls, throttled
+        throttled = sum(1 for _, was_throttled in self._call_outcomes if was_throttled)
+        return len(self._call_outcomes), throttled
+    
+    @property
+    def throttle_rate(self) -> float:
+        """Share of provider calls in the window that hit an upstream 429"""
+        calls, throttled = self._outcome_counts()
+        if calls < MIN_THROTTLE_SAMPLES:
+            return 0.0
+        return throttled / calls
+    
+    async def sync(self, state):
+        """Publish this worker's load and read the other workers'"""
+        interval = settings.state_sync_seconds
+        
+        await state.set(
+            f"admission:worker:{WORKER_ID}",
+            json.dumps({"inflight_calls": self.inflight_calls, "queue_depth": self.queue_depth}),
+            ttl=max(1, math.ceil(3 * interval))
+        )
+        await state.sadd("admission:workers", WORKER_ID)
+        
+        now = time.time()
+        if self._unsynced_calls:
+            calls, throttled = self._unsynced_calls, self._unsynced_throttled
+            self._unsynced_calls = self._unsynced_throttled = 0
+            bucket = int(now // OUTCOME_BUCKET_SECONDS) * OUTCOME_BUCKET_SECONDS
+            await state.hincrby(
+                f"admission:outcomes:{bucket}",
+                {"calls": calls, "throttled": throttled},
+                ttl=self.throttle_window_seconds + OUTCOME_BUCKET_SECONDS
+            )
+        
+        other_inflight = 0
+        for worker_id in await state.smembers("admission:workers"):
+            if worker_id == WORKER_ID:
+                continue
+            snapshot = await state.get(f"admission:worker:{worker_id}")
+            if snapshot is None:
+                # The worker stopped without deregistering
+                await state.srem("admission:workers", worker_id)
+                continue
+            other_inflight += json.loads(snapshot).get("inflight_calls", 0)
+        
+        outcomes = []
+        first_bucket = int((now - self.throttle_window_seconds) // OUTCOME_BUCKET_SECONDS) * OUTCOME_BUCKET_SECONDS
+        for bucket in range(first_bucket, int(now) + 1, OUTCOME_BUCKET_SECONDS):
+            counts = await state.hgetall(f"admission:outcomes:{bucket}")
+            if counts:
+                outcomes.append((float(bucket), int(counts.get("calls", 0)), int(counts.get("throttled", 0))))
+        
+        self._other_inflight_calls = other_inflight
+        self._cluster_outcomes = outcomes
+        self._last_sync = time.monotonic()
+    
+    async def deregister(self, state):
+        """Remove this worker from the shared load figures"""
+        await state.delete(f"admission:worker:{WORKER_ID}")
+        await state.srem("admission:workers", WORKER_ID)
+    
+    def _prune_outcomes(self, now: float):
+        """Forget provider call outcomes older than the window"""
+        cutoff = now - self.throttle_window_seconds
+        while self._call_outcomes and self._call_outcomes[0][0] < cutoff:
+            self._call_outcomes.popleft()
+    
+    def _seconds_until_slot_frees(self, now: float) -> int:
+        """Estimate when the oldest admitted query will finish"""
+        if not self._admitted:
+            return 1
+        oldest = min(self._admitted.values())
+        remaining = oldest + self._avg_query_seconds - now
+        return max(1, math.ceil(remaining))
+    
+    def _seconds_until_throttle_clears(self, now: float) -> int:
+        """Estimate when enough throttled calls leave the window to drop below the limit"""
+        # (seconds until the outcomes leave the window, calls, throttled), oldest first
+        if self._has_cluster_view():
+            wall_now = time.time()
+            outcomes = [
+                (start + OUTCOME_BUCKET_SECONDS + self.throttle_window_seconds - wall_now, calls, throttled)
+                for start, calls, throttled in self._cluster_outcomes
+            ]
+            outcomes.append((self.throttle_window_seconds, self._unsynced_calls, self._unsynced_throttled))
+        else:
+            outcomes = [
+                (timestamp + self.throttle_window_seconds - now, 1, int(was_throttled))
+                for timestamp, was_throttled in self._call_outcomes
+            ]
+        
+        calls = sum(c for _, c, _ in outcomes)
+        throttled = sum(t for _, _, t in outcomes)
+        
+        # Outcomes age out oldest first; find the first expiry that brings
+        # the rate back under the limit
+        for expires_in, expiring_calls, expiring_throttled in outcomes:
+            calls -= expiring_calls
+            throttled -= expiring_throttled
+            if calls < MIN_THROTTLE_SAMPLES or throttled / calls < self.max_throttle_rate:
+                return max(1, math.ceil(expires_in))
+        
+        return self.throttle_window_seconds
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the current load figures"""
+        self._prune_outcomes(time.monotonic())
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "inflight_provider_calls": self.inflight_calls,
+            "cluster_inflight_provider_calls": self.inflight_calls + self._other_inflight_calls,
+            "max_inflight_provider_calls": self.max_inflight_calls,
+            "upstream_throttle_rate": self.throttle_rate,
+            "max_upstream_throttle_rate": self.max_throttle_rate,
+            "recent_provider_calls": self._outcome_counts()[0],
+            "cluster_view": self._has_cluster_view(),
+            "avg_query_seconds": self._avg_query_seconds,
+            "rejected_total": self.rejected_total,
+            "draining": self.draining
+        }
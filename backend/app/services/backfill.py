@@ -0,0 +1,177 @@
+import json
+import time
+import asyncio
+import logging
+from itertools import groupby
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+from app.core.state import get_state_backend, WORKER_ID
+from app.services.evaluation import ANALYSIS_VERSION, TEXT_METRIC_FIELDS
+from app.services.evaluation_pool import EvaluationPool, EvaluationJob
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_KEY_PREFIX = "evaluation_backfill:"
+
+class BackfillLocked(Exception):
+    """Another backfill of the same analysis version is running"""
+
+class EvaluationBackfill:
+    """Recomputes the evaluation metrics of every stored response under the current analysis version
+    
+    Responses are read in chunks of about chunk_size, paginated by query id
+    (keyset, so late chunks cost no more than early ones), and always hold
+    whole queries, since similarity and originality depend on the whole
+    response set. The queries of a chunk are evaluated in parallel on the
+    evaluation pool's processes, and their metric rows upserted in one
+    request on (response_id, analysis_version), so rerunning a chunk
+    replaces its rows instead of duplicating them. Rows of older versions
+    are left in place.
+    
+    After each chunk the last query id is checkpointed in the state backend,
+    so an interrupted run resumes where it stopped. Only one run per
+    analysis version holds the lock at a time, and the run sleeps as needed
+    to stay under max_rows_per_second.
+    """
+    
+    def __init__(self, supabase_service, evaluation_pool: EvaluationPool, state=None,
+                 chunk_size: int = None, max_rows_per_second: float = None,
+                 analysis_version: str = ANALYSIS_VERSION):
+        self.supabase_service = supabase_service
+        self.evaluation_pool = evaluation_pool
+        self.state = state or get_state_backend()
+        self.chunk_size = chunk_size or settings.backfill_chunk_size
+        self.max_rows_per_second = (max_rows_per_second if max_rows_per_second is not None
+                                    else settings.backfill_max_rows_per_second)
+        self.lock_ttl_seconds = settings.backfill_lock_ttl_seconds
+        self.analysis_version = analysis_version
+    
+    @property
+    def checkpoint_key(self) -> str:
+        return f"{BACKFILL_KEY_PREFIX}{self.analysis_version}"
+    
+    @property
+    def lock_key(self) -> str:
+        return f"{BACKFILL_KEY_PREFIX}{self.analysis_version}:lock"
+    
+    async def get_checkpoint(self) -> Dict[str, Any]:
+        """Progress of the backfill of this analysis version"""
+        stored = await self.state.get(self.checkpoint_key)
+        if stored:
+            return json.loads(stored)
+        return {"after_query_id": None, "queries": 0, "responses": 0, "completed": False}
+    
+    async def _save_checkpoint(self, checkpoint: Dict[str, Any]):
+        await self.state.set(self.checkpoint_key, json.dumps(checkpoint))
+    
+    async def _hold_lock(self):
+        """Take the lock, or extend it if this worker already holds it"""
+        if await self.state.set(self.lock_key, WORKER_ID, ttl=self.lock_ttl_seconds, nx=True):
+            return
+        if await self.state.get(self.lock_key) == WORKER_ID:
+            await self.state.set(self.lock_key, WORKER_ID, ttl=self.lock_ttl_seconds)
+            return
+        raise BackfillLocked(f"A backfill of analysis version {self.analysis_version} is already running")
+    
+    async def run(self, restart: bool = False) -> Dict[str, Any]:
+        """Backfill every response after the checkpoint; returns the final checkpoint"""
+        await self._hold_lock()
+        try:
+            checkpoint = await self.get_checkpoint()
+            if restart or checkpoint["completed"]:
+                checkpoint = {"after_query_id": None, "queries": 0, "responses": 0, "completed": False}
+            
+            started = time.monotonic()
+            processed = 0
+            while True:
+                groups = await self._next_chunk(checkpoint["after_query_id"])
+                if not groups:
+                    break
+                
+                rows = await self._evaluate_groups(groups)
+                await self.supabase_service.upsert_evaluation_metrics(rows)
+                
+                checkpoint["after_query_id"] = groups[-1][0]
+                checkpoint["queries"] += len(groups)
+                checkpoint["responses"] += len(rows)
+                await self._save_checkpoint(checkpoint)
+                await self._hold_lock()
+                logger.info(f"Backfilled analysis version {self.analysis_version} up to query "
+                            f"{checkpoint['after_query_id']} ({checkpoint['responses']} responses)")
+                
+                # Throttle to max_rows_per_second over the whole run
+                processed += len(rows)
+                if self.max_rows_per_second:
+                    wait = processed / self.max_rows_per_second - (time.monotonic() - started)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+            
+            checkpoint["completed"] = True
+            await self._save_checkpoint(checkpoint)
+            return checkpoint
+        
+        except Exception as e:
+            logger.error(f"Evaluation backfill of analysis version {self.analysis_version} failed: {e}")
+            raise
+        finally:
+            if await self.state.get(self.lock_key) == WORKER_ID:
+                await self.state.delete(self.lock_key)
+    
+    async def _next_chunk(self, after_query_id: Optional[str]) -> List[tuple]:
+        """The queries after after_query_id, as (query_id, responses) groups holding all their responses"""
+        rows = await self.supabase_service.get_responses_after_query(after_query_id, self.chunk_size)
+        groups = [(str(query_id), list(responses)) for query_id, responses in groupby(rows, key=lambda row: str(row['query_id']))]
+        
+        if len(rows) >= self.chunk_size:
+            if len(groups) > 1:
+                # The last query may continue in the next page
+                groups.pop()
+            else:
+                # A single query larger than a chunk is read on its own
+                query_id = groups[0][0]
+                responses = await self.supabase_service.get_responses_for_query(query_id)
+                groups = [(query_id, [
+                    {'id': response.id, 'query_id': query_id, 'provider': response.provider,
+                     'model': response.model, 'response_text': response.text}
+                    for response in responses
+                ])]
+        return groups
+    
+    async def _evaluate_groups(self, groups: List[tuple]) -> List[Dict[str, Any]]:
+        """Evaluate the response sets of a chunk in parallel and build their metric rows"""
+        categories = await self.supabase_service.get_query_categories([query_id for query_id, _ in groups])
+        
+        jobs: List[EvaluationJob] = []
+        for query_id, responses in groups:
+            response_dicts = [
+                {'id': str(response['id']), 'response_text': response.get('response_text') or '',
+                 'provider': response.get('provider'), 'model': response.get('model')}
+                for response in sorted(responses, key=lambda response: str(response['id']))
+            ]
+            jobs.append((response_dicts, categories.get(query_id), set()))
+        
+        # One batch per evaluation process, so they all work on the chunk
+        parts = min(len(jobs), max(1, self.evaluation_pool.workers))
+        results = await asyncio.gather(*(
+            self.evaluation_pool.evaluate_response_sets(jobs[part::parts]) for part in range(parts)
+        ))
+        evaluations = [None] * len(jobs)
+        for part, part_results in enumerate(results):
+            evaluations[part::parts] = part_results
+        
+        rows = []
+        for (query_id, _), (responses, _, _), evaluation in zip(groups, jobs, evaluations):
+            for response in responses:
+                response_metrics = evaluation['response_metrics'][response['id']]
+                rows.append({
+                    "query_id": query_id,
+                    "response_id": response['id'],
+                    "similarity_scores": evaluation.get('similarity_matrix', []),
+                    "average_similarity": evaluation.get('average_similarity', 0.0),
+                    "originality_score": evaluation['originality_scores'].get(response['id']),
+                    **{field: response_metrics.get(field) for field in TEXT_METRIC_FIELDS},
+                    "analysis_version": self.analysis_version,
+                    "lexicon_version": evaluation.get('lexicon_version')
+                })
+        return rows
@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import asyncio
+import logging
+from typing import List, Dict, Any, AsyncIterator, Optional
+
+from pydantic import ValidationError
+
+from app.schemas.query import QueryCreate, QueryResponse
+from app.services.scheduler import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+# Separator for list fields (tags, providers) inside a CSV cell
+CSV_LIST_SEPARATOR = ";"
+
+class BatchParseError(ValueError):
+    """Raised when a batch upload contains an invalid line"""
+    
+    def __init__(self, line: int, message: str):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+def _split_list(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+
+def _iter_jsonl(text: str):
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BatchParseError(line_number, f"invalid JSON ({e.msg})")
+        if not isinstance(item, dict):
+            raise BatchParseError(line_number, "expected a JSON object")
+        yield line_number, item
+
+def _iter_csv(text: str):
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "prompt" not in reader.fieldnames:
+        raise BatchParseError(1, "CSV header must include a 'prompt' column")
+    for row in reader:
+        item = {key: value for key, value in row.items() if key and value not in (None, "")}
+        if not item:
+            continue
+        for list_field in ("tags", "providers"):
+            if list_field in item:
+                item[list_field] = _split_list(item[list_field])
+        yield reader.line_num, item
+
+def parse_batch_items(body: bytes, content_type: str, defaults: Dict[str, Any]) -> List[QueryCreate]:
+    """Parse a JSONL or CSV upload into queries
+    
+    Each line needs a prompt and a category and may carry tags and providers.
+    Fields missing from a line are taken from ``defaults``.
+    """
+    text = body.decode("utf-8-sig")
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    
+    if content_type in ("text/csv", "application/csv"):
+        items = _iter_csv(text)
+    elif content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines", "application/x-jsonlines"):
+        items = _iter_jsonl(text)
+    else:
+        # Sniff the format when the client sent a generic content type
+        items = _iter_jsonl(text) if text.lstrip().startswith("{") else _iter_csv(text)
+    
+    queries = []
+    for line_number, item in items:
+        try:
+            queries.append(QueryCreate(**{**defaults, **item}))
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+            raise BatchParseError(line_number, errors)
+    return queries
+
+def _ndjson(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, default=str) + "\n"
+
+async def stream_batch_progress(orchestrator, batch_id: str, queries: List[QueryResponse],
+                                jobs: List[ScheduledJob]) -> AsyncIterator[str]:
+    """Yield NDJSON lines with per-item results and running totals for a batch
+    
+    Processing does not depend on this stream; if the client disconnects the
+    scheduled queries still run to completion.
+    """
+    total = len(queries)
+    counts = {"completed": 0, "failed": 0, "cancelled": 0}
+    index_by_future = {job.completion: index for index, job in enumerate(jobs)}
+    
+    yield _ndjson({
+        "type": "batch",
+        "batch_id": batch_id,
+        "total": total,
+        "query_ids": [str(query.id) for query in queries]
+    })
+    
+    pending = set(index_by_future)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            index = index_by_future[future]
+            query_id = str(queries[index].id)
+            
+            status = "completed" if future.result() else "failed"
+            successful_responses = None
+            try:
+                query = await orchestrator.supabase_service.get_query(query_id)
+                if query:
+                    status = query.status
+                    successful_responses = query.successful_responses
+            except Exception as e:
+                logger.warning(f"Could not read status of batch item {query_id}: {e}")
+            
+            counts[status] = counts.get(status, 0) + 1
+            yield _ndjson({
+                "type": "item",
+                "batch_id": batch_id,
+                "index": index,
+                "query_id": query_id,
+                "status": status,
+                "successful_responses": successful_responses
+            })
+        
+        finished = sum(counts.values())
+        yield _ndjson({
+            "type": "progress",
+            "batch_id": batch_id,
+            "finished": finished,
+            "total": total,
+            **counts
+        })
@@ -0,0 +1,42 @@
+from typing import Any, Dict, List
+
+from app.services.metric_registry import METRICS, MetricContext
+from app.services.text_analysis import AnalyzedText
+
+# Built-in metrics, computed on demand by EvaluationService.compute_metrics;
+# each receives the evaluation service computing it and the metric context.
+# Metrics registered here or by plugins serve the analytics endpoints; the
+# stored per-query evaluation is the fixed set of evaluate_response_set
+
+@METRICS.register("tokens")
+def _tokens(service, context: MetricContext) -> List[AnalyzedText]:
+    return service.analyze_many(context.texts)
+
+@METRICS.register("similarity")
+def _similarity(service, context: MetricContext) -> Dict[str, Any]:
+    similarity_matrix, avg_similarity = service.calculate_similarity_matrix(context.responses)
+    return {'similarity_matrix': similarity_matrix, 'average_similarity': avg_similarity}
+
+@METRICS.register("originality", depends=("tokens",))
+def _originality(service, context: MetricContext) -> List[float]:
+    return service.calculate_originality_scores(context["tokens"])
+
+@METRICS.register("readability", depends=("tokens",))
+def _readability(service, context: MetricContext) -> List[float]:
+    return service.calculate_readability_scores(context["tokens"])
+
+@METRICS.register("keywords", depends=("tokens",))
+def _keywords(service, context: MetricContext) -> List[Dict[str, Any]]:
+    return [service.extract_keywords(analyzed, context.category) for analyzed in context["tokens"]]
+
+@METRICS.register("factuality", depends=("tokens",))
+def _factuality(service, context: MetricContext) -> List[float]:
+    return [service.calculate_factuality_score(analyzed) for analyzed in context["tokens"]]
+
+@METRICS.register("complexity", depends=("tokens",))
+def _complexity(service, context: MetricContext) -> List[float]:
+    return [service.calculate_complexity(analyzed) for analyzed in context["tokens"]]
+
+@METRICS.register("length")
+def _length(service, context: MetricContext) -> List[int]:
+    return [len(text) for text in context.texts]
@@ -1,88 +1,163 @@
-import re
 import math
-from typing import List, Dict, Any, Tuple
+import itertools
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple, Union
 from collections import Counter
 import logging
 import numpy as np
 
+from app.services.lexicon_store import (
+    FACTUAL_LABEL, SEO_LABEL_PREFIX, TOOL_LABEL, Lexicon, LexiconStore, get_lexicon_store
+)
+from app.services.builtin_metrics import METRICS
+from app.services.metric_registry import MetricContext, MetricRegistry
+from app.services.phrase_matcher import PhraseMatch, PhraseMatcher
+from app.services.text_analysis import AnalyzedText
+
 logger = logging.getLogger(__name__)
 
-# Disable sklearn for now to avoid import issues
-SKLEARN_AVAILABLE = False
+try:
+    from app.services.tfidf import cosine_similarity_matrices
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Vocabulary size of the TF-IDF similarity model
+TFIDF_MAX_FEATURES = 1000
+
+# Recorded with stored metrics; metrics of another version are not reused.
+# Raise it with every change to how scores are computed, so cached and stored
+# metrics are recomputed (2.0: TF-IDF similarity, whole-word phrase matching,
+# shared text analysis and set-wide originality)
+ANALYSIS_VERSION = "2.0"
+
+# Per-response metrics that depend only on the text and the category, not on
+# the other responses of the query
+TEXT_METRIC_FIELDS = (
+    'factuality_score', 'readability_score', 'keyword_count', 'keyword_list',
+    'tool_mentions', 'seo_terms', 'response_length', 'response_complexity'
+)
 
 class EvaluationService:
     """Service for evaluating and comparing LLM responses"""
     
-    def __init__(self):
-        self.seo_keywords = {
-            'technical': ['seo', 'meta tags', 'schema markup', 'structured data', 'robots.txt', 
-                         'sitemap', 'canonical', 'redirects', 'page speed', 'core web vitals',
-                         'mobile friendly', 'responsive design', 'https', 'ssl', 'domain authority'],
-            'content': ['content marketing', 'keyword research', 'content strategy', 'blog posts',
-                       'landing pages', 'meta descriptions', 'title tags', 'heading tags', 'alt text',
-                       'internal linking', 'content optimization', 'readability', 'engagement'],
-            'automation': ['python', 'script', 'automation', 'api', 'web scraping', 'data analysis',
-                          'reporting', 'dashboard', 'cron job', 'scheduled task', 'workflow',
-                          'integration', 'webhook', 'bot', 'crawler'],
-            'analytics': ['google analytics', 'search console', 'semrush', 'ahrefs', 'moz',
-                         'screaming frog', 'data visualization', 'kpi', 'metrics', 'reporting',
-                         'tracking', 'conversion', 'traffic', 'rankings']
-        }
-        
-        self.seo_tools = [
-            'google analytics', 'search console', 'semrush', 'ahrefs', 'moz', 'screaming frog',
-            'screaming frog seo spider', 'google tag manager', 'gtm', 'google ads', 'bing ads',
-            'facebook ads', 'linkedin ads', 'twitter ads', 'hotjar', 'crazy egg', 'optimizely',
-            'vwo', 'unbounce', 'leadpages', 'wordpress', 'shopify', 'woocommerce', 'magento'
+    def __init__(self, metric_registry: MetricRegistry = None, lexicon_store: LexiconStore = None):
+        # Metrics computed on demand by compute_metrics
+        self.metric_registry = metric_registry or METRICS
+        self.metric_runs: Counter = Counter()
+        self.metric_seconds: Counter = Counter()
+        # compute_metrics runs in threads; guards the two counters
+        self._timings_lock = threading.Lock()
+        
+        # SEO keywords by category, SEO tools and the phrases that point to a
+        # statement backed by a source; versioned and reloaded when they change
+        self.lexicon_store = lexicon_store or get_lexicon_store()
+    
+    @property
+    def lexicon(self) -> Lexicon:
+        """The lexicon new evaluations use"""
+        return self.lexicon_store.current
+    
+    @property
+    def seo_keywords(self) -> Dict[str, Tuple[str, ...]]:
+        return self.lexicon.seo_keywords
+    
+    @property
+    def seo_tools(self) -> Tuple[str, ...]:
+        return self.lexicon.seo_tools
+    
+    @property
+    def factual_indicators(self) -> Tuple[str, ...]:
+        return self.lexicon.factual_indicators
+    
+    @property
+    def phrase_matcher(self) -> PhraseMatcher:
+        return self.lexicon.phrase_matcher
+    
+    def compute_metrics(self, responses: List[Dict[str, Any]], metrics: Iterable[str],
+                        category: str = None) -> MetricContext:
+        """Compute only the named metrics of a response set, and what they depend on
+        
+        The values (and the time each metric took) are in the returned
+        context, keyed by metric name. This serves the analytics endpoints:
+        the evaluation stored for every query (evaluate_response_set) is a
+        fixed set of fields matching the evaluation_metrics columns, so a
+        metric registered by a plugin is only computed when asked for here.
+        """
+        context = self.metric_registry.compute(metrics, self, MetricContext(responses, category))
+        with self._timings_lock:
+            for name, seconds in context.timings.items():
+                self.metric_runs[name] += 1
+                self.metric_seconds[name] += seconds
+        return context
+    
+    def get_metric_timings(self) -> Dict[str, Dict[str, float]]:
+        """Runs and average duration of each metric computed on demand"""
+        with self._timings_lock:
+            return {
+                name: {"runs": runs, "avg_ms": self.metric_seconds[name] / runs * 1000}
+                for name, runs in self.metric_runs.items()
+            }
+    
+    def _found_phrases(self, matches: List[PhraseMatch], label: str) -> set:
+        return {match.phrase for match in matches if label in match.labels}
+    
+    def analyze(self, text: Union[str, AnalyzedText], lexicon: Lexicon = None) -> AnalyzedText:
+        """Tokenize a text once for all metrics; analyzed texts are returned as they are"""
+        if isinstance(text, AnalyzedText):
+            return text
+        return AnalyzedText(text, lexicon or self.lexicon)
+    
+    def analyze_many(self, texts: List[str], lexicon: Lexicon = None) -> List[AnalyzedText]:
+        """Tokenize several texts, matching the lexicons against all of them in one scan"""
+        lexicon = lexicon or self.lexicon
+        texts = [text or '' for text in texts]
+        return [
+            AnalyzedText(text, lexicon, phrase_matches=matches)
+            for text, matches in zip(texts, lexicon.phrase_matcher.find_all(texts))
         ]
     
     def calculate_similarity_matrix(self, responses: List[Dict[str, Any]]) -> Tuple[List[List[float]], float]:
         """Calculate similarity matrix between all responses"""
-        if len(responses) < 2:
-            return [[1.0]], 1.0
-        
-        # Extract response texts
-        texts = [resp['response_text'] for resp in responses if resp.get('response_text')]
-        
-        if len(texts) < 2:
-            return [[1.0]], 1.0
-        
-        if SKLEARN_AVAILABLE:
-            # Use TF-IDF and cosine similarity
+        return self.calculate_similarity_matrices([responses])[0]
+    
+    def calculate_similarity_matrices(self, response_sets: List[List[Dict[str, Any]]]) -> List[Tuple[List[List[float]], float]]:
+        """Calculate the similarity matrix of each of several response sets"""
+        results: List[Tuple[List[List[float]], float]] = [([[1.0]], 1.0) for _ in response_sets]
+        
+        # Extract response texts; sets with fewer than two are fully similar
+        text_sets = {}
+        for index, responses in enumerate(response_sets):
+            texts = [resp['response_text'] for resp in responses if resp.get('response_text')]
+            if len(responses) >= 2 and len(texts) >= 2:
+                text_sets[index] = texts
+        
+        if not text_sets:
+            return results
+        
+        if SCIPY_AVAILABLE:
+            # TF-IDF cosine similarity over all pairs of all sets at once
             try:
-                vectorizer = TfidfVectorizer(
-                    stop_words='english',
-                    ngram_range=(1, 2),
-                    max_features=1000
+                matrices = cosine_similarity_matrices(
+                    list(text_sets.values()), ngram_range=(1, 2), max_features=TFIDF_MAX_FEATURES
                 )
-                
-                tfidf_matrix = vectorizer.fit_transform(texts)
-                similarity_matrix = cosine_similarity(tfidf_matrix)
-                
-                # Calculate average similarity (excluding self-similarity)
-                total_similarity = 0
-                count = 0
-                for i in range(len(similarity_matrix)):
-                    for j in range(len(similarity_matrix[i])):
-                        if i != j:
-                            total_similarity += similarity_matrix[i][j]
-                            count += 1
-                
-                avg_similarity = total_similarity / count if count > 0 else 1.0
-                
-                return similarity_matrix.tolist(), avg_similarity
+                for index, (similarity_matrix, avg_similarity) in zip(text_sets, matrices):
+                    results[index] = (similarity_matrix.tolist(), avg_similarity)
+                return results
                 
             except Exception as e:
-                logger.error(f"Error calculating similarity matrix with sklearn: {e}")
-                return self._fallback_similarity_calculation(texts)
-        else:
-            # Use fallback calculation
-            return self._fallback_similarity_calculation(texts)
+                logger.error(f"Error calculating TF-IDF similarity matrix: {e}")
+        
+        # Use fallback calculation
+        for index, texts in text_sets.items():
+            results[index] = self._fallback_similarity_calculation(texts)
+        return results
     
     def _fallback_similarity_calculation(self, texts: List[str]) -> Tuple[List[List[float]], float]:
-        """Fallback similarity calculation using word overlap"""
+        """Fallback similarity calculation using word overlap, used when SciPy is not installed"""
         size = len(texts)
         similarity_matrix = [[0.0 for _ in range(size)] for _ in range(size)]
+        word_sets = [set(text.lower().split()) for text in texts]
         
         for i in range(size):
             for j in range(size):
@@ -90,8 +165,8 @@ class EvaluationService:
                     similarity_matrix[i][j] = 1.0
                 else:
                     # Calculate word overlap similarity
-                    words_i = set(texts[i].lower().split())
-                    words_j = set(texts[j].lower().split())
+                    words_i = word_sets[i]
+                    words_j = word_sets[j]
                     
                     if words_i and words_j:
                         intersection = len(words_i.intersection(words_j))
@@ -113,9 +188,10 @@ class EvaluationService:
         
         return similarity_matrix, avg_similarity
     
-    def extract_keywords(self, text: str, category: str = None) -> Dict[str, Any]:
+    def extract_keywords(self, text: Union[str, AnalyzedText], category: str = None) -> Dict[str, Any]:
         """Extract keywords, tools, and SEO terms from text"""
-        if not text:
+        analyzed = self.analyze(text)
+        if not analyzed.text:
             return {
                 'keywords': [],
                 'tools': [],
@@ -125,26 +201,22 @@ class EvaluationService:
                 'seo_term_count': 0
             }
         
-        # Convert to lowercase for matching
-        text_lower = text.lower()
-        
         # Extract keywords (words that appear multiple times)
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', text_lower)
-        word_freq = Counter(words)
-        keywords = [word for word, freq in word_freq.items() if freq >= 2]
+        keywords = [word for word, freq in analyzed.word_frequencies.items() if freq >= 2]
+        
+        matches = analyzed.phrase_matches
+        # The lexicon the text was matched against
+        lexicon = analyzed.lexicon or self.lexicon
         
-        # Extract tools mentioned
-        tools_found = []
-        for tool in self.seo_tools:
-            if tool.lower() in text_lower:
-                tools_found.append(tool)
+        # Extract tools mentioned, in lexicon order
+        found_tools = self._found_phrases(matches, TOOL_LABEL)
+        tools_found = [tool for tool in lexicon.seo_tools if tool in found_tools]
         
         # Extract SEO terms
         seo_terms = []
-        if category and category in self.seo_keywords:
-            for term in self.seo_keywords[category]:
-                if term.lower() in text_lower:
-                    seo_terms.append(term)
+        if category and category in lexicon.seo_keywords:
+            found_terms = self._found_phrases(matches, SEO_LABEL_PREFIX + category)
+            seo_terms = [term for term in lexicon.seo_keywords[category] if term in found_terms]
         
         return {
             'keywords': keywords,
@@ -155,99 +227,122 @@ class EvaluationService:
             'seo_term_count': len(seo_terms)
         }
     
-    def calculate_readability_score(self, text: str) -> float:
+    def calculate_readability_score(self, text: Union[str, AnalyzedText]) -> float:
         """Calculate readability score (0.0 to 1.0)"""
-        if not text:
-            return 0.0
+        return self.calculate_readability_scores([text])[0]
+    
+    def calculate_readability_scores(self, texts: List[Union[str, AnalyzedText]]) -> List[float]:
+        """Calculate the readability score (0.0 to 1.0) of several texts at once"""
+        analyzed_texts = [self.analyze(text) for text in texts]
+        if not analyzed_texts:
+            return []
         
         # Simple readability calculation based on sentence and word complexity
-        sentences = re.split(r'[.!?]+', text)
-        words = text.split()
+        word_counts = np.array([analyzed.word_count for analyzed in analyzed_texts], dtype=np.int64)
+        sentence_counts = np.array([analyzed.sentence_count for analyzed in analyzed_texts], dtype=np.int64)
         
-        if not sentences or not words:
-            return 0.0
+        # Long words per text, from the lengths of all texts' words in one array
+        word_lengths = np.fromiter(
+            map(len, itertools.chain.from_iterable(analyzed.tokens for analyzed in analyzed_texts)),
+            dtype=np.int64, count=int(word_counts.sum())
+        )
+        long_so_far = np.concatenate(([0], np.cumsum(word_lengths > 6)))
+        text_ends = np.cumsum(word_counts)
+        long_words = long_so_far[text_ends] - long_so_far[text_ends - word_counts]
+        
+        has_words = word_counts > 0
+        safe_word_counts = np.where(has_words, word_counts, 1)
         
         # Average sentence length
-        avg_sentence_length = len(words) / len(sentences)
+        avg_sentence_length = word_counts / sentence_counts
         
         # Word complexity (percentage of long words)
-        long_words = [word for word in words if len(word) > 6]
-        word_complexity = len(long_words) / len(words) if words else 0
+        word_complexity = long_words / safe_word_counts
         
         # Calculate readability score (higher is more readable)
         # Normalize sentence length (shorter is better, up to a point)
-        sentence_score = max(0, 1 - (avg_sentence_length - 15) / 20)
-        complexity_score = max(0, 1 - word_complexity)
+        sentence_score = np.maximum(0, 1 - (avg_sentence_length - 15) / 20)
+        complexity_score = np.maximum(0, 1 - word_complexity)
         
         # Combine scores
-        readability = (sentence_score + complexity_score) / 2
-        return max(0.0, min(1.0, readability))
+        readability = np.clip((sentence_score + complexity_score) / 2, 0.0, 1.0)
+        return np.where(has_words, readability, 0.0).tolist()
     
-    def calculate_originality_score(self, text: str, all_texts: List[str]) -> float:
-        """Calculate originality score based on uniqueness compared to other responses"""
-        if not text or not all_texts:
-            return 1.0
-        
-        # Simple n-gram based originality
-        text_words = set(text.lower().split())
-        
-        if not text_words:
-            return 1.0
-        
-        # Calculate overlap with other texts
-        total_overlap = 0
-        for other_text in all_texts:
-            if other_text != text:
-                other_words = set(other_text.lower().split())
-                overlap = len(text_words.intersection(other_words))
-                total_overlap += overlap / len(text_words) if text_words else 0
-        
-        avg_overlap = total_overlap / (len(all_texts) - 1) if len(all_texts) > 1 else 0
-        originality = 1 - avg_overlap
-        return max(0.0, min(1.0, originality))
+    def calculate_originality_scores(self, texts: List[Union[str, AnalyzedText]]) -> List[float]:
+        """Calculate the originality of every text in a set, in the same order
+        
+        A text's originality is one minus its average word overlap with each
+        other text of the set, the overlap being the share of its distinct
+        words the other text also uses. Texts are told apart by position, so
+        two identical answers count as fully overlapping. Summed over the
+        other texts, a text's overlap is the number of other texts using each
+        of its words, so one document frequency count over the set replaces
+        the pairwise comparisons.
+        """
+        vocabularies = [
+            text.vocabulary if isinstance(text, AnalyzedText) else frozenset((text or '').lower().split())
+            for text in texts
+        ]
+        document_frequency = Counter(word for vocabulary in vocabularies for word in vocabulary)
+        others = len(texts) - 1
+        
+        scores = []
+        for vocabulary in vocabularies:
+            if not vocabulary or not others:
+                scores.append(1.0)
+                continue
+            
+            shared = sum(document_frequency[word] for word in vocabulary) - len(vocabulary)
+            avg_overlap = shared / len(vocabulary) / others
+            scores.append(max(0.0, min(1.0, 1 - avg_overlap)))
+        return scores
     
-    def calculate_factuality_score(self, text: str) -> float:
+    def calculate_factuality_score(self, text: Union[str, AnalyzedText]) -> float:
         """Calculate factuality score based on presence of factual indicators"""
-        if not text:
+        analyzed = self.analyze(text)
+        if not analyzed.text:
             return 0.0
         
-        text_lower = text.lower()
-        
-        # Factual indicators
-        factual_indicators = [
-            'according to', 'research shows', 'studies indicate', 'data suggests',
-            'statistics show', 'analysis reveals', 'evidence suggests', 'findings indicate',
-            'report shows', 'survey indicates', 'study found', 'research indicates'
-        ]
-        
-        # Count factual indicators
-        factual_count = sum(1 for indicator in factual_indicators if indicator in text_lower)
+        # Count the distinct factual indicators used
+        factual_count = len(self._found_phrases(analyzed.phrase_matches, FACTUAL_LABEL))
         
         # Normalize by text length
-        word_count = len(text.split())
+        word_count = analyzed.word_count
         if word_count == 0:
             return 0.0
         
         factuality = min(1.0, factual_count / (word_count / 100))  # Per 100 words
         return factuality
     
+    def calculate_complexity(self, text: Union[str, AnalyzedText]) -> float:
+        """Average number of words per sentence"""
+        analyzed = self.analyze(text)
+        return analyzed.word_count / analyzed.sentence_count if analyzed.tokens else 0
+    
     def evaluate_response(self, response: Dict[str, Any], all_responses: List[Dict[str, Any]], 
-                         category: str = None) -> Dict[str, Any]:
-        """Comprehensive evaluation of a single response"""
+                         category: str = None, originality_score: float = None,
+                         analyzed: AnalyzedText = None, readability_score: float = None) -> Dict[str, Any]:
+        """Comprehensive evaluation of a single response
+        
+        Pass originality_score, readability_score and the response's analyzed
+        text when they were already computed for the whole set or batch.
+        """
         text = response.get('response_text', '')
+        # Every metric reads the same tokenization
+        analyzed = analyzed or self.analyze(text)
         
         # Extract keywords and tools
-        keyword_analysis = self.extract_keywords(text, category)
+        keyword_analysis = self.extract_keywords(analyzed, category)
         
         # Calculate various scores
-        readability_score = self.calculate_readability_score(text)
-        originality_score = self.calculate_originality_score(text, [r.get('response_text', '') for r in all_responses])
-        factuality_score = self.calculate_factuality_score(text)
+        if readability_score is None:
+            readability_score = self.calculate_readability_score(analyzed)
+        if originality_score is None:
+            originality_score = self._originality_within(response, analyzed, all_responses)
+        factuality_score = self.calculate_factuality_score(analyzed)
         
         # Calculate response complexity
-        words = text.split()
-        sentences = re.split(r'[.!?]+', text)
-        response_complexity = len(words) / len(sentences) if sentences and words else 0
+        response_complexity = self.calculate_complexity(analyzed)
         
         return {
             'originality_score': originality_score,
@@ -261,6 +356,111 @@ class EvaluationService:
             'response_complexity': response_complexity
         }
     
+    def _originality_within(self, response: Dict[str, Any], analyzed: AnalyzedText,
+                            all_responses: List[Dict[str, Any]]) -> float:
+        """Originality of one response against the set it belongs to"""
+        texts: List[Union[str, AnalyzedText]] = [r.get('response_text', '') for r in all_responses]
+        position = next((i for i, other in enumerate(all_responses) if other is response), None)
+        if position is None:
+            texts.append(analyzed)
+            position = len(texts) - 1
+        else:
+            texts[position] = analyzed
+        return self.calculate_originality_scores(texts)[position]
+    
+    def evaluate_set_metrics(self, responses: List[Dict[str, Any]],
+                             similarity: Tuple[List[List[float]], float] = None) -> Dict[str, Any]:
+        """Calculate only the metrics that depend on the whole response set
+        
+        Pass similarity (matrix and average) when it was already computed.
+        """
+        if not responses:
+            return {
+                'similarity_matrix': [],
+                'average_similarity': 0.0,
+                'originality_scores': {}
+            }
+        
+        similarity_matrix, avg_similarity = similarity or self.calculate_similarity_matrix(responses)
+        
+        scores = self.calculate_originality_scores([r.get('response_text', '') for r in responses])
+        originality_scores = {
+            str(response['id']): score for response, score in zip(responses, scores) if response.get('id')
+        }
+        
+        return {
+            'similarity_matrix': similarity_matrix,
+            'average_similarity': avg_similarity,
+            'originality_scores': originality_scores
+        }
+    
+    def evaluate_response_set(self, responses: List[Dict[str, Any]], category: str = None,
+                              evaluated_ids: Set[str] = frozenset()) -> Dict[str, Any]:
+        """Set-wide metrics of a query's responses plus full metrics of the ones not evaluated yet"""
+        return self.evaluate_response_sets([(responses, category, evaluated_ids)])[0]
+    
+    def evaluate_response_sets(self, jobs: List[Tuple[List[Dict[str, Any]], str, Set[str]]],
+                               lexicon: Optional[Lexicon] = None) -> List[Dict[str, Any]]:
+        """Evaluate the response sets of several queries as one batch
+        
+        Each job is (responses, category, evaluated_ids) and gets the result
+        of evaluate_response_set. Tokenization, lexicon matching and
+        readability run once over the new responses of all jobs, and the
+        similarity matrices of all sets come from one sparse product;
+        originality is counted per set. The whole batch uses one lexicon
+        (the current one unless given), whose version is in each result.
+        """
+        lexicon = lexicon or self.lexicon
+        new_responses = [
+            (index, response)
+            for index, (responses, _, evaluated_ids) in enumerate(jobs)
+            for response in responses
+            if response.get('id') and str(response['id']) not in evaluated_ids
+        ]
+        analyzed_texts = self.analyze_many([response.get('response_text', '') for _, response in new_responses], lexicon)
+        readability_scores = self.calculate_readability_scores(analyzed_texts)
+        
+        similarities = self.calculate_similarity_matrices([responses for responses, _, _ in jobs])
+        results = [
+            {**self.evaluate_set_metrics(responses, similarity), 'response_metrics': {}, 'lexicon_version': lexicon.version}
+            for (responses, _, _), similarity in zip(jobs, similarities)
+        ]
+        
+        for (index, response), analyzed, readability_score in zip(new_responses, analyzed_texts, readability_scores):
+            responses, category, _ = jobs[index]
+            result = results[index]
+            response_id = str(response['id'])
+            result['response_metrics'][response_id] = self.evaluate_response(
+                response, responses, category,
+                originality_score=result['originality_scores'].get(response_id),
+                analyzed=analyzed, readability_score=readability_score
+            )
+        
+        return results
+    
+    def find_quality_shortfalls(self, text: str, category: str = None, min_readability: float = 0.0,
+                                min_seo_term_count: int = 0, min_length: int = 0) -> List[str]:
+        """List the quality thresholds an answer falls below (empty if it passes all of them)
+        
+        Keyword coverage counts the distinct SEO terms of the category's
+        lexicon and SEO tools the answer mentions; repeated common words do
+        not count. It is only checked for categories that have a lexicon.
+        """
+        if not text:
+            return ['empty']
+        
+        analyzed = self.analyze(text)
+        shortfalls = []
+        if self.calculate_readability_score(analyzed) < min_readability:
+            shortfalls.append('readability')
+        if category in analyzed.lexicon.seo_keywords:
+            keyword_analysis = self.extract_keywords(analyzed, category)
+            if keyword_analysis['seo_term_count'] + keyword_analysis['tool_count'] < min_seo_term_count:
+                shortfalls.append('keyword_coverage')
+        if len(text) < min_length:
+            shortfalls.append('length')
+        return shortfalls
+    
     def evaluate_all_responses(self, responses: List[Dict[str, Any]], category: str = None) -> Dict[str, Any]:
         """Evaluate all responses and generate comprehensive metrics"""
         if not responses:
@@ -274,12 +474,17 @@ class EvaluationService:
         # Calculate similarity matrix
         similarity_matrix, avg_similarity = self.calculate_similarity_matrix(responses)
         
-        # Evaluate each response
+        # Evaluate each response, scoring originality for the whole set at once
+        lexicon = self.lexicon
+        analyzed_texts = [self.analyze(r.get('response_text', ''), lexicon) for r in responses]
+        originality_scores = self.calculate_originality_scores(analyzed_texts)
         response_metrics = {}
-        for response in responses:
+        for response, analyzed, originality_score in zip(responses, analyzed_texts, originality_scores):
             response_id = response.get('id')
             if response_id:
-                response_metrics[str(response_id)] = self.evaluate_response(response, responses, category)
+                response_metrics[str(response_id)] = self.evaluate_response(
+                    response, responses, category, originality_score=originality_score, analyzed=analyzed
+                )
         
         # Calculate overall metrics
         all_scores = list(response_metrics.values())
@@ -296,5 +501,6 @@ class EvaluationService:
             'similarity_matrix': similarity_matrix,
             'average_similarity': avg_similarity,
             'response_metrics': response_metrics,
-            'overall_metrics': overall_metrics
-        } 
\ No newline at end of file
+            'overall_metrics': overall_metrics,
+            'lexicon_version': lexicon.version
+        }
@@ -0,0 +1,105 @@
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+from app.services.evaluation import ANALYSIS_VERSION
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_CACHE_KEY_PREFIX = "evaluation_cache:"
+
+class EvaluationCache:
+    """Per-text evaluation metrics memoized by content hash
+    
+    Readability, keywords, tools, SEO terms, factuality, length and
+    complexity depend only on a response's text, the query category, the
+    analysis version and the lexicon version, which together form the key.
+    Recent entries are kept in a bounded in-process LRU; every entry is also
+    shared with the other workers through the state backend (Redis) for
+    ttl_seconds. Cache errors only cause misses.
+    """
+    
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None, state=None,
+                 analysis_version: str = ANALYSIS_VERSION):
+        self.max_entries = max_entries or settings.evaluation_cache_max_entries
+        self.ttl_seconds = ttl_seconds or settings.evaluation_cache_ttl_seconds
+        self.state = state or get_state_backend()
+        self.analysis_version = analysis_version
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+    
+    def key(self, text: Optional[str], category: Optional[str], lexicon_version: str) -> str:
+        digest = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+        version = f"{self.analysis_version}:{lexicon_version}"
+        return f"{EVALUATION_CACHE_KEY_PREFIX}{version}:{category or ''}:{digest}"
+    
+    def _remember(self, key: str, metrics: Dict[str, Any]):
+        self._entries[key] = metrics
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the cached metrics of the keys that have them"""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            metrics = self._entries.get(key)
+            if metrics is None:
+                missing.append(key)
+            else:
+                self._entries.move_to_end(key)
+                found[key] = metrics
+        self.local_hits += len(found)
+        
+        if missing:
+            try:
+                stored = await self.state.mget(missing)
+            except Exception as e:
+                logger.warning(f"Evaluation cache unavailable: {e}")
+                stored = [None] * len(missing)
+            
+            for key, value in zip(missing, stored):
+                if not value:
+                    self.misses += 1
+                    continue
+                try:
+                    metrics = json.loads(value)
+                except ValueError as e:
+                    logger.warning(f"Ignoring unreadable cached evaluation: {e}")
+                    self.misses += 1
+                    continue
+                self.shared_hits += 1
+                self._remember(key, metrics)
+                found[key] = metrics
+        return found
+    
+    async def set_many(self, entries: Dict[str, Dict[str, Any]]):
+        """Cache the metrics of freshly evaluated texts"""
+        if not entries:
+            return
+        for key, metrics in entries.items():
+            self._remember(key, metrics)
+        try:
+            await self.state.mset(
+                {key: json.dumps(metrics) for key, metrics in entries.items()},
+                ttl=self.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Could not share cached evaluations: {e}")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0
+        }
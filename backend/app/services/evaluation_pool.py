@@ -0,0 +1,263 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.evaluation import EvaluationService, TEXT_METRIC_FIELDS
+from app.services.evaluation_cache import EvaluationCache
+from app.services.lexicon_store import Lexicon
+
+logger = logging.getLogger(__name__)
+
+# responses, category and ids of the responses already evaluated
+EvaluationJob = Tuple[List[Dict[str, Any]], Optional[str], Set[str]]
+
+# The evaluation service of a pool process, built once when the process starts
+_worker_service: Optional[EvaluationService] = None
+
+def _init_worker():
+    global _worker_service
+    _worker_service = EvaluationService()
+
+def _warm_up() -> int:
+    return os.getpid()
+
+def _evaluate_response_sets(jobs: List[EvaluationJob], lexicon: Lexicon) -> List[Dict[str, Any]]:
+    # The lexicon comes with every batch, so processes follow reloads in the
+    # parent; each compiles a version's matcher once
+    return _worker_service.evaluate_response_sets(jobs, lexicon)
+
+def default_evaluation_workers() -> int:
+    """One evaluation process per core, shared out between the server workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, settings.workers))
+
+class EvaluationPool:
+    """Runs response evaluation off the event loop
+    
+    Evaluation is CPU-bound, so running it inline stalls every other
+    coroutine of the worker. Response sets of at least process_min_chars
+    characters go to a pool of processes that are started, and have their
+    lexicons compiled, when the pool starts; smaller ones run in a thread,
+    where pickling them to another process would cost more than it saves.
+    With no processes (workers=0), or if the pool breaks, everything runs in
+    threads.
+    
+    Evaluations requested within batch_window_ms of the first one, up to
+    batch_max_texts responses, are evaluated as one batch (see
+    EvaluationService.evaluate_response_sets) and the results handed back
+    to each caller, so queries finishing together share the fixed costs.
+    
+    With a cache, responses whose text was evaluated before (in the same
+    category, with the same lexicon) only get their set-dependent metrics
+    computed; their per-text metrics come from the cache.
+    """
+    
+    def __init__(self, evaluation_service: EvaluationService = None, workers: int = None,
+                 process_min_chars: int = None, batch_window_ms: float = None, batch_max_texts: int = None,
+                 cache: EvaluationCache = None):
+        self.evaluation_service = evaluation_service or EvaluationService()
+        self.cache = cache
+        if workers is None:
+            workers = settings.evaluation_workers
+        self.workers = default_evaluation_workers() if workers is None else workers
+        self.process_min_chars = (process_min_chars if process_min_chars is not None
+                                  else settings.evaluation_process_min_chars)
+        self.batch_seconds = (batch_window_ms if batch_window_ms is not None
+                              else settings.evaluation_batch_window_ms) / 1000
+        self.batch_max_texts = batch_max_texts or settings.evaluation_batch_max_texts
+        self._processes: Optional[ProcessPoolExecutor] = None
+        # Held while a broken pool is replaced, so concurrent failures restart it once
+        self._restart_lock = asyncio.Lock()
+        # Jobs waiting for the batch window to close
+        self._queue: List[Tuple[EvaluationJob, asyncio.Future]] = []
+        self._queued_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks = set()
+        self.process_batches = 0
+        self.thread_batches = 0
+        self.pool_failures = 0
+        self.batches = 0
+        self.batched_jobs = 0
+    
+    def start(self):
+        """Start the evaluation processes"""
+        if self.workers <= 0 or self._processes is not None:
+            return
+        self._processes = self._new_processes()
+    
+    def _new_processes(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the parent runs an event loop and threads
+        processes = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        # Every process starts now, so no query waits for imports and lexicon compilation
+        for _ in range(self.workers):
+            processes.submit(_warm_up)
+        return processes
+    
+    def _replace_processes(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Shut down a broken pool and start a new one (blocking, run in a thread)"""
+        broken.shutdown(wait=False, cancel_futures=True)
+        return self._new_processes()
+    
+    async def _restart(self, broken: ProcessPoolExecutor, error: Exception):
+        """Replace a broken pool unless another evaluation already did
+        
+        Evaluations failing on the broken pool meanwhile wait here, then run
+        in a thread.
+        """
+        async with self._restart_lock:
+            if self._processes is not broken:
+                return
+            logger.error(f"Evaluation process pool broke, restarting it: {error}")
+            self.pool_failures += 1
+            processes = await asyncio.to_thread(self._replace_processes, broken)
+            if self._processes is broken:
+                self._processes = processes
+            else:
+                # Stopped while the new processes started
+                processes.shutdown(wait=False, cancel_futures=True)
+    
+    def stop(self):
+        """Stop the evaluation processes; evaluations still waiting for a batch run in a thread"""
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+        self._dispatch()
+    
+    async def evaluate_response_set(self, responses: List[Dict[str, Any]], category: str = None,
+                                    evaluated_ids: Set[str] = frozenset()) -> Dict[str, Any]:
+        """Evaluate a query's responses (see EvaluationService.evaluate_response_set)"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(((responses, category, set(evaluated_ids)), future))
+        self._queued_texts += len(responses)
+        
+        if self._queued_texts >= self.batch_max_texts or self.batch_seconds <= 0:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_seconds, self._dispatch)
+        return await future
+    
+    async def evaluate_response_sets(self, jobs: List[EvaluationJob]) -> List[Dict[str, Any]]:
+        """Evaluate several response sets as one batch, without waiting for a batch window"""
+        return await self._evaluate(jobs)
+    
+    def _dispatch(self):
+        """Close the current batch and start evaluating it"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        self._queued_texts = 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[EvaluationJob, asyncio.Future]]):
+        try:
+            results = await self._evaluate([job for job, _ in batch])
+        
+        except Exception as e:
+            if len(batch) > 1:
+                # Keep one bad response set from failing the others
+                logger.error(f"Batch of {len(batch)} evaluations failed, evaluating them one by one: {e}")
+                for item in batch:
+                    await self._run_batch([item])
+                return
+            logger.error(f"Evaluation failed: {e}")
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        
+        self.batches += 1
+        self.batched_jobs += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def _evaluate(self, jobs: List[EvaluationJob]) -> List[Dict[str, Any]]:
+        """Evaluate a batch, taking per-text metrics from the cache where it has them"""
+        # The whole batch uses the lexicon current when it starts
+        lexicon = self.evaluation_service.lexicon
+        if self.cache is None:
+            return await self._compute(jobs, lexicon)
+        
+        # Cache key of every response that needs per-text metrics
+        keys = {}
+        for index, (responses, category, evaluated_ids) in enumerate(jobs):
+            for response in responses:
+                response_id = str(response.get('id') or '')
+                if response_id and response_id not in evaluated_ids:
+                    keys[(index, response_id)] = self.cache.key(response.get('response_text'), category, lexicon.version)
+        cached = await self.cache.get_many(keys.values())
+        
+        # Only the first response with a given uncached text is evaluated in full
+        first_with_key = {}
+        skipped = [set() for _ in jobs]
+        for (index, response_id), key in keys.items():
+            if key in cached or key in first_with_key:
+                skipped[index].add(response_id)
+            else:
+                first_with_key[key] = (index, response_id)
+        
+        results = await self._compute([
+            (responses, category, evaluated_ids | skipped[index])
+            for index, (responses, category, evaluated_ids) in enumerate(jobs)
+        ], lexicon)
+        
+        fresh = {
+            key: {field: results[index]['response_metrics'][response_id][field] for field in TEXT_METRIC_FIELDS}
+            for key, (index, response_id) in first_with_key.items()
+        }
+        for (index, response_id), key in keys.items():
+            result = results[index]
+            if response_id in skipped[index]:
+                result['response_metrics'][response_id] = {
+                    **(cached.get(key) or fresh[key]),
+                    'originality_score': result['originality_scores'].get(response_id)
+                }
+        
+        await self.cache.set_many(fresh)
+        return results
+    
+    async def _compute(self, jobs: List[EvaluationJob], lexicon: Lexicon) -> List[Dict[str, Any]]:
+        """Evaluate a batch in a pool process, or in a thread when it is small"""
+        size = sum(len(response.get('response_text') or '') for responses, _, _ in jobs for response in responses)
+        
+        processes = self._processes
+        if processes is not None and size >= self.process_min_chars:
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    processes, _evaluate_response_sets, jobs, lexicon
+                )
+                self.process_batches += 1
+                return results
+            
+            except BrokenProcessPool as e:
+                # A process died (e.g. killed for memory); start a fresh pool
+                # for the next evaluations and run this one here
+                await self._restart(processes, e)
+        
+        self.thread_batches += 1
+        return await asyncio.to_thread(self.evaluation_service.evaluate_response_sets, jobs, lexicon)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = {
+            "workers": self.workers if self._processes is not None else 0,
+            "process_batches": self.process_batches,
+            "thread_batches": self.thread_batches,
+            "pool_failures": self.pool_failures,
+            "avg_batch_size": self.batched_jobs / self.batches if self.batches else 0.0
+        }
+        if self.cache is not None:
+            metrics["cache"] = self.cache.get_metrics()
+        metrics["on_demand_metrics"] = self.evaluation_service.get_metric_timings()
+        return metrics
@@ -0,0 +1,60 @@
+import json
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """Hash a request body so a reused key with a different body can be detected"""
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+class IdempotencyStore:
+    """Short-lived store of idempotency keys in the shared state backend
+    
+    With the Redis backend a retry is recognised whichever worker it lands on.
+    """
+    
+    def __init__(self, ttl_seconds: int = None, state=None):
+        self.ttl_seconds = ttl_seconds or settings.idempotency_ttl_seconds
+        self.state = state or get_state_backend()
+    
+    def _key(self, scope: str, idempotency_key: str) -> str:
+        return f"idempotency:{scope}:{idempotency_key}"
+    
+    async def reserve(self, scope: str, idempotency_key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Reserve a key for a new request
+        
+        Returns None when the key was free and is now reserved, otherwise the
+        record stored by the earlier request.
+        """
+        key = self._key(scope, idempotency_key)
+        record = json.dumps({"status": IN_PROGRESS, "fingerprint": fingerprint})
+        
+        if await self.state.set(key, record, ttl=self.ttl_seconds, nx=True):
+            return None
+        existing = await self.state.get(key)
+        # The key may have expired between SET and GET
+        if existing is None:
+            return await self.reserve(scope, idempotency_key, fingerprint)
+        return json.loads(existing)
+    
+    async def complete(self, scope: str, idempotency_key: str, fingerprint: str, response: Dict[str, Any]):
+        """Store the response of a finished request under its key"""
+        key = self._key(scope, idempotency_key)
+        record = json.dumps({"status": COMPLETED, "fingerprint": fingerprint, "response": response}, default=str)
+        await self.state.set(key, record, ttl=self.ttl_seconds)
+    
+    async def release(self, scope: str, idempotency_key: str):
+        """Free a reserved key after the request failed so it can be retried"""
+        try:
+            await self.state.delete(self._key(scope, idempotency_key))
+        except Exception as e:
+            logger.warning(f"Failed to release idempotency key: {e}")
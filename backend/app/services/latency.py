@@ -0,0 +1,172 @@
+import json
+import math
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+SKETCH_INDEX_KEY = "latency_sketches"
+SKETCH_KEY_PREFIX = "latency_sketch:"
+
+class LatencySketch:
+    """Streaming histogram of latencies with bounded relative error
+    
+    Values are counted in logarithmic buckets (as in HDR histograms and
+    DDSketch), so any quantile is accurate to within relative_accuracy, memory
+    grows with the log of the value range rather than the number of samples,
+    and sketches merge by adding bucket counts.
+    """
+    
+    # Latencies below this many milliseconds are counted as this value
+    MIN_VALUE_MS = 1.0
+    
+    def __init__(self, relative_accuracy: float = None, buckets: Dict[int, int] = None):
+        self.relative_accuracy = relative_accuracy or settings.latency_sketch_accuracy
+        self._gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = dict(buckets or {})
+        self.count = sum(self.buckets.values())
+    
+    def _index(self, value_ms: float) -> int:
+        return math.ceil(math.log(max(value_ms, self.MIN_VALUE_MS)) / self._log_gamma)
+    
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+    
+    def add(self, value_ms: float, count: int = 1):
+        index = self._index(value_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+    
+    def merge(self, other: "LatencySketch"):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Get the latency in milliseconds at quantile q (0..1), or None when empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+class LatencyTracker:
+    """Latency sketches per provider and model, shared between workers
+    
+    Calls are recorded in the local sketch and in a pending delta. Flushing adds
+    the deltas to hashes in the state backend (HINCRBY with Redis, safe with
+    many workers) and reloads the merged totals, so each worker sees every
+    worker's calls.
+    """
+    
+    def __init__(self, relative_accuracy: float = None, flush_seconds: float = None, state=None):
+        self.state = state or get_state_backend()
+        self.relative_accuracy = relative_accuracy or settings.latency_sketch_accuracy
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.latency_flush_seconds
+        self._sketches: Dict[Tuple[str, str], LatencySketch] = {}
+        self._pending: Dict[Tuple[str, str], LatencySketch] = {}
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def _new_sketch(self, buckets: Dict[int, int] = None) -> LatencySketch:
+        return LatencySketch(self.relative_accuracy, buckets)
+    
+    def record(self, provider: str, model: str, seconds: float):
+        """Record the duration of one provider call"""
+        key = (provider, model or "")
+        value_ms = seconds * 1000
+        self._sketches.setdefault(key, self._new_sketch()).add(value_ms)
+        self._pending.setdefault(key, self._new_sketch()).add(value_ms)
+        
+        if time.monotonic() - self._last_flush >= self.flush_seconds and not (self._flush_task and not self._flush_task.done()):
+            self._last_flush = time.monotonic()
+            self._flush_task = asyncio.create_task(self.flush())
+    
+    def get_sketch(self, provider: str, model: str = None) -> Optional[LatencySketch]:
+        """Get the sketch for a provider and model, or all models of the provider merged"""
+        if model:
+            return self._sketches.get((provider, model))
+        
+        merged = None
+        for (sketch_provider, _), sketch in self._sketches.items():
+            if sketch_provider == provider:
+                merged = merged or self._new_sketch()
+                merged.merge(sketch)
+        return merged
+    
+    def quantile_seconds(self, provider: str, model: str = None, q: float = 0.5) -> Optional[float]:
+        """Latency in seconds at quantile q, falling back to the provider's other models"""
+        sketch = self.get_sketch(provider, model)
+        if (sketch is None or not sketch.count) and model:
+            sketch = self.get_sketch(provider)
+        if sketch is None:
+            return None
+        value_ms = sketch.quantile(q)
+        return value_ms / 1000 if value_ms is not None else None
+    
+    async def load(self):
+        """Load the shared sketches, keeping calls not flushed yet"""
+        try:
+            loaded = {}
+            for member in await self.state.smembers(SKETCH_INDEX_KEY):
+                provider, model = json.loads(member)
+                stored = await self.state.hgetall(f"{SKETCH_KEY_PREFIX}{member}")
+                sketch = self._new_sketch({int(index): int(count) for index, count in stored.items()})
+                pending = self._pending.get((provider, model))
+                if pending:
+                    sketch.merge(pending)
+                loaded[(provider, model)] = sketch
+            
+            for key, pending in self._pending.items():
+                if key not in loaded:
+                    loaded[key] = self._new_sketch()
+                    loaded[key].merge(pending)
+            self._sketches = loaded
+        
+        except Exception as e:
+            logger.warning(f"Could not load latency sketches, using local data only: {e}")
+    
+    async def flush(self):
+        """Add pending calls to the shared sketches, then reload the totals"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            for (provider, model), sketch in list(pending.items()):
+                member = json.dumps([provider, model])
+                await self.state.sadd(SKETCH_INDEX_KEY, member)
+                await self.state.hincrby(
+                    f"{SKETCH_KEY_PREFIX}{member}",
+                    {str(index): count for index, count in sketch.buckets.items()}
+                )
+                # Written; must not be added again by the next flush
+                del pending[(provider, model)]
+        
+        except Exception as e:
+            logger.warning(f"Could not persist latency sketches: {e}")
+            # Keep the calls not written yet so the next flush persists them
+            for key, sketch in pending.items():
+                self._pending.setdefault(key, self._new_sketch()).merge(sketch)
+            return
+        
+        await self.load()
+    
+    def get_metrics(self, quantiles: List[float] = (0.5, 0.9, 0.99)) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles in seconds for every provider and model"""
+        metrics = {}
+        for (provider, model), sketch in sorted(self._sketches.items()):
+            metrics.setdefault(provider, {})[model] = {
+                "count": sketch.count,
+                **{f"p{round(q * 100)}": sketch.quantile(q) / 1000 for q in quantiles if sketch.count}
+            }
+        return metrics
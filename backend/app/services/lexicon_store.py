@@ -0,0 +1,144 @@
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.services.phrase_matcher import PhraseMatcher, get_phrase_matcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "seo_lexicons.json")
+
+# Labels of the lexicons in the phrase matcher
+TOOL_LABEL = "tool"
+FACTUAL_LABEL = "factual"
+SEO_LABEL_PREFIX = "seo:"
+
+@dataclass(frozen=True)
+class Lexicon:
+    """One version of the SEO lexicons
+    
+    Plain data, so it is cheap to hand to evaluation processes; the phrase
+    matcher is compiled once per process and version, on first use.
+    """
+    version: str
+    seo_keywords: Dict[str, Tuple[str, ...]]
+    seo_tools: Tuple[str, ...]
+    factual_indicators: Tuple[str, ...]
+    
+    @property
+    def phrase_matcher(self) -> PhraseMatcher:
+        """All lexicons, matched in a single pass over each text"""
+        return get_phrase_matcher({
+            TOOL_LABEL: self.seo_tools,
+            FACTUAL_LABEL: self.factual_indicators,
+            **{SEO_LABEL_PREFIX + category: terms for category, terms in self.seo_keywords.items()}
+        }, version=self.version)
+
+def _phrases(document: Dict[str, Any], field: str) -> Tuple[str, ...]:
+    phrases = document.get(field)
+    if not isinstance(phrases, list) or not all(isinstance(phrase, str) for phrase in phrases):
+        raise ValueError(f"Lexicon field '{field}' must be a list of strings")
+    return tuple(phrases)
+
+def parse_lexicon(document: Dict[str, Any]) -> Lexicon:
+    """Build a lexicon from its JSON document, checking its shape"""
+    version = document.get("version")
+    if not isinstance(version, str) or not version:
+        raise ValueError("Lexicon must have a non-empty string 'version'")
+    seo_keywords = document.get("seo_keywords")
+    if not isinstance(seo_keywords, dict):
+        raise ValueError("Lexicon field 'seo_keywords' must map categories to lists of strings")
+    return Lexicon(
+        version=version,
+        seo_keywords={category: _phrases(seo_keywords, category) for category in seo_keywords},
+        seo_tools=_phrases(document, "seo_tools"),
+        factual_indicators=_phrases(document, "factual_indicators")
+    )
+
+def load_lexicon(path: str) -> Lexicon:
+    with open(path, encoding="utf-8") as f:
+        return parse_lexicon(json.load(f))
+
+class LexiconStore:
+    """The current lexicon, reloaded from its file when the file changes
+    
+    A new version is parsed and its matcher compiled before it replaces the
+    current one in a single assignment, so every evaluation sees either the
+    old lexicon or the new one, never a mix. A file that fails to load, or
+    that changes its phrases without changing its version (the version
+    keys cached evaluations and is recorded with each metric row), is
+    logged and ignored; the current lexicon stays in use.
+    """
+    
+    def __init__(self, path: str = None, reload_seconds: float = None):
+        self.path = path or settings.lexicon_path or DEFAULT_LEXICON_PATH
+        self.reload_seconds = reload_seconds or settings.lexicon_reload_seconds
+        self._signature = self._file_signature()
+        self.current: Lexicon = load_lexicon(self.path)
+        # Compile the matcher now rather than during the first evaluation
+        self.current.phrase_matcher
+        self.reloads = 0
+        self.reload_failures = 0
+    
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def reload(self) -> bool:
+        """Load the file if it changed since the last look; returns whether a new version is in use"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        
+        try:
+            lexicon = load_lexicon(self.path)
+        except (OSError, ValueError) as e:
+            self.reload_failures += 1
+            logger.error(f"Could not reload lexicon from {self.path}, keeping version {self.current.version}: {e}")
+            return False
+        
+        if lexicon.version == self.current.version:
+            if lexicon != self.current:
+                self.reload_failures += 1
+                logger.error(f"Lexicon {self.path} changed without a new version, keeping version {self.current.version}")
+            return False
+        
+        # Compile before swapping, so no evaluation waits for it
+        lexicon.phrase_matcher
+        previous, self.current = self.current, lexicon
+        self.reloads += 1
+        logger.info(f"Lexicon updated from version {previous.version} to {lexicon.version}")
+        return True
+    
+    async def watch(self):
+        """Reload the lexicon whenever its file changes"""
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                logger.warning(f"Lexicon reload failed: {e}")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "version": self.current.version,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures
+        }
+
+# One store per process, shared by its evaluation services
+_lexicon_store: Optional[LexiconStore] = None
+
+def get_lexicon_store() -> LexiconStore:
+    global _lexicon_store
+    if _lexicon_store is None:
+        _lexicon_store = LexiconStore()
+    return _lexicon_store
@@ -13,8 +13,8 @@ class AnthropicProvider(BaseLLMProvider):
     
     def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20241022", **kwargs):
         super().__init__(api_key, model, **kwargs)
-        # Create Anthropic client with the correct API
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # Async client so cancelling the query aborts the HTTP request
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
     
     def get_provider_name(self) -> str:
         return "anthropic"
@@ -22,9 +22,11 @@ class AnthropicProvider(BaseLLMProvider):
     async def query(self, prompt: str, **kwargs) -> LLMResponse:
         """Execute query against Anthropic API"""
         try:
+            model = kwargs.get('model') or self.model
+            
             # Use the correct API for anthropic 0.7.8+
-            response = self.client.messages.create(
-                model=self.model,
+            response = await self.client.messages.create(
+                model=model,
                 max_tokens=kwargs.get('max_tokens', 2000),
                 temperature=kwargs.get('temperature', 0.7),
                 top_p=kwargs.get('top_p', 1.0),
@@ -44,7 +46,7 @@ Question: {prompt}"""
             
             # Prepare metadata
             metadata = {
-                "model": self.model,
+                "model": model,
                 "stop_reason": response.stop_reason,
                 "usage": {
                     "input_tokens": response.usage.input_tokens if response.usage else None,
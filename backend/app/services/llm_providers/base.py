@@ -44,6 +44,11 @@ class BaseLLMProvider(ABC):
                 response.response_time_ms = int((time.time() - start_time) * 1000)
                 return response
                 
+            except asyncio.CancelledError:
+                # Let cancellation reach the caller instead of retrying
+                logger.info(f"Request to {self.get_provider_name()} cancelled")
+                raise
+            
             except asyncio.TimeoutError:
                 last_exception = Exception(f"Timeout after {self.timeout} seconds")
                 logger.warning(f"Timeout on attempt {attempt + 1} for {self.get_provider_name()}")
@@ -21,16 +21,17 @@ class GoogleProvider(BaseLLMProvider):
     async def query(self, prompt: str, **kwargs) -> LLMResponse:
         """Execute query against Google Gemini API"""
         try:
-            # Create model
-            model = genai.GenerativeModel(self.model)
+            # Create model (a sweep may ask for a different one per call)
+            model_name = kwargs.get('model') or self.model
+            model = genai.GenerativeModel(model_name)
             
             # Prepare the prompt
             full_prompt = f"""You are an expert SEO consultant. Provide detailed, actionable advice for the following SEO question. Focus on practical, implementable strategies and current best practices.
 
 Question: {prompt}"""
             
-            # Generate content
-            response = model.generate_content(
+            # Generate content (async so cancellation reaches the request)
+            response = await model.generate_content_async(
                 full_prompt,
                 generation_config=genai.types.GenerationConfig(
                     max_output_tokens=kwargs.get('max_tokens', 2000),
@@ -44,7 +45,7 @@ Question: {prompt}"""
             
             # Prepare metadata - handle different response structures
             metadata = {
-                "model": self.model,
+                "model": model_name,
                 "finish_reason": response.candidates[0].finish_reason if response.candidates else None,
                 "usage": None  # Google API doesn't always provide usage metadata
             }
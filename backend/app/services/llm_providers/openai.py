@@ -21,6 +21,8 @@ class OpenAIProvider(BaseLLMProvider):
     async def query(self, prompt: str, **kwargs) -> LLMResponse:
         """Execute query against OpenAI API"""
         try:
+            model = kwargs.get('model') or self.model
+            
             # Prepare the message
             messages = [
                 {
@@ -35,7 +37,7 @@ class OpenAIProvider(BaseLLMProvider):
             
             # Make API call using the new openai library syntax
             response = await self.client.chat.completions.create(
-                model=self.model,
+                model=model,
                 messages=messages,
                 max_tokens=kwargs.get('max_tokens', 2000),
                 temperature=kwargs.get('temperature', 0.7),
@@ -50,7 +52,7 @@ class OpenAIProvider(BaseLLMProvider):
             
             # Prepare metadata
             metadata = {
-                "model": self.model,
+                "model": model,
                 "finish_reason": response.choices[0].finish_reason,
                 "usage": {
                     "prompt_tokens": response.usage.prompt_tokens if response.usage else None,
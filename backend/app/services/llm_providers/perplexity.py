@@ -21,6 +21,8 @@ class PerplexityProvider(BaseLLMProvider):
     async def query(self, prompt: str, **kwargs) -> LLMResponse:
         """Execute query against Perplexity API"""
         try:
+            model = kwargs.get('model') or self.model
+            
             # Prepare headers
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
@@ -29,7 +31,7 @@ class PerplexityProvider(BaseLLMProvider):
             
             # Prepare payload
             payload = {
-                "model": self.model,
+                "model": model,
                 "messages": [
                     {
                         "role": "system",
@@ -65,7 +67,7 @@ class PerplexityProvider(BaseLLMProvider):
                 
                 # Prepare metadata
                 metadata = {
-                    "model": self.model,
+                    "model": model,
                     "finish_reason": data['choices'][0].get('finish_reason'),
                     "usage": data.get('usage', {})
                 }
@@ -0,0 +1,91 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class MetricContext:
+    """A response set being evaluated and the metric values computed for it so far"""
+    responses: List[Dict[str, Any]]
+    category: Optional[str] = None
+    values: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    
+    @property
+    def texts(self) -> List[str]:
+        return [response.get('response_text') or '' for response in self.responses]
+    
+    def __getitem__(self, name: str) -> Any:
+        return self.values[name]
+
+@dataclass(frozen=True)
+class Metric:
+    """A named computation over a response set
+    
+    compute(evaluation_service, context) returns the metric's value, reading
+    the values of the metrics it depends on from the context. Per-response
+    metrics return one value per response, in order.
+    """
+    name: str
+    compute: Callable[[Any, MetricContext], Any]
+    depends: Tuple[str, ...] = ()
+
+class MetricRegistry:
+    """Metrics by name, computed on demand with only the dependencies they need
+    
+    Used by EvaluationService.compute_metrics for the analytics endpoints;
+    registered metrics are not part of the evaluation stored per query.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def register(self, name: str, depends: Iterable[str] = ()):
+        """Decorator registering a metric; a later registration of a name replaces the earlier one"""
+        def decorator(compute: Callable[[Any, MetricContext], Any]):
+            self._metrics[name] = Metric(name, compute, tuple(depends))
+            return compute
+        return decorator
+    
+    @property
+    def names(self) -> List[str]:
+        return list(self._metrics)
+    
+    def plan(self, names: Iterable[str]) -> List[Metric]:
+        """The metrics to compute for the named ones, each after its dependencies"""
+        order: List[Metric] = []
+        done, visiting = set(), []
+        
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Metric dependency cycle: {' -> '.join(visiting + [name])}")
+            metric = self._metrics.get(name)
+            if metric is None:
+                raise ValueError(f"Unknown metric: {name}")
+            visiting.append(name)
+            for dependency in metric.depends:
+                visit(dependency)
+            visiting.pop()
+            done.add(name)
+            order.append(metric)
+        
+        for name in names:
+            visit(name)
+        return order
+    
+    def compute(self, names: Iterable[str], evaluation_service, context: MetricContext) -> MetricContext:
+        """Compute the named metrics and their dependencies into the context, timing each one"""
+        for metric in self.plan(names):
+            if metric.name in context.values:
+                continue
+            start = time.perf_counter()
+            context.values[metric.name] = metric.compute(evaluation_service, context)
+            context.timings[metric.name] = time.perf_counter() - start
+        return context
+
+# Registry of the built-in metrics (registered by app.services.builtin_metrics)
+METRICS = MetricRegistry()
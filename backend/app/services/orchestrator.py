@@ -1,8 +1,11 @@
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from app.schemas.query import QueryCreate, QueryStatus, QueryResponse
 from app.schemas.response import LLMResponse, ResponseCreate
@@ -10,21 +13,221 @@ from app.services.llm_providers.openai import OpenAIProvider
 from app.services.llm_providers.anthropic import AnthropicProvider
 from app.services.llm_providers.perplexity import PerplexityProvider
 from app.services.llm_providers.google import GoogleProvider
-from app.services.evaluation import EvaluationService
+from app.services.evaluation import EvaluationService, ANALYSIS_VERSION
+from app.services.evaluation_cache import EvaluationCache
+from app.services.evaluation_pool import EvaluationPool
 from app.services.supabase_service import SupabaseService
+from app.services.admission import AdmissionController, is_throttled_error
+from app.services.scheduler import QueryScheduler, ScheduledJob, BATCH, INTERACTIVE
+from app.services.response_cache import ResponseCache
+from app.services.recurring import RecurringQueryRunner
+from app.services.pipeline import Pipeline, PipelineContext, Stage, StageError
+from app.services.latency import LatencyTracker
+from app.services.spool import ResponseSpool
+from app.services.query_state import (
+    QueryStateTracker, InvalidTransition, can_transition,
+    PENDING, PROCESSING, EVALUATING, COMPLETED, FAILED, CANCELLED, INTERRUPTED, ACTIVE_STATUSES, FINAL_STATUSES,
+    PROVIDER_PENDING, PROVIDER_RUNNING, PROVIDER_SUCCEEDED, PROVIDER_FAILED, PROVIDER_CANCELLED,
+    PROVIDER_FINAL_STATES
+)
+from app.services.sweep import expand_sweep, build_comparison_table, SweepCell, COMPARISON_COLUMNS
+from app.schemas.sweep import SweepCreate, SweepResponse, SweepResults
 from app.core.config import settings
+from app.core.state import get_state_backend
 
 logger = logging.getLogger(__name__)
 
+# Channel on which cancellations are announced to every worker
+CANCEL_CHANNEL = "query_cancellations"
+
+# Stages that (re)compute and store evaluation metrics for existing responses
+EVALUATION_STAGES = ["evaluate", "persist_metrics"]
+
+@dataclass
+class QueryContext(PipelineContext):
+    """A query moving through the query pipeline"""
+    query_id: str = ""
+    providers: Optional[List[str]] = None
+    use_cache: bool = False
+    query: Optional[QueryResponse] = None
+    available_providers: List[str] = field(default_factory=list)
+    results: List[Any] = field(default_factory=list)
+    metric_updates: List[Tuple[str, Dict[str, Any]]] = field(default_factory=list)
+    metric_creates: List[Dict[str, Any]] = field(default_factory=list)
+    succeeded: bool = False
+
 class QueryOrchestrator:
     """Orchestrates the entire query processing workflow using Supabase"""
     
-    def __init__(self):
+    def __init__(self, supabase_service: SupabaseService = None, state=None):
         self.evaluation_service = EvaluationService()
-        self.supabase_service = SupabaseService()
+        self.supabase_service = supabase_service or SupabaseService()
+        # Shared between workers: cancellation flags, caches, load and latency figures
+        self.state = state or get_state_backend()
+        self.admission = AdmissionController()
+        self.scheduler = QueryScheduler(self)
+        self.response_cache = ResponseCache(state=self.state)
+        self.latency = LatencyTracker(state=self.state)
+        self.evaluation_pool = EvaluationPool(self.evaluation_service, cache=EvaluationCache(state=self.state))
+        self.spool = ResponseSpool(self.supabase_service)
+        self.states = QueryStateTracker(self.supabase_service)
+        self.recurring = RecurringQueryRunner(self)
+        self.query_pipeline = self._build_query_pipeline()
         self.providers = {}
+        # Provider tasks per query, so a query can be cancelled while in flight
+        self._active_tasks: Dict[str, List[asyncio.Task]] = {}
+        self._cancelled_queries = set()
+        # Keeps references to fire-and-forget work such as sweeps
+        self._background_tasks = set()
+        self._service_tasks: List[asyncio.Task] = []
         self._initialize_providers()
     
+    async def start(self):
+        """Start the background work of this worker"""
+        # Write responses spooled before the last shutdown, then keep flushing
+        self.spool.start()
+        # Write batched query status changes
+        self.states.start()
+        # Evaluation processes compile their lexicons before the first query
+        self.evaluation_pool.start()
+        # Shared provider latency sketches feed completion estimates
+        await self.latency.load()
+        # Fire recurring queries when they are due
+        self.recurring.start()
+        
+        self._service_tasks = [
+            asyncio.create_task(self._sync_shared_state()),
+            asyncio.create_task(self._listen_for_cancellations()),
+            asyncio.create_task(self._recover_interrupted_queries()),
+            # Pick up lexicon updates without a restart
+            asyncio.create_task(self.evaluation_service.lexicon_store.watch())
+        ]
+    
+    async def stop(self, drain_seconds: float = None):
+        """Stop this worker: finish or hand off its queries, then persist what is pending
+        
+        New queries are refused straight away. Running queries and sweeps get
+        up to drain_seconds (settings.shutdown_drain_seconds) to finish. Queries
+        still running then are cancelled and, like queries still waiting for a
+        slot, marked interrupted so another worker resumes them.
+        """
+        if drain_seconds is None:
+            drain_seconds = settings.shutdown_drain_seconds
+        deadline = time.monotonic() + drain_seconds
+        
+        self.admission.draining = True
+        await self.recurring.stop()
+        
+        unfinished = await self.scheduler.drain(drain_seconds)
+        await self._drain_background_tasks(max(0.0, deadline - time.monotonic()))
+        
+        # Responses must be in the database before another worker decides
+        # which providers of a handed-off query still have to run
+        await self.spool.flush()
+        for job in unfinished:
+            try:
+                await self.states.transition(job.query_id, INTERRUPTED)
+            except Exception as e:
+                logger.error(f"Could not hand off query {job.query_id}: {e}")
+        if unfinished:
+            logger.warning(f"Handed off {len(unfinished)} unfinished queries to other workers")
+        
+        for task in self._service_tasks:
+            task.cancel()
+        await asyncio.gather(*self._service_tasks, return_exceptions=True)
+        self._service_tasks = []
+        
+        try:
+            await self.admission.deregister(self.state)
+        except Exception as e:
+            logger.warning(f"Could not deregister worker from shared state: {e}")
+        await self.latency.flush()
+        await self.states.stop()
+        await self.spool.stop()
+        self.evaluation_pool.stop()
+    
+    async def _drain_background_tasks(self, timeout: float):
+        """Wait for sweeps to finish, cancelling those still running at the timeout"""
+        if not self._background_tasks:
+            return
+        _, still_running = await asyncio.wait(set(self._background_tasks), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+    
+    async def _recover_interrupted_queries(self):
+        """Resume queries handed off by workers that shut down"""
+        while True:
+            try:
+                for query_id in await self.supabase_service.get_query_ids_by_status(INTERRUPTED):
+                    if self.admission.draining:
+                        return
+                    await self.resume_query(query_id)
+            except Exception as e:
+                logger.error(f"Recovering interrupted queries failed: {e}")
+            await asyncio.sleep(settings.recovery_poll_seconds)
+    
+    async def resume_query(self, query_id: str) -> bool:
+        """Claim an interrupted query and schedule the providers it still needs
+        
+        Returns False if the query is not interrupted (anymore), for instance
+        because another worker claimed it first.
+        """
+        query = await self.supabase_service.get_query(query_id)
+        if not query or query.status != INTERRUPTED:
+            return False
+        
+        # Spooled responses count when deciding which providers still need to run
+        if not await self.spool.flush():
+            logger.warning(f"Response spool not flushed, leaving interrupted query {query_id} for the next recovery pass")
+            return False
+        
+        providers = await self.get_providers_to_retry(query)
+        provider_states = {**query.provider_states, **{provider: PROVIDER_PENDING for provider in providers}}
+        if not await self.states.transition(query_id, PENDING, provider_states, expected=INTERRUPTED):
+            return False
+        
+        if providers:
+            await self.supabase_service.delete_responses_for_providers(query_id, providers)
+            self.resubmit(query, providers)
+            logger.info(f"Resumed interrupted query {query_id} with providers: {providers}")
+            return True
+        
+        # Every provider had answered; only the evaluation was cut short
+        await self.states.transition(query_id, PROCESSING)
+        await self._generate_evaluation_metrics(query_id, query)
+        await self.states.transition(query_id, COMPLETED)
+        logger.info(f"Resumed interrupted query {query_id} at evaluation")
+        return True
+    
+    def resubmit(self, query: QueryResponse, providers: List[str], ticket: int = None) -> ScheduledJob:
+        """Schedule providers of an existing query again, as its owner and in its original class
+        
+        Queries of batches and sweeps (those with a batch id) stay batch work,
+        so their retries neither take interactive slots nor skip the owner's
+        fair share.
+        """
+        return self.scheduler.submit(
+            str(query.id), providers, user_id=query.user_id,
+            priority=BATCH if query.batch_id else INTERACTIVE, ticket=ticket
+        )
+    
+    async def _sync_shared_state(self):
+        """Exchange load figures with the other workers"""
+        while True:
+            try:
+                await self.admission.sync(self.state)
+            except Exception as e:
+                logger.warning(f"Shared state sync failed: {e}")
+            await asyncio.sleep(settings.state_sync_seconds)
+    
+    async def _listen_for_cancellations(self):
+        """Stop local provider calls as soon as any worker cancels their query"""
+        async for query_id in self.state.subscribe(CANCEL_CHANNEL):
+            if query_id in self._active_tasks:
+                logger.info(f"Cancelling query {query_id} on request from another worker")
+                self._cancel_local_tasks(query_id)
+    
     def _initialize_providers(self):
         """Initialize LLM providers based on available API keys"""
         try:
@@ -78,85 +281,684 @@ class QueryOrchestrator:
             logger.error(f"Error creating query: {e}")
             raise
     
-    async def process_query(self, query_id: str, providers: List[str] = None) -> bool:
-        """Process a query by sending it to all specified LLM providers"""
+    async def submit_batch(self, queries_data: List[QueryCreate], ticket: int = None) -> Tuple[str, List[QueryResponse], List[ScheduledJob]]:
+        """Create a batch of queries in one insert and schedule them as batch work
+        
+        The admission ticket, if any, holds a queue slot for each query of the
+        batch (see AdmissionController.try_admit); each slot is released as
+        its query finishes.
+        """
+        batch_id = str(uuid.uuid4())
         try:
-            # Get query from Supabase
-            query = await self.supabase_service.get_query(query_id)
-            if not query:
-                logger.error(f"Query {query_id} not found")
-                return False
+            queries = await self.supabase_service.create_queries(queries_data, batch_id=batch_id)
+        except Exception:
+            if ticket is not None:
+                self.admission.release(ticket)
+            raise
+        
+        jobs = [
+            self.scheduler.submit(
+                query.id,
+                query_data.providers,
+                user_id=query_data.user_id,
+                priority=BATCH
+            )
+            for query, query_data in zip(queries, queries_data)
+        ]
+        
+        if ticket is not None:
+            for job in jobs:
+                job.completion.add_done_callback(lambda _: self.admission.release(ticket, slots=1))
+        
+        logger.info(f"Created batch {batch_id} with {len(queries)} queries")
+        return batch_id, queries, jobs
+    
+    def plan_sweep(self, sweep: SweepCreate) -> Tuple[List[str], List[SweepCell], int]:
+        """Expand a sweep into its unique prompts and cells, checking it can run here
+        
+        Raises ValueError for unavailable providers or too many cells.
+        """
+        unknown = sorted({target.provider for target in sweep.targets} - set(self.providers))
+        if unknown:
+            raise ValueError(f"Providers not available: {unknown}")
+        
+        default_models = {name: provider.model for name, provider in self.providers.items()}
+        prompts, cells, duplicates = expand_sweep(sweep, default_models)
+        if len(cells) > settings.max_sweep_cells:
+            raise ValueError(f"Sweep has {len(cells)} cells, the limit is {settings.max_sweep_cells}")
+        return prompts, cells, duplicates
+    
+    async def submit_sweep(self, sweep: SweepCreate, ticket: int = None, plan: Tuple = None) -> SweepResponse:
+        """Create the queries of a parameter sweep and start running its cells
+        
+        Every unique prompt becomes one query (grouped under the sweep id as
+        batch id); every cell of the grid adds one response to its prompt's
+        query, so the usual evaluation compares the cells of a prompt. The
+        admission ticket, if any, holds a queue slot per prompt, each released
+        once its query is finished. plan is the result of plan_sweep, when
+        the caller already expanded the sweep.
+        """
+        try:
+            prompts, cells, duplicates = plan or self.plan_sweep(sweep)
             
-            # Update status to processing
-            await self.supabase_service.update_query_status(query_id, "processing")
+            providers = list(dict.fromkeys(target.provider for target in sweep.targets))
+            queries_data = [
+                QueryCreate(
+                    prompt=prompt,
+                    category=sweep.category,
+                    tags=sweep.tags,
+                    providers=providers,
+                    user_id=sweep.user_id,
+                    priority=BATCH
+                )
+                for prompt in prompts
+            ]
             
-            # Use provided providers or fall back to query.providers
-            query_providers = providers or getattr(query, 'providers', [])
+            sweep_id = str(uuid.uuid4())
+            queries = await self.supabase_service.create_queries(queries_data, batch_id=sweep_id)
+        except Exception:
+            if ticket is not None:
+                self.admission.release(ticket)
+            raise
+        
+        max_concurrency = sweep.max_concurrency or settings.sweep_max_concurrency
+        task = asyncio.create_task(self.run_sweep(sweep_id, queries, cells, max_concurrency, ticket))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        
+        logger.info(f"Started sweep {sweep_id}: {len(prompts)} prompts, {len(cells)} cells ({duplicates} duplicates dropped)")
+        return SweepResponse(
+            sweep_id=sweep_id,
+            query_ids=[str(query.id) for query in queries],
+            total_cells=len(cells),
+            duplicate_cells=duplicates,
+            status="processing"
+        )
+    
+    async def run_sweep(self, sweep_id: str, queries: List[QueryResponse], cells: List[SweepCell],
+                        max_concurrency: int, ticket: int = None):
+        """Run every cell of a sweep with bounded concurrency, then evaluate each prompt
+        
+        The cells of each prompt are registered as that query's provider
+        tasks, so cancelling one query of the sweep stops its cells. A query
+        that cannot move on (cancelled, or changed by another worker) is
+        left out of the later steps. Each query's admission slot is released
+        once the query is done with.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        def release_slot():
+            if ticket is not None:
+                self.admission.release(ticket, slots=1)
+        
+        async def run_cell(cell: SweepCell) -> bool:
+            async with semaphore:
+                return await self._process_with_provider(
+                    queries[cell.prompt_index],
+                    cell.provider,
+                    model=cell.model,
+                    generation_params=cell.generation_params,
+                    extra_metadata={"sweep": {
+                        "sweep_id": sweep_id,
+                        "cell_id": cell.cell_id,
+                        "prompt_index": cell.prompt_index
+                    }}
+                )
+        
+        watchers = []
+        try:
+            started = set()
+            for index, query in enumerate(queries):
+                if await self.states.transition(str(query.id), PROCESSING):
+                    started.add(index)
+                else:
+                    logger.info(f"Query {query.id} of sweep {sweep_id} is no longer pending, not running its cells")
+                    release_slot()
             
-            # Get available providers for this query
-            available_providers = [
-                provider for provider in query_providers 
-                if provider in self.providers
-            ]
+            cells = [cell for cell in cells if cell.prompt_index in started]
+            tasks = [asyncio.create_task(run_cell(cell)) for cell in cells]
+            for index in started:
+                query_id = str(queries[index].id)
+                self._active_tasks[query_id] = [task for cell, task in zip(cells, tasks) if cell.prompt_index == index]
+                watchers.append(asyncio.create_task(self._watch_for_cancellation(query_id)))
             
-            if not available_providers:
-                logger.error(f"No available providers for query {query_id}")
-                await self.supabase_service.update_query_status(query_id, "failed")
-                return False
+            try:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                for index in started:
+                    self._active_tasks.pop(str(queries[index].id), None)
             
-            # Process with each provider concurrently
-            tasks = []
-            for provider_name in available_providers:
-                task = self._process_with_provider(query, provider_name)
-                tasks.append(task)
+            succeeded = set()
+            for cell, result in zip(cells, results):
+                if result is True:
+                    succeeded.add(cell.prompt_index)
             
-            # Wait for all providers to complete
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for index in sorted(started):
+                query = queries[index]
+                query_id = str(query.id)
+                try:
+                    if await self._cancellation_confirmed(query_id):
+                        self._cancelled_queries.discard(query_id)
+                        logger.info(f"Query {query_id} of sweep {sweep_id} was cancelled")
+                        continue
+                    if not await self.states.transition(query_id, EVALUATING):
+                        logger.info(f"Query {query_id} of sweep {sweep_id} changed status before evaluation")
+                        continue
+                    await self._generate_evaluation_metrics(query_id, query)
+                    if not await self.states.transition(query_id, COMPLETED if index in succeeded else FAILED):
+                        logger.info(f"Query {query_id} of sweep {sweep_id} changed status during evaluation")
+                finally:
+                    release_slot()
             
-            # Check if any providers succeeded
-            successful_responses = [r for r in results if isinstance(r, bool) and r]
+            logger.info(f"Sweep {sweep_id} finished: {sum(1 for r in results if r is True)}/{len(cells)} cells succeeded")
+        
+        except asyncio.CancelledError:
+            # Cells carry their own models and settings, so a sweep is not
+            # handed off; its unfinished queries can be retried individually
+            logger.warning(f"Sweep {sweep_id} was cut short by shutdown")
+            for query in queries:
+                try:
+                    await self.states.transition(str(query.id), FAILED)
+                except Exception:
+                    pass
+            raise
+        except Exception as e:
+            logger.error(f"Error running sweep {sweep_id}: {e}")
+            for query in queries:
+                try:
+                    await self.states.transition(str(query.id), FAILED)
+                except Exception:
+                    pass
+        finally:
+            for watcher in watchers:
+                watcher.cancel()
+            # Slots of queries the sweep did not get to
+            if ticket is not None:
+                self.admission.release(ticket)
+    
+    async def get_sweep_results(self, sweep_id: str) -> Optional[SweepResults]:
+        """Build the comparison table of a sweep from its stored responses and metrics"""
+        queries = await self.supabase_service.get_queries_for_batch(sweep_id)
+        if not queries:
+            return None
+        
+        responses_by_query = {}
+        metrics_by_query = {}
+        for query in queries:
+            query_id = str(query.id)
+            responses_by_query[query_id] = await self.supabase_service.get_responses_for_query(query_id)
+            metrics_by_query[query_id] = await self.supabase_service.get_evaluation_metrics_for_query(query_id)
+        
+        statuses = {str(query.id): query.status for query in queries}
+        if any(status in ACTIVE_STATUSES for status in statuses.values()):
+            status = PROCESSING
+        elif any(status == COMPLETED for status in statuses.values()):
+            status = COMPLETED
+        else:
+            status = FAILED
+        
+        return SweepResults(
+            sweep_id=sweep_id,
+            status=status,
+            columns=COMPARISON_COLUMNS,
+            rows=build_comparison_table(queries, responses_by_query, metrics_by_query),
+            queries=statuses
+        )
+    
+    async def process_admitted_query(self, ticket: int, query_id: str, providers: List[str] = None,
+                                     use_cache: bool = False) -> bool:
+        """Process a query admitted by the admission controller and release its slot"""
+        try:
+            return await self.process_query(query_id, providers, use_cache=use_cache)
+        finally:
+            self.admission.release(ticket)
+    
+    async def process_query(self, query_id: str, providers: List[str] = None, use_cache: bool = False) -> bool:
+        """Process a query by running it through the query pipeline
+        
+        With use_cache, recent identical provider calls are answered from the
+        response cache instead of calling the provider again.
+        """
+        context = QueryContext(query_id=query_id, providers=providers, use_cache=use_cache)
+        try:
+            await self.query_pipeline.run(context)
+            logger.debug(f"Query {query_id} stage timings: {context.timings}")
+            return context.succeeded
             
-            if successful_responses:
-                await self.supabase_service.update_query_status(query_id, "completed")
-            else:
-                await self.supabase_service.update_query_status(query_id, "failed")
+        except StageError as e:
+            logger.error(f"Error processing query {query_id} in stage '{e.stage}': {e.cause}")
+            try:
+                await self.states.transition(query_id, FAILED)
+            except Exception as status_error:
+                logger.error(f"Could not mark query {query_id} as failed: {status_error}")
+            return False
+    
+    def _build_query_pipeline(self) -> Pipeline:
+        """Create the query pipeline; per-stage limits can be overridden with settings.pipeline_stages"""
+        stages = [
+            Stage("load", self._load_stage, concurrency=16, retries=2),
+            Stage("providers", self._providers_stage, concurrency=settings.max_concurrent_queries),
+            Stage("evaluate", self._evaluate_stage, concurrency=4, timeout=120, retries=2,
+                  retry_on=(ConnectionError,), required=False),
+            Stage("persist_metrics", self._persist_metrics_stage, concurrency=8, retries=2, required=False),
+            Stage("finalize", self._finalize_stage, concurrency=16, retries=2)
+        ]
+        for stage in stages:
+            for option, value in settings.pipeline_stages.get(stage.name, {}).items():
+                setattr(stage, option, value)
+        return Pipeline("query", stages)
+    
+    async def _load_stage(self, context: QueryContext):
+        """Load the query, resolve the providers to run and move it to processing"""
+        query_id = context.query_id
+        query = await self.supabase_service.get_query(query_id)
+        if not query:
+            logger.error(f"Query {query_id} not found")
+            context.stop("not_found")
+            return
+        
+        if query.status == CANCELLED:
+            logger.info(f"Query {query_id} was cancelled before processing started")
+            context.stop("cancelled")
+            return
+        
+        context.query = query
+        
+        # Use provided providers or fall back to query.providers
+        query_providers = context.providers or getattr(query, 'providers', [])
+        context.available_providers = [
+            provider for provider in query_providers
+            if provider in self.providers
+        ]
+        
+        if not context.available_providers:
+            logger.error(f"No available providers for query {query_id}")
+            await self.states.transition(query_id, FAILED)
+            context.stop("no_providers")
+            return
+        
+        # A retry keeps the sub-states of the providers that already succeeded
+        provider_states = dict(query.provider_states)
+        provider_states.update({provider: PROVIDER_PENDING for provider in context.available_providers})
+        if not await self.states.transition(query_id, PROCESSING, provider_states):
+            logger.info(f"Query {query_id} is no longer pending, not processing it")
+            context.stop("not_pending")
+    
+    async def _providers_stage(self, context: QueryContext):
+        """Send the query to every provider concurrently and store the responses"""
+        query_id = context.query_id
+        tasks = [
+            asyncio.create_task(self._run_provider(context, provider_name))
+            for provider_name in context.available_providers
+        ]
+        self._active_tasks[query_id] = tasks
+        watcher = asyncio.create_task(self._watch_for_cancellation(query_id))
+        
+        # Wait for all providers to complete
+        try:
+            context.results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            watcher.cancel()
+            self._active_tasks.pop(query_id, None)
+        
+        if await self._cancellation_confirmed(query_id):
+            self._cancelled_queries.discard(query_id)
+            logger.info(f"Query {query_id} was cancelled")
+            context.stop("cancelled")
+            return
+        
+        if not await self.states.transition(query_id, EVALUATING):
+            logger.info(f"Query {query_id} changed status before evaluation, not evaluating it")
+            context.stop("status_changed")
+    
+    async def _run_provider(self, context: QueryContext, provider_name: str) -> bool:
+        """Run one provider of a query, recording its sub-state"""
+        query_id = context.query_id
+        self.states.set_provider_state(query_id, provider_name, PROVIDER_RUNNING)
+        try:
+            succeeded = await self._process_with_provider(
+                context.query, provider_name,
+                use_cache=context.use_cache,
+                cheap_first=context.query.mode == "cheap_first"
+            )
+        except asyncio.CancelledError:
+            self.states.set_provider_state(query_id, provider_name, PROVIDER_CANCELLED)
+            raise
+        self.states.set_provider_state(query_id, provider_name, PROVIDER_SUCCEEDED if succeeded else PROVIDER_FAILED)
+        return succeeded
+    
+    async def _evaluate_stage(self, context: QueryContext):
+        """Compute evaluation metrics for the responses to a query
+        
+        Responses that were already evaluated keep their per-response metrics
+        and only get the set-dependent ones (similarity, originality) refreshed.
+        New responses are evaluated in full.
+        """
+        query_id = context.query_id
+        context.metric_updates, context.metric_creates = [], []
+        
+        # Cancelled by another worker after the providers finished
+        if await self._cancellation_confirmed(query_id):
+            self._cancelled_queries.discard(query_id)
+            logger.info(f"Query {query_id} was cancelled before evaluation")
+            context.stop("cancelled")
+            return
+        
+        # Responses are spooled; get them into the database before reading them back,
+        # evaluating only part of the response set would store wrong set-dependent metrics
+        if not await self.spool.flush():
+            raise ConnectionError(f"Response spool could not be flushed before evaluating query {query_id}")
+        
+        # Get all responses for the query
+        responses = await self.supabase_service.get_responses_for_query(query_id)
+        if not responses:
+            return
+        
+        # Get query for category information
+        query = context.query or await self.supabase_service.get_query(query_id)
+        if not query:
+            return
+        
+        # Convert responses to dict format for evaluation
+        response_dicts = []
+        for response in responses:
+            response_dicts.append({
+                'id': str(response.id),
+                'response_text': response.text,  # Use 'text' from LLMResponse
+                'provider': response.provider,
+                'model': response.model
+            })
+        
+        # Existing metric rows keyed by response id
+        existing_metrics = {
+            str(metric['response_id']): metric
+            for metric in await self.supabase_service.get_evaluation_metrics_for_query(
+                query_id, analysis_version=ANALYSIS_VERSION
+            )
+        }
+        
+        # Metrics that depend on the whole set change whenever a response is added;
+        # evaluation is CPU-bound, so it runs off the event loop
+        evaluation = await self.evaluation_pool.evaluate_response_set(
+            response_dicts, category=query.category, evaluated_ids=set(existing_metrics)
+        )
+        
+        for response in responses:
+            response_id_str = str(response.id)
+            set_fields = {
+                "similarity_scores": evaluation.get('similarity_matrix', []),
+                "average_similarity": evaluation.get('average_similarity', 0.0),
+                "originality_score": evaluation['originality_scores'].get(response_id_str)
+            }
+            
+            if response_id_str in existing_metrics:
+                context.metric_updates.append((existing_metrics[response_id_str]['id'], set_fields))
+                continue
+            
+            metrics_data = evaluation['response_metrics'][response_id_str]
+            context.metric_creates.append({
+                "query_id": query_id,
+                "response_id": response.id,
+                **set_fields,
+                "factuality_score": metrics_data.get('factuality_score'),
+                "readability_score": metrics_data.get('readability_score'),
+                "keyword_count": metrics_data.get('keyword_count'),
+                "keyword_list": metrics_data.get('keyword_list', []),
+                "tool_mentions": metrics_data.get('tool_mentions', []),
+                "seo_terms": metrics_data.get('seo_terms', []),
+                "response_length": metrics_data.get('response_length'),
+                "response_complexity": metrics_data.get('response_complexity'),
+                "analysis_version": ANALYSIS_VERSION,
+                "lexicon_version": evaluation.get('lexicon_version')
+            })
+    
+    async def _persist_metrics_stage(self, context: QueryContext):
+        """Write computed metrics; rows are dropped once written so a retry resumes where it failed"""
+        while context.metric_updates:
+            metric_id, set_fields = context.metric_updates[0]
+            await self.supabase_service.update_evaluation_metric(metric_id, set_fields)
+            context.metric_updates.pop(0)
+        
+        created = 0
+        while context.metric_creates:
+            await self.supabase_service.create_evaluation_metric(context.metric_creates[0])
+            context.metric_creates.pop(0)
+            created += 1
+        
+        logger.info(f"Generated evaluation metrics for query {context.query_id} ({created} new)")
+    
+    async def _finalize_stage(self, context: QueryContext):
+        """Record whether the query completed or failed"""
+        query_id = context.query_id
+        
+        # A cancellation that arrived during evaluation still wins
+        if await self._cancellation_confirmed(query_id):
+            self._cancelled_queries.discard(query_id)
+            logger.info(f"Query {query_id} was cancelled")
+            context.stop("cancelled")
+            return
+        
+        # Check if any providers succeeded
+        successful_responses = [r for r in context.results if isinstance(r, bool) and r]
+        
+        # A retry only runs the providers that failed earlier, so responses
+        # kept from the previous run still count towards completion
+        has_successful_response = bool(successful_responses)
+        if not has_successful_response and set(context.available_providers) != set(context.query.providers or []):
+            existing_responses = await self.supabase_service.get_responses_for_query(query_id)
+            has_successful_response = any(r.is_successful for r in existing_responses)
+        
+        if not await self.states.transition(query_id, COMPLETED if has_successful_response else FAILED):
+            # Another worker cancelled the query in the meantime
+            context.stop("status_changed")
+            return
+        
+        context.succeeded = len(successful_responses) > 0
+        logger.info(f"Query {query_id} processed with {len(successful_responses)} successful responses")
+    
+    
+    async def cancel_query(self, query_id: str) -> Optional[bool]:
+        """Cancel a query and stop its in-flight provider calls
+        
+        Returns None if the query does not exist and False if it already finished.
+        """
+        state = await self.supabase_service.get_query_state(query_id)
+        if not state:
+            return None
+        
+        # The write only matches while the query is still unfinished
+        if state["status"] in FINAL_STATUSES or not await self.states.transition(query_id, CANCELLED):
+            return False
+        
+        # Queries still waiting for a slot never start
+        if self.scheduler.remove(query_id):
+            logger.info(f"Removed cancelled query {query_id} from the schedule")
+            return True
+        
+        # Signal the other workers: the flag is polled while processing, the
+        # message reaches workers running the query straight away
+        await self.state.set(self._cancel_key(query_id), "1", ttl=settings.cancellation_ttl_seconds)
+        await self.state.publish(CANCEL_CHANNEL, query_id)
+        
+        self._cancel_local_tasks(query_id)
+        logger.info(f"Cancellation requested for query {query_id}")
+        return True
+    
+    def _cancel_key(self, query_id: str) -> str:
+        return f"query_cancel:{query_id}"
+    
+    def _cancel_local_tasks(self, query_id: str):
+        """Cancel the provider tasks of a query running in this process"""
+        tasks = self._active_tasks.get(query_id)
+        if not tasks:
+            # Not running here: the shared flag and the database record it
+            return
+        self._cancelled_queries.add(query_id)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    
+    async def _clear_cancellation(self, query_id: str):
+        """Forget a query's cancellation, so a later run of it is not stopped"""
+        self._cancelled_queries.discard(query_id)
+        await self.state.delete(self._cancel_key(query_id))
+    
+    async def _cancellation_confirmed(self, query_id: str) -> bool:
+        """Whether a query flagged as cancelled is still cancelled in the database
+        
+        A flag left over from before a retry is cleared instead of stopping
+        the new run, which would leave the query stuck in processing.
+        """
+        if not await self._is_cancelled(query_id):
+            return False
+        state = await self.supabase_service.get_query_state(query_id)
+        if state and state["status"] == CANCELLED:
+            return True
+        logger.warning(f"Ignoring stale cancellation of query {query_id}, which is {state and state['status']}")
+        await self._clear_cancellation(query_id)
+        return False
+    
+    async def _is_cancelled(self, query_id: str) -> bool:
+        """Check whether a query was cancelled in this or any other process"""
+        if query_id in self._cancelled_queries:
+            return True
+        
+        if await self.state.exists(self._cancel_key(query_id)):
+            return True
+        if self.state.shared:
+            return False
+        
+        # Without shared state other workers' cancellations are only in the database
+        state = await self.supabase_service.get_query_state(query_id)
+        return bool(state and state["status"] == CANCELLED)
+    
+    async def _watch_for_cancellation(self, query_id: str):
+        """Cancel local provider tasks when another process cancels the query"""
+        try:
+            while True:
+                await asyncio.sleep(settings.cancellation_poll_seconds)
+                if await self._cancellation_confirmed(query_id):
+                    self._cancel_local_tasks(query_id)
+                    return
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Stopped watching query {query_id} for cancellation: {e}")
+    
+    async def get_providers_to_retry(self, query: QueryResponse) -> List[str]:
+        """Get the providers of a query that errored or never produced a response"""
+        responses = await self.supabase_service.get_responses_for_query(str(query.id))
+        succeeded = {r.provider for r in responses if r.is_successful}
+        
+        # Queries created before providers were stored fall back to the
+        # providers seen in their responses, then to every configured provider
+        query_providers = query.providers or list(dict.fromkeys(r.provider for r in responses if r.provider))
+        if not query_providers:
+            query_providers = list(self.providers.keys())
+        
+        return [provider for provider in query_providers if provider not in succeeded]
+    
+    async def retry_query(self, query_id: str) -> Optional[List[str]]:
+        """Prepare a query for retry and return the providers that need to run again
+        
+        Raises InvalidTransition while the query is still running.
+        """
+        try:
+            # Spooled responses count when deciding which providers failed
+            await self.spool.flush()
+            
+            query = await self.supabase_service.get_query(query_id)
+            if not query:
+                return None
             
-            # Generate evaluation metrics
-            await self._generate_evaluation_metrics(query_id)
+            if not can_transition(query.status, PENDING):
+                raise InvalidTransition(query_id, query.status, PENDING)
             
-            logger.info(f"Query {query_id} processed with {len(successful_responses)} successful responses")
-            return len(successful_responses) > 0
+            providers = await self.get_providers_to_retry(query)
+            if not providers:
+                logger.info(f"Query {query_id} has no failed providers to retry")
+                return []
             
+            # Drop the failed rows so the retry does not leave duplicates behind
+            await self.supabase_service.delete_responses_for_providers(query_id, providers)
+            provider_states = {**query.provider_states, **{provider: PROVIDER_PENDING for provider in providers}}
+            if not await self.states.transition(query_id, PENDING, provider_states):
+                raise InvalidTransition(query_id, query.status, PENDING)
+            # A cancellation of the previous run must not stop this one
+            await self._clear_cancellation(query_id)
+            
+            logger.info(f"Retrying query {query_id} with providers: {providers}")
+            return providers
+        
+        except InvalidTransition:
+            raise
         except Exception as e:
-            logger.error(f"Error processing query {query_id}: {e}")
-            # Update query status to failed
-            try:
-                await self.supabase_service.update_query_status(query_id, "failed")
-            except:
-                pass
-            return False
+            logger.error(f"Error preparing retry for query {query_id}: {e}")
+            raise
     
-    async def _process_with_provider(self, query: QueryResponse, provider_name: str) -> bool:
-        """Process query with a specific provider"""
+    async def _process_with_provider(self, query: QueryResponse, provider_name: str,
+                                     model: str = None, generation_params: Dict[str, Any] = None,
+                                     extra_metadata: Dict[str, Any] = None, use_cache: bool = False,
+                                     cheap_first: bool = False) -> bool:
+        """Process query with a specific provider, optionally overriding model and generation settings
+        
+        With cheap_first, the provider's cheap model answers first and the
+        requested model only runs if that answer misses a quality threshold.
+        Only the answer that is kept is stored; the escalation decision goes
+        into its metadata.
+        """
+        provider = None
         try:
             provider = self.providers[provider_name]
+            model = model or provider.model
+            generation_params = generation_params or {}
+            
+            escalation = None
+            cheap_model = settings.cheap_models.get(provider_name) if cheap_first else None
+            if cheap_model and cheap_model != model:
+                llm_response, cached = await self._call_provider(provider_name, query.prompt, cheap_model, generation_params, use_cache)
+                shortfalls = ["error"] if llm_response.error else self.evaluation_service.find_quality_shortfalls(
+                    llm_response.text,
+                    query.category,
+                    min_readability=settings.escalation_min_readability,
+                    min_seo_term_count=settings.escalation_min_seo_term_count,
+                    min_length=settings.escalation_min_length
+                )
+                escalation = {"cheap_model": cheap_model, "escalated": bool(shortfalls), "reasons": shortfalls}
+                
+                if shortfalls:
+                    logger.info(f"Escalating query {query.id} on {provider_name} from {cheap_model} to {model}: {shortfalls}")
+                    escalation["cheap_tokens_used"] = llm_response.tokens_used
+                    escalation["cheap_response_time_ms"] = llm_response.response_time_ms
+                    llm_response, cached = await self._call_provider(provider_name, query.prompt, model, generation_params, use_cache)
+                else:
+                    model = cheap_model
+            else:
+                llm_response, cached = await self._call_provider(provider_name, query.prompt, model, generation_params, use_cache)
             
-            # Send query to provider
-            llm_response = await provider.execute_with_retry(query.prompt)
+            response_metadata = dict(llm_response.metadata or {})
+            if cached:
+                response_metadata["cached"] = True
+            if escalation:
+                response_metadata["escalation"] = escalation
+            if generation_params:
+                response_metadata["generation_params"] = generation_params
+            if extra_metadata:
+                response_metadata.update(extra_metadata)
             
             # Create response record
             response_data = ResponseCreate(
                 query_id=query.id,
                 provider=provider_name,
-                model=provider.model,
+                model=model,
                 response_text=llm_response.text,
-                response_metadata=llm_response.metadata or {},
+                response_metadata=response_metadata,
                 tokens_used=llm_response.tokens_used,
                 response_time_ms=llm_response.response_time_ms,
                 error_message=llm_response.error
             )
             
-            await self.supabase_service.create_response(response_data)
+            await self._store_response(response_data)
             
             logger.info(f"Processed query {query.id} with {provider_name}: {'success' if llm_response.text else 'failed'}")
             return bool(llm_response.text)
@@ -169,104 +971,117 @@ class QueryOrchestrator:
                 error_response_data = ResponseCreate(
                     query_id=query.id,
                     provider=provider_name,
-                    model=provider.model if provider else "unknown",
+                    model=model or (provider.model if provider else "unknown"),
                     response_text="",
-                    response_metadata={},
+                    response_metadata={**(extra_metadata or {}), **({"generation_params": generation_params} if generation_params else {})},
                     error_message=str(e)
                 )
-                await self.supabase_service.create_response(error_response_data)
+                await self._store_response(error_response_data)
             except:
                 pass
             
             return False
     
-    async def _generate_evaluation_metrics(self, query_id: str):
-        """Generate evaluation metrics for all responses to a query"""
+    async def _store_response(self, response_data: ResponseCreate):
+        """Record a response in the spool; the spool flusher writes it to the database"""
+        row = self.supabase_service.build_response_row(response_data)
         try:
-            # Get all responses for the query
-            responses = await self.supabase_service.get_responses_for_query(query_id)
-            if not responses:
-                return
-            
-            # Get query for category information
-            query = await self.supabase_service.get_query(query_id)
-            if not query:
-                return
-            
-            # Convert responses to dict format for evaluation
-            response_dicts = []
-            for response in responses:
-                response_dicts.append({
-                    'id': str(response.id),
-                    'response_text': response.text,  # Use 'text' from LLMResponse
-                    'provider': 'openai',  # Default for now
-                    'model': 'gpt-4'  # Default for now
-                })
-            
-            # Evaluate all responses
-            evaluation_results = self.evaluation_service.evaluate_all_responses(
-                response_dicts, 
-                category=query.category
-            )
-            
-            # Create evaluation metrics for each response
-            for response in responses:
-                response_id_str = str(response.id)
-                if response_id_str in evaluation_results['response_metrics']:
-                    metrics_data = evaluation_results['response_metrics'][response_id_str]
-                    
-                    # Create evaluation metric record
-                    metric_data = {
-                        "query_id": query_id,
-                        "response_id": response.id,
-                        "similarity_scores": evaluation_results.get('similarity_matrix', []),
-                        "average_similarity": evaluation_results.get('average_similarity', 0.0),
-                        "originality_score": metrics_data.get('originality_score'),
-                        "factuality_score": metrics_data.get('factuality_score'),
-                        "readability_score": metrics_data.get('readability_score'),
-                        "keyword_count": metrics_data.get('keyword_count'),
-                        "keyword_list": metrics_data.get('keyword_list', []),
-                        "tool_mentions": metrics_data.get('tool_mentions', []),
-                        "seo_terms": metrics_data.get('seo_terms', []),
-                        "response_length": metrics_data.get('response_length'),
-                        "response_complexity": metrics_data.get('response_complexity'),
-                        "analysis_version": "1.0"
-                    }
-                    
-                    await self.supabase_service.create_evaluation_metric(metric_data)
-            
-            logger.info(f"Generated evaluation metrics for query {query_id}")
-            
+            await self.spool.append(row)
         except Exception as e:
-            logger.error(f"Error generating evaluation metrics for query {query_id}: {e}")
+            logger.error(f"Response spool unavailable, writing response directly: {e}")
+            await self.supabase_service.create_responses([row])
+    
+    async def _call_provider(self, provider_name: str, prompt: str, model: str,
+                             generation_params: Dict[str, Any], use_cache: bool) -> Tuple[LLMResponse, bool]:
+        """Call a provider, or answer from the response cache; returns the response and whether it was cached"""
+        if use_cache:
+            llm_response = await self.response_cache.get(provider_name, model, prompt, generation_params)
+            if llm_response is not None:
+                return llm_response, True
+        
+        # Send query to provider
+        self.admission.call_started()
+        throttled = False
+        try:
+            started = time.monotonic()
+            llm_response = await self.providers[provider_name].execute_with_retry(prompt, model=model, **generation_params)
+            self.latency.record(provider_name, model, time.monotonic() - started)
+            throttled = is_throttled_error(llm_response.error)
+        finally:
+            self.admission.call_finished(throttled=throttled)
+        
+        if use_cache:
+            await self.response_cache.set(provider_name, model, prompt, llm_response, generation_params)
+        return llm_response, False
+    
+    async def _generate_evaluation_metrics(self, query_id: str, query: QueryResponse = None):
+        """Run only the evaluation stages of the query pipeline for a query"""
+        await self.query_pipeline.run(QueryContext(query_id=query_id, query=query), stages=EVALUATION_STAGES)
     
     async def get_query_status(self, query_id: str) -> Optional[QueryStatus]:
-        """Get current status of a query"""
+        """Get current status of a query from its status fields, with a single read"""
         try:
-            query = await self.supabase_service.get_query(query_id)
-            if not query:
+            state = await self.supabase_service.get_query_state(query_id)
+            if not state:
                 return None
             
-            # Get completed providers
-            responses = await self.supabase_service.get_responses_for_query(query_id)
-            completed_providers = [r.provider for r in responses if r.is_successful]
+            provider_states = state["provider_states"]
+            completed_providers = [p for p, s in provider_states.items() if s == PROVIDER_SUCCEEDED]
+            answered = {p for p, s in provider_states.items() if s in PROVIDER_FINAL_STATES}
             
-            # Get providers from query or use default
-            query_providers = getattr(query, 'providers', [])
+            # Sweep queries and queries finished before provider sub-states
+            # were recorded only have their responses to go by
+            if not provider_states and state["status"] not in (PENDING, CANCELLED):
+                responses = await self.supabase_service.get_responses_for_query(query_id)
+                completed_providers = [r.provider for r in responses if r.is_successful]
+                answered = {r.provider for r in responses}
             
             return QueryStatus(
-                id=query.id,
-                status=query.status,
+                id=state["id"],
+                status=state["status"],
                 completed_providers=completed_providers,
-                total_providers=len(query_providers),
-                message=self._get_status_message(query.status),
-                estimated_completion=None  # Could be calculated based on processing time
+                provider_states=provider_states,
+                total_providers=len(state["providers"]),
+                message=self._get_status_message(state["status"]),
+                estimated_completion=self._estimate_completion(state["status"], state["providers"], answered, state["updated_at"])
             )
             
         except Exception as e:
             logger.error(f"Error getting query status for {query_id}: {e}")
             return None
     
+    def _estimate_completion(self, status: str, providers: List[str], answered: Set[str],
+                             updated_at: datetime) -> Optional[datetime]:
+        """Estimate when an unfinished query completes from the latency sketches
+        
+        Outstanding providers run in parallel, so the slowest one's percentile
+        (settings.eta_quantile) decides, followed by the average time of the
+        evaluation and finalize stages. Time spent waiting for a slot is not
+        included. Returns None while a provider has no recorded calls yet.
+        """
+        if status not in ACTIVE_STATUSES:
+            return None
+        
+        provider_seconds = []
+        for provider_name in providers or []:
+            if provider_name in answered:
+                continue
+            provider = self.providers.get(provider_name)
+            seconds = self.latency.quantile_seconds(provider_name, provider.model if provider else None, settings.eta_quantile)
+            if seconds is None:
+                return None
+            provider_seconds.append(seconds)
+        
+        now = datetime.now(timezone.utc) if updated_at.tzinfo else datetime.utcnow()
+        remaining = max(provider_seconds, default=0.0)
+        if status == PROCESSING:
+            # Provider calls started when the query moved to processing
+            remaining = max(0.0, remaining - (now - updated_at).total_seconds())
+        
+        stage_metrics = self.query_pipeline.get_metrics()
+        remaining += sum(stage_metrics[name]["avg_run_seconds"] for name in EVALUATION_STAGES + ["finalize"])
+        return now + timedelta(seconds=remaining)
+    
     async def get_query_results(self, query_id: str) -> Optional[Dict[str, Any]]:
         """Get complete results for a query including responses and metrics"""
         try:
@@ -282,8 +1097,8 @@ class QueryOrchestrator:
                 response_dicts.append({
                     "id": response.id,
                     "query_id": query_id,
-                    "provider": "openai",  # Default for now
-                    "model": "gpt-4",  # Default for now
+                    "provider": response.provider,
+                    "model": response.model,
                     "response_text": response.text,
                     "response_metadata": response.metadata,
                     "tokens_used": response.tokens_used,
@@ -321,7 +1136,10 @@ class QueryOrchestrator:
         messages = {
             "pending": "Query is waiting to be processed",
             "processing": "Query is being processed by LLM providers",
+            "evaluating": "Responses are being evaluated",
             "completed": "Query processing completed successfully",
-            "failed": "Query processing failed"
+            "failed": "Query processing failed",
+            "cancelled": "Query was cancelled",
+            "interrupted": "Query was interrupted by a restart and will be resumed"
         }
         return messages.get(status, "Unknown status") 
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+import bisect
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+@dataclass(frozen=True)
+class PhraseMatch:
+    """One occurrence of a lexicon phrase in a text"""
+    phrase: str
+    labels: Tuple[str, ...]
+    start: int
+    end: int
+
+def _normalize(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+# Joins texts matched in one scan; no phrase contains or matches across it
+BATCH_SEPARATOR = "\0"
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Regex alternation of phrases factored into a character trie
+    
+    The regex engine then follows one branch per character instead of trying
+    every phrase in turn, so matching cost barely grows with the lexicon.
+    Optional tails are greedy, so the longest phrase at a position is tried
+    first. Spaces match any run of whitespace.
+    """
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node: Dict[str, dict]) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+    
+    return build(trie)
+
+class PhraseMatcher:
+    """Finds every occurrence of many phrases in one pass over a text
+    
+    The phrases of all lexicons are compiled into a single trie-shaped
+    pattern, so a scan is one pass of the regex engine however many phrases
+    there are. Phrases only match whole words ("moz" does not match inside
+    "mozilla") and must start with a letter or digit. At each position the
+    longest phrase wins; shorter phrases it begins with ("screaming frog" in
+    "screaming frog seo spider") come from a table built up front, and the
+    scan resumes right after the start of each match, so nested and
+    overlapping occurrences are all reported. Each phrase carries the labels
+    of the lexicons it came from.
+    """
+    
+    def __init__(self, lexicons: Dict[str, Iterable[str]]):
+        self._labels: Dict[str, Tuple[str, ...]] = {}
+        for label, phrases in lexicons.items():
+            for phrase in phrases:
+                phrase = _normalize(phrase)
+                if phrase and label not in self._labels.get(phrase, ()):
+                    self._labels[phrase] = self._labels.get(phrase, ()) + (label,)
+        
+        trie = _trie_pattern(self._labels)
+        self._pattern = re.compile(r"\b(?:" + trie + r")(?!\w)") if trie else None
+        self._ignorecase_pattern = re.compile(self._pattern.pattern, re.IGNORECASE) if trie else None
+        
+        # Shorter phrases that a phrase starts with and that end on a word boundary
+        self._prefixes: Dict[str, List[Tuple[str, re.Pattern]]] = {}
+        for phrase in self._labels:
+            for other in self._labels:
+                if len(other) < len(phrase) and phrase.startswith(other) and not _is_word_char(phrase[len(other)]):
+                    self._prefixes.setdefault(phrase, []).append(
+                        (other, re.compile(r"\s+".join(re.escape(word) for word in other.split(" ")), re.IGNORECASE))
+                    )
+    
+    def find(self, text: str) -> List[PhraseMatch]:
+        """Find all phrase occurrences in a text, ordered by where they start"""
+        if not text or self._pattern is None:
+            return []
+        
+        # Matching lowercased text is much faster than a case-insensitive
+        # pattern, as long as lowercasing keeps every character's offset
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            pattern = self._pattern
+        else:
+            lowered, pattern = text, self._ignorecase_pattern
+        
+        matches = []
+        position = 0
+        while True:
+            match = pattern.search(lowered, position)
+            if match is None:
+                return matches
+            start = match.start()
+            phrase = match.group()
+            if phrase not in self._labels:
+                phrase = _normalize(phrase)
+            matches.append(PhraseMatch(phrase, self._labels[phrase], start, match.end()))
+            for prefix, prefix_pattern in self._prefixes.get(phrase, ()):
+                matches.append(PhraseMatch(prefix, self._labels[prefix], start, prefix_pattern.match(text, start).end()))
+            position = start + 1
+    
+    def find_all(self, texts: List[str]) -> List[List[PhraseMatch]]:
+        """Find the phrase occurrences of several texts with one scan, offsets per text"""
+        offsets = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + len(BATCH_SEPARATOR)
+        
+        results: List[List[PhraseMatch]] = [[] for _ in texts]
+        for match in self.find(BATCH_SEPARATOR.join(texts)):
+            index = bisect.bisect_right(offsets, match.start) - 1
+            offset = offsets[index]
+            results[index].append(PhraseMatch(match.phrase, match.labels, match.start - offset, match.end - offset))
+        return results
+
+# Compiled matchers by lexicon version or contents, so each lexicon version is built once
+_compiled: Dict[Tuple, PhraseMatcher] = {}
+MAX_COMPILED_MATCHERS = 8
+
+def get_phrase_matcher(lexicons: Dict[str, Iterable[str]], version: str = None) -> PhraseMatcher:
+    """Get the matcher for a set of lexicons, compiling it the first time it is asked for
+    
+    With a version, the matcher is looked up by version alone, which is
+    cheaper than by contents; a version must always name the same lexicons.
+    """
+    key = ("version", version) if version else tuple(
+        sorted((label, tuple(phrases)) for label, phrases in lexicons.items())
+    )
+    matcher = _compiled.get(key)
+    if matcher is None:
+        if len(_compiled) >= MAX_COMPILED_MATCHERS:
+            _compiled.pop(next(iter(_compiled)))
+        matcher = _compiled[key] = PhraseMatcher(dict(lexicons))
+    return matcher
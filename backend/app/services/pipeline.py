@@ -0,0 +1,173 @@
+import asyncio
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+class StageError(Exception):
+    """A required stage failed after using up its retries"""
+    
+    def __init__(self, stage: str, cause: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+@dataclass
+class PipelineContext:
+    """State handed from stage to stage for one item of work"""
+    stopped: bool = False
+    stop_reason: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    
+    def stop(self, reason: str):
+        """Skip the remaining stages"""
+        self.stopped = True
+        self.stop_reason = reason
+
+@dataclass
+class Stage:
+    """One step of a pipeline with its own limits and retry policy
+    
+    At most `concurrency` items run the handler at once and at most
+    `queue_size` more wait for a slot; further callers block until the queue
+    has room, which pushes back on the stages before it. Failures of an
+    optional stage are recorded on the context and the pipeline carries on.
+    """
+    name: str
+    handler: Callable[[Any], Awaitable[None]]
+    concurrency: int = 8
+    queue_size: int = 100
+    timeout: Optional[float] = None
+    retries: int = 0
+    retry_backoff_seconds: float = 0.5
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+    required: bool = True
+
+class StageRunner:
+    """Enforces a stage's limits and keeps its statistics"""
+    
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self._capacity = asyncio.Semaphore(stage.concurrency + stage.queue_size)
+        self._workers = asyncio.Semaphore(stage.concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.timed_out = 0
+        self.total_run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        self.total_wait_seconds = 0.0
+    
+    async def run(self, context: PipelineContext):
+        stage = self.stage
+        enqueued = time.monotonic()
+        
+        async with self._capacity:
+            self.waiting += 1
+            try:
+                await self._workers.acquire()
+            finally:
+                self.waiting -= 1
+            
+            self.running += 1
+            started = time.monotonic()
+            self.total_wait_seconds += started - enqueued
+            try:
+                await self._run_with_retries(context)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                context.errors[stage.name] = str(e)
+                if stage.required:
+                    raise StageError(stage.name, e) from e
+                logger.warning(f"Optional stage '{stage.name}' failed: {e}")
+            finally:
+                elapsed = time.monotonic() - started
+                context.timings[stage.name] = elapsed
+                self.total_run_seconds += elapsed
+                self.max_run_seconds = max(self.max_run_seconds, elapsed)
+                self.running -= 1
+                self._workers.release()
+    
+    async def _run_with_retries(self, context: PipelineContext):
+        stage = self.stage
+        attempt = 0
+        while True:
+            try:
+                if stage.timeout:
+                    await asyncio.wait_for(stage.handler(context), timeout=stage.timeout)
+                else:
+                    await stage.handler(context)
+                return
+            except asyncio.TimeoutError as e:
+                self.timed_out += 1
+                error = e
+            except stage.retry_on as e:
+                error = e
+            
+            if attempt >= stage.retries:
+                raise error
+            attempt += 1
+            self.retried += 1
+            logger.info(f"Retrying stage '{stage.name}' (attempt {attempt + 1}/{stage.retries + 1}): {error}")
+            await asyncio.sleep(stage.retry_backoff_seconds * (2 ** (attempt - 1)))
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "concurrency": self.stage.concurrency,
+            "queue_size": self.stage.queue_size,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "timed_out": self.timed_out,
+            "avg_run_seconds": self.total_run_seconds / finished if finished else 0.0,
+            "max_run_seconds": self.max_run_seconds,
+            "avg_wait_seconds": self.total_wait_seconds / finished if finished else 0.0
+        }
+
+class Pipeline:
+    """Runs a context through an ordered list of stages"""
+    
+    def __init__(self, name: str, stages: List[Stage] = None):
+        self.name = name
+        self._runners: List[StageRunner] = [StageRunner(stage) for stage in stages or []]
+    
+    @property
+    def stage_names(self) -> List[str]:
+        return [runner.stage.name for runner in self._runners]
+    
+    def add_stage(self, stage: Stage, before: str = None, after: str = None):
+        """Add a stage at the end, or before/after an existing stage"""
+        if stage.name in self.stage_names:
+            raise ValueError(f"Stage '{stage.name}' already exists in pipeline '{self.name}'")
+        
+        index = len(self._runners)
+        anchor = before or after
+        if anchor:
+            if anchor not in self.stage_names:
+                raise ValueError(f"Unknown stage: {anchor}")
+            index = self.stage_names.index(anchor) + (1 if after else 0)
+        self._runners.insert(index, StageRunner(stage))
+    
+    async def run(self, context: PipelineContext, stages: List[str] = None) -> PipelineContext:
+        """Run the context through every stage, or only the named ones, in order"""
+        for runner in self._runners:
+            if context.stopped:
+                break
+            if stages is not None and runner.stage.name not in stages:
+                continue
+            await runner.run(context)
+        return context
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {runner.stage.name: runner.get_metrics() for runner in self._runners}
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Query states
+PENDING = "pending"
+PROCESSING = "processing"
+EVALUATING = "evaluating"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# Cut short by a worker shutting down; another worker picks it up again
+INTERRUPTED = "interrupted"
+
+ACTIVE_STATUSES = (PENDING, PROCESSING, EVALUATING)
+FINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+# Allowed moves; finished queries go back to pending when they are retried
+TRANSITIONS: Dict[str, Set[str]] = {
+    PENDING: {PROCESSING, FAILED, CANCELLED, INTERRUPTED},
+    PROCESSING: {EVALUATING, COMPLETED, FAILED, CANCELLED, INTERRUPTED},
+    EVALUATING: {COMPLETED, FAILED, CANCELLED, INTERRUPTED},
+    INTERRUPTED: {PENDING, CANCELLED},
+    COMPLETED: {PENDING},
+    FAILED: {PENDING},
+    CANCELLED: {PENDING}
+}
+
+# Provider sub-states, kept per query in the provider_states column
+PROVIDER_PENDING = "pending"
+PROVIDER_RUNNING = "running"
+PROVIDER_SUCCEEDED = "succeeded"
+PROVIDER_FAILED = "failed"
+PROVIDER_CANCELLED = "cancelled"
+
+PROVIDER_FINAL_STATES = (PROVIDER_SUCCEEDED, PROVIDER_FAILED, PROVIDER_CANCELLED)
+
+# Changes nobody waits on; they are written with the next flush
+DEFERRED_STATUSES = (EVALUATING,)
+
+class InvalidTransition(Exception):
+    """A query cannot move from its current status to the requested one"""
+    
+    def __init__(self, query_id: str, current: Optional[str], status: str):
+        super().__init__(f"Query {query_id} cannot move from '{current}' to '{status}'")
+        self.query_id = query_id
+        self.current = current
+        self.status = status
+
+def can_transition(current: Optional[str], status: str) -> bool:
+    """Check whether the state machine allows moving from current to status"""
+    return status in TRANSITIONS.get(current, ())
+
+def predecessors(status: str) -> Set[str]:
+    """Statuses a query may be in when it moves to status"""
+    return {current for current, targets in TRANSITIONS.items() if status in targets}
+
+class QueryStateTracker:
+    """Moves queries through the state machine and coalesces their status writes
+    
+    Status changes other requests act on (processing, the final states and
+    back to pending for retries) are written straight away as a conditional
+    update that only matches while the stored status may move to the new
+    one, so a query cancelled by another worker is never marked completed.
+    Provider sub-states and the evaluating step are merged in memory and
+    written with the next flush or the next immediate change, one update per
+    query. A deferred step is checked against the last status this worker
+    wrote or saw, so it is refused once the query was cancelled here.
+    """
+    
+    def __init__(self, supabase_service, flush_seconds: float = None):
+        self.supabase_service = supabase_service
+        self.flush_seconds = flush_seconds or settings.status_flush_seconds
+        # Fields waiting to be written, per query
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Provider sub-states of the queries this worker is running
+        self._provider_states: Dict[str, Dict[str, str]] = {}
+        # Last status known to be stored, per query this worker moved
+        self._statuses: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.coalesced = 0
+        self.rejected = 0
+    
+    def _lock(self, query_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(query_id, asyncio.Lock())
+    
+    async def transition(self, query_id: str, status: str, provider_states: Dict[str, str] = None,
+                         expected: str = None) -> bool:
+        """Move a query to status; returns False if its stored status does not allow it
+        
+        provider_states replaces the query's provider sub-states. With
+        expected, the move only happens from that status.
+        """
+        if provider_states is not None:
+            self._provider_states[query_id] = dict(provider_states)
+            self._queue(query_id, {"provider_states": dict(provider_states)})
+        
+        if status in DEFERRED_STATUSES:
+            current = self._statuses.get(query_id)
+            if not can_transition(current, status) or (expected is not None and current != expected):
+                self.rejected += 1
+                logger.info(f"Query {query_id} was not moved to '{status}'; it is '{current}'")
+                return False
+            self._statuses[query_id] = status
+            self._queue(query_id, {"status": status})
+            return True
+        
+        async with self._lock(query_id):
+            fields = {**self._pending.pop(query_id, {}), "status": status}
+            accepted = await self._write(query_id, fields, expected)
+        
+        if status in FINAL_STATUSES or status == INTERRUPTED:
+            self._statuses.pop(query_id, None)
+        if status in FINAL_STATUSES:
+            self._provider_states.pop(query_id, None)
+            if query_id not in self._pending:
+                self._locks.pop(query_id, None)
+        return accepted
+    
+    def set_provider_state(self, query_id: str, provider: str, state: str):
+        """Record a provider's progress; written with the next flush"""
+        states = self._provider_states.setdefault(query_id, {})
+        states[provider] = state
+        self._queue(query_id, {"provider_states": dict(states)})
+    
+    def _queue(self, query_id: str, fields: Dict[str, Any]):
+        pending = self._pending.setdefault(query_id, {})
+        if pending:
+            self.coalesced += 1
+        pending.update(fields)
+    
+    async def _write(self, query_id: str, fields: Dict[str, Any], expected: str = None) -> bool:
+        """Write fields in one update, guarding a status change by the state machine"""
+        status = fields.get("status")
+        self.writes += 1
+        if status is None:
+            return await self.supabase_service.update_query_state(query_id, fields)
+        
+        allowed_from = predecessors(status)
+        if expected is not None:
+            allowed_from &= {expected}
+        if await self.supabase_service.update_query_state(query_id, fields, allowed_from=allowed_from):
+            self._statuses[query_id] = status
+            return True
+        
+        # Changed by someone else; what it is now is not known here
+        self._statuses.pop(query_id, None)
+        self.rejected += 1
+        logger.info(f"Query {query_id} was not moved to '{status}'; its stored status does not allow it")
+        # Provider progress is still worth keeping
+        if "provider_states" in fields:
+            self.writes += 1
+            await self.supabase_service.update_query_state(query_id, {"provider_states": fields["provider_states"]})
+        return False
+    
+    async def flush(self):
+        """Write every query's pending fields"""
+        for query_id in list(self._pending):
+            async with self._lock(query_id):
+                fields = self._pending.pop(query_id, None)
+                if not fields:
+                    continue
+                try:
+                    await self._write(query_id, fields)
+                except Exception as e:
+                    logger.warning(f"Could not write status of query {query_id}, will retry: {e}")
+                    # Newer changes win over the ones that failed
+                    self._pending[query_id] = {**fields, **self._pending.get(query_id, {})}
+            if query_id not in self._pending and query_id not in self._provider_states:
+                self._locks.pop(query_id, None)
+    
+    def start(self):
+        """Start flushing coalesced writes in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        """Stop the background flusher after a last flush"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Query status flush failed: {e}")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "pending_queries": len(self._pending),
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "rejected_transitions": self.rejected
+        }
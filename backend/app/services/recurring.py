@@ -0,0 +1,212 @@
+import asyncio
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.query import QueryCreate
+from app.schemas.recurring import RecurringQueryCreate, RecurringQueryResponse
+from app.services.query_state import COMPLETED
+from app.services.scheduler import BATCH
+
+logger = logging.getLogger(__name__)
+
+# Evaluation features compared between runs; all are stored in evaluation_metrics
+SET_FEATURES = ("keyword_list", "tool_mentions", "seo_terms")
+SCORE_FEATURES = ("readability_score", "factuality_score")
+
+def _jaccard_distance(previous: List[str], current: List[str]) -> float:
+    previous_set, current_set = set(previous or []), set(current or [])
+    union = previous_set | current_set
+    if not union:
+        return 0.0
+    return 1 - len(previous_set & current_set) / len(union)
+
+def compute_drift(previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> Tuple[Optional[float], Dict[str, Dict[str, Any]]]:
+    """Compare the evaluation features of two runs, per provider
+    
+    Each component is scaled to 0.0 (unchanged) .. 1.0 (completely different):
+    Jaccard distance for keyword, tool and SEO term sets, absolute change for
+    the 0..1 scores and relative change for response length. A provider that
+    only answered in one of the runs counts as fully drifted.
+    """
+    provider_drift = {}
+    for provider in sorted(set(previous) | set(current)):
+        before, after = previous.get(provider), current.get(provider)
+        if not before or not after:
+            provider_drift[provider] = {
+                "status": "missing_previous" if not before else "missing_current",
+                "drift_score": 1.0
+            }
+            continue
+        
+        components = {}
+        for feature in SET_FEATURES:
+            components[f"{feature}_drift"] = _jaccard_distance(before.get(feature), after.get(feature))
+        for feature in SCORE_FEATURES:
+            components[f"{feature}_delta"] = abs((after.get(feature) or 0.0) - (before.get(feature) or 0.0))
+        
+        length_before = before.get("response_length") or 0
+        length_after = after.get("response_length") or 0
+        components["length_change"] = (
+            abs(length_after - length_before) / max(length_before, length_after)
+            if max(length_before, length_after) else 0.0
+        )
+        
+        components["drift_score"] = sum(components.values()) / len(components)
+        provider_drift[provider] = components
+    
+    if not provider_drift:
+        return None, {}
+    
+    drift_score = sum(d["drift_score"] for d in provider_drift.values()) / len(provider_drift)
+    return drift_score, provider_drift
+
+def next_run_time(interval_seconds: int, now: datetime = None) -> datetime:
+    """Pick the next run time with jitter so definitions created together spread out"""
+    now = now or datetime.utcnow()
+    jitter = settings.recurring_jitter_fraction * interval_seconds
+    return now + timedelta(seconds=interval_seconds + random.uniform(-jitter, jitter))
+
+class RecurringQueryRunner:
+    """Fires recurring query definitions when they are due and records drift
+    
+    Runs as a background loop in every worker. Workers claim a due run with a
+    conditional update, so each run fires once however many workers poll.
+    """
+    
+    def __init__(self, orchestrator, poll_seconds: float = None):
+        self.orchestrator = orchestrator
+        self.supabase_service = orchestrator.supabase_service
+        self.poll_seconds = poll_seconds or settings.recurring_poll_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._runs = set()
+    
+    async def create(self, recurring_data: RecurringQueryCreate) -> RecurringQueryResponse:
+        """Store a new definition; its first run is spread over the first interval's jitter"""
+        jitter = settings.recurring_jitter_fraction * recurring_data.interval_seconds
+        first_run = datetime.utcnow() + timedelta(seconds=random.uniform(0, jitter))
+        return await self.supabase_service.create_recurring_query(recurring_data, first_run)
+    
+    def start(self):
+        """Start polling for due definitions"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Recurring query runner started (polling every {self.poll_seconds}s)")
+    
+    async def stop(self):
+        """Stop polling; runs already fired finish through the scheduler"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"Recurring query poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+    
+    async def run_due(self) -> int:
+        """Fire every due definition this worker manages to claim"""
+        fired = 0
+        now = datetime.utcnow()
+        for recurring in await self.supabase_service.get_due_recurring_queries(now):
+            if not await self.supabase_service.claim_recurring_run(recurring, next_run_time(recurring.interval_seconds, now)):
+                continue
+            if await self.fire(recurring):
+                fired += 1
+        return fired
+    
+    async def fire(self, recurring: RecurringQueryResponse) -> bool:
+        """Create this run's query and schedule it as batch work
+        
+        The run goes through admission like any other query. When the server
+        is overloaded it is rescheduled for after the suggested back-off
+        instead, and False is returned.
+        """
+        decision = self.orchestrator.admission.try_admit()
+        if not decision.admitted:
+            retry_at = datetime.utcnow() + timedelta(seconds=max(decision.retry_after, 1))
+            await self.supabase_service.update_recurring_query(str(recurring.id), {"next_run_at": retry_at.isoformat()})
+            logger.warning(f"Recurring query {recurring.id} not admitted ({decision.reason}), retrying at {retry_at}")
+            return False
+        
+        try:
+            query = await self.orchestrator.create_query(QueryCreate(
+                prompt=recurring.prompt,
+                category=recurring.category,
+                tags=recurring.tags,
+                providers=recurring.providers,
+                user_id=recurring.user_id,
+                priority=BATCH
+            ))
+            job = self.orchestrator.scheduler.submit(
+                query.id,
+                recurring.providers,
+                user_id=recurring.user_id,
+                priority=BATCH,
+                ticket=decision.ticket,
+                use_cache=True
+            )
+        except Exception:
+            self.orchestrator.admission.release(decision.ticket)
+            raise
+        logger.info(f"Fired recurring query {recurring.id} as query {query.id}")
+        
+        task = asyncio.create_task(self._record_drift(recurring, str(query.id), job.completion))
+        self._runs.add(task)
+        task.add_done_callback(self._runs.discard)
+        return True
+    
+    async def _record_drift(self, recurring: RecurringQueryResponse, query_id: str, completion: asyncio.Future):
+        """Wait for a run to finish, then compare it with the previous run
+        
+        Only a completed run is compared and becomes the baseline for the next
+        one; a failed or cancelled run leaves the previous baseline in place.
+        """
+        try:
+            succeeded = await completion
+            query = await self.supabase_service.get_query(query_id)
+            if not succeeded or not query or query.status != COMPLETED:
+                status = query.status if query else "missing"
+                logger.info(f"Run {query_id} of recurring query {recurring.id} did not complete ({status}), no drift recorded")
+                return
+            
+            previous_query_id = recurring.last_query_id
+            
+            drift_score, provider_drift = None, {}
+            if previous_query_id:
+                previous = await self._load_features(previous_query_id)
+                current = await self._load_features(query_id)
+                drift_score, provider_drift = compute_drift(previous, current)
+            
+            await self.supabase_service.create_drift_report({
+                "recurring_query_id": recurring.id,
+                "query_id": query_id,
+                "previous_query_id": previous_query_id,
+                "drift_score": drift_score,
+                "provider_drift": provider_drift
+            })
+            await self.supabase_service.update_recurring_query(str(recurring.id), {"last_query_id": query_id})
+        
+        except Exception as e:
+            logger.error(f"Error recording drift for recurring query {recurring.id}: {e}")
+    
+    async def _load_features(self, query_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get the stored evaluation features of a run keyed by provider"""
+        providers = await self.supabase_service.get_response_providers(query_id)
+        metrics = await self.supabase_service.get_evaluation_metrics_for_query(query_id)
+        
+        features = {}
+        for metric in metrics:
+            provider = providers.get(str(metric.get("response_id")))
+            if provider:
+                features[provider] = metric
+        return features
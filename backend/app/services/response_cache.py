@@ -0,0 +1,56 @@
+import json
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.state import get_state_backend
+from app.schemas.response import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Shared cache of successful provider responses
+    
+    Keyed by provider, model, prompt and generation settings, so identical
+    calls within the TTL (for example recurring queries that track the same
+    prompt) reuse one paid-for answer. Cache errors only cause a miss.
+    """
+    
+    def __init__(self, ttl_seconds: int = None, state=None):
+        self.ttl_seconds = ttl_seconds or settings.response_cache_ttl_seconds
+        self.state = state or get_state_backend()
+    
+    def _key(self, provider: str, model: str, prompt: str, generation_params: Dict[str, Any] = None) -> str:
+        payload = json.dumps([provider, model, prompt, generation_params or {}], sort_keys=True)
+        return f"response_cache:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+    
+    async def get(self, provider: str, model: str, prompt: str,
+                  generation_params: Dict[str, Any] = None) -> Optional[LLMResponse]:
+        """Get a cached response, or None on a miss"""
+        try:
+            cached = await self.state.get(self._key(provider, model, prompt, generation_params))
+        except Exception as e:
+            logger.warning(f"Response cache unavailable: {e}")
+            return None
+        if not cached:
+            return None
+        try:
+            return LLMResponse(**json.loads(cached))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cached response: {e}")
+            return None
+    
+    async def set(self, provider: str, model: str, prompt: str, response: LLMResponse,
+                  generation_params: Dict[str, Any] = None):
+        """Cache a successful response"""
+        if not response.text or response.error:
+            return
+        try:
+            await self.state.set(
+                self._key(provider, model, prompt, generation_params),
+                response.model_dump_json(),
+                ttl=self.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Could not cache response: {e}")
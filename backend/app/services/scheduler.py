@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+@dataclass(order=True)
+class ScheduledJob:
+    """A query waiting for a processing slot"""
+    start_tag: float
+    sequence: int
+    query_id: str = field(compare=False)
+    providers: Optional[List[str]] = field(compare=False, default=None)
+    user_id: str = field(compare=False, default="anonymous")
+    priority: str = field(compare=False, default=INTERACTIVE)
+    ticket: Optional[int] = field(compare=False, default=None)
+    finish_tag: float = field(compare=False, default=0.0)
+    use_cache: bool = field(compare=False, default=False)
+    # Resolves to the result of process_query once the job has run
+    completion: Optional[asyncio.Future] = field(compare=False, default=None, repr=False)
+
+class QueryScheduler:
+    """Schedules queries onto the orchestrator with per-user fair sharing
+    
+    Interactive queries always go ahead of batch queries, and a number of
+    processing slots are kept free of batch work so interactive latency does
+    not depend on how much bulk work is queued. Inside each priority class
+    users are served by start-time fair queuing: every job is tagged with the
+    virtual time its user is due to be served, weighted by the user's share and
+    the job's cost (its number of providers), and the smallest tag runs next.
+    """
+    
+    def __init__(self, orchestrator,
+                 max_concurrent: int = None,
+                 interactive_reserved_slots: int = None,
+                 user_weights: Dict[str, float] = None):
+        self.orchestrator = orchestrator
+        self.max_concurrent = max_concurrent or settings.max_concurrent_queries
+        self.interactive_reserved_slots = min(
+            interactive_reserved_slots if interactive_reserved_slots is not None else settings.interactive_reserved_slots,
+            self.max_concurrent - 1
+        )
+        self.user_weights = user_weights if user_weights is not None else settings.user_weights
+        
+        self._queues: Dict[str, List[ScheduledJob]] = {priority: [] for priority in PRIORITY_CLASSES}
+        self._virtual_time: Dict[str, float] = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._user_finish: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITY_CLASSES}
+        self._running: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._running_jobs: Dict[asyncio.Task, ScheduledJob] = {}
+        self._sequence = itertools.count()
+        self._draining = False
+    
+    def submit(self, query_id: str, providers: List[str] = None, user_id: str = None,
+               priority: str = INTERACTIVE, ticket: int = None, use_cache: bool = False) -> ScheduledJob:
+        """Queue a query for processing; must be called from the event loop"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        
+        user_id = user_id or "anonymous"
+        weight = float(self.user_weights.get(user_id, 1.0)) or 1.0
+        cost = max(1, len(providers or []))
+        
+        start_tag = max(self._virtual_time[priority], self._user_finish[priority].get(user_id, 0.0))
+        finish_tag = start_tag + cost / weight
+        self._user_finish[priority][user_id] = finish_tag
+        
+        job = ScheduledJob(
+            start_tag=start_tag,
+            sequence=next(self._sequence),
+            query_id=str(query_id),
+            providers=providers,
+            user_id=user_id,
+            priority=priority,
+            ticket=ticket,
+            finish_tag=finish_tag,
+            use_cache=use_cache,
+            completion=asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._queues[priority], job)
+        logger.info(f"Scheduled query {query_id} ({priority}, user {user_id})")
+        
+        self._dispatch()
+        return job
+    
+    def remove(self, query_id: str) -> bool:
+        """Drop a query that has not started yet, releasing its admission slot"""
+        query_id = str(query_id)
+        for priority, queue in self._queues.items():
+            for index, job in enumerate(queue):
+                if job.query_id == query_id:
+                    queue.pop(index)
+                    heapq.heapify(queue)
+                    if job.ticket is not None:
+                        self.orchestrator.admission.release(job.ticket)
+                    if not job.completion.done():
+                        job.completion.set_result(False)
+                    return True
+        return False
+    
+    def _can_start(self, priority: str) -> bool:
+        """Check if a job of the given class may take a slot now"""
+        running_total = sum(self._running.values())
+        if running_total >= self.max_concurrent:
+            return False
+        if priority == BATCH:
+            return self._running[BATCH] < self.max_concurrent - self.interactive_reserved_slots
+        return True
+    
+    def _next_job(self) -> Optional[ScheduledJob]:
+        """Pick the next job, interactive first, smallest start tag within a class"""
+        for priority in PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            if queue and self._can_start(priority):
+                job = heapq.heappop(queue)
+                self._virtual_time[priority] = job.start_tag
+                return job
+        return None
+    
+    def _dispatch(self):
+        """Start as many queued jobs as there are free slots"""
+        while not self._draining:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running[job.priority] += 1
+            task = asyncio.create_task(self._run(job))
+            self._running_jobs[task] = job
+            task.add_done_callback(lambda done: self._running_jobs.pop(done, None))
+    
+    async def drain(self, timeout: float) -> List[ScheduledJob]:
+        """Stop starting jobs and give the running ones up to timeout seconds to finish
+        
+        Returns the jobs that did not finish: queued jobs, which are dropped
+        without starting, and running jobs, which are cancelled at the timeout.
+        """
+        self._draining = True
+        unfinished = []
+        for queue in self._queues.values():
+            while queue:
+                job = heapq.heappop(queue)
+                if job.ticket is not None:
+                    self.orchestrator.admission.release(job.ticket)
+                if not job.completion.done():
+                    job.completion.set_result(False)
+                unfinished.append(job)
+        
+        if self._running_jobs:
+            logger.info(f"Waiting up to {timeout}s for {len(self._running_jobs)} running queries")
+            _, still_running = await asyncio.wait(list(self._running_jobs), timeout=timeout)
+            for task in still_running:
+                unfinished.append(self._running_jobs[task])
+                task.cancel()
+            await asyncio.gather(*still_running, return_exceptions=True)
+        return unfinished
+    
+    async def _run(self, job: ScheduledJob):
+        """Process a job and hand its slot to the next one"""
+        result = False
+        try:
+            if job.ticket is not None:
+                result = await self.orchestrator.process_admitted_query(job.ticket, job.query_id, job.providers,
+                                                                       use_cache=job.use_cache)
+            else:
+                result = await self.orchestrator.process_query(job.query_id, job.providers, use_cache=job.use_cache)
+        except Exception as e:
+            logger.error(f"Scheduled query {job.query_id} failed: {e}")
+        finally:
+            if not job.completion.done():
+                job.completion.set_result(bool(result))
+            self._running[job.priority] -= 1
+            # Reset virtual time once a class drains so idle users start level
+            if not self._queues[job.priority] and self._running[job.priority] == 0:
+                self._virtual_time[job.priority] = 0.0
+                self._user_finish[job.priority].clear()
+            self._dispatch()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue lengths and running counts per priority class"""
+        return {
+            "max_concurrent_queries": self.max_concurrent,
+            "interactive_reserved_slots": self.interactive_reserved_slots,
+            "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+            "running": dict(self._running),
+            "queued_by_user": {
+                priority: dict(Counter(job.user_id for job in queue))
+                for priority, queue in self._queues.items()
+            }
+        }
@@ -0,0 +1,250 @@
+import os
+import json
+import fcntl
+import itertools
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ResponseSpool:
+    """Append-only local journal of response rows on their way to the database
+    
+    Provider results are acknowledged once they are fsynced to the spool file,
+    so a slow or unavailable database neither holds up provider calls nor loses
+    paid-for output. Concurrent appends share one write and fsync. A flusher
+    writes the rows in batches and records how far it got in a checkpoint
+    file; rows keep their ids and are upserted, so replaying rows that were
+    written just before a crash does not duplicate them. Fully flushed spools
+    are truncated.
+    
+    Each worker process locks its own numbered slot next to the configured
+    path (response_spool.0.jsonl, response_spool.1.jsonl, ...), so workers on
+    one host never share a file. Rows left in slots that no running worker
+    holds are moved into the claiming worker's slot.
+    """
+    
+    def __init__(self, supabase_service, path: str = None, batch_size: int = None, flush_seconds: float = None):
+        self.supabase_service = supabase_service
+        self.base_path = Path(path or settings.response_spool_path)
+        self.path: Optional[Path] = None
+        self.checkpoint_path: Optional[Path] = None
+        self._slot_lock = None
+        self.batch_size = batch_size or settings.response_spool_batch_size
+        self.flush_seconds = flush_seconds or settings.response_spool_flush_seconds
+        self._buffer: List[Tuple[str, asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._file_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._repaired = False
+    
+    async def append(self, row: Dict[str, Any]):
+        """Durably record a row; returns once it is on disk"""
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((json.dumps(row, default=str) + "\n", future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_buffered())
+        await future
+    
+    async def _write_buffered(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer, []
+            try:
+                async with self._file_lock:
+                    await asyncio.to_thread(self._write_lines, [line for line, _ in batch])
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} rows to response spool: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+    
+    def _slot_path(self, slot: int) -> Path:
+        return self.base_path.with_name(f"{self.base_path.stem}.{slot}{self.base_path.suffix}")
+    
+    def _lock_slot(self, slot: int):
+        """Lock a slot for the life of the process; returns the open lock file or None if taken"""
+        slot_path = self._slot_path(slot)
+        lock_file = open(slot_path.with_name(slot_path.name + ".lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    
+    def _claim_slot(self):
+        """Claim the lowest free slot, then take over rows from slots nobody holds"""
+        if self.path is not None:
+            return
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        for slot in itertools.count():
+            self._slot_lock = self._lock_slot(slot)
+            if self._slot_lock:
+                break
+        self.path = self._slot_path(slot)
+        self.checkpoint_path = self.path.with_name(self.path.name + ".offset")
+        logger.info(f"Using response spool {self.path}")
+        
+        for orphan in self.base_path.parent.glob(f"{self.base_path.stem}.*{self.base_path.suffix}"):
+            orphan_slot = orphan.name[len(self.base_path.stem) + 1:len(orphan.name) - len(self.base_path.suffix)]
+            if not orphan_slot.isdigit() or int(orphan_slot) == slot:
+                continue
+            lock_file = self._lock_slot(int(orphan_slot))
+            if lock_file is None:
+                continue  # held by a running worker
+            try:
+                self._adopt(orphan)
+            finally:
+                lock_file.close()
+    
+    def _adopt(self, orphan: Path):
+        """Move the unflushed rows of another slot into this one"""
+        orphan_checkpoint = orphan.with_name(orphan.name + ".offset")
+        try:
+            offset = int(orphan_checkpoint.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        with open(orphan, "rb") as orphan_file:
+            orphan_file.seek(offset)
+            lines = [line.decode("utf-8") for line in orphan_file if line.endswith(b"\n")]
+        if lines:
+            self._truncate_partial_row()
+            self._write_lines(lines)
+            logger.info(f"Took over {len(lines)} unflushed rows from response spool {orphan}")
+        orphan.unlink()
+        orphan_checkpoint.unlink(missing_ok=True)
+    
+    def _write_lines(self, lines: List[str]):
+        self._claim_slot()
+        with open(self.path, "a", encoding="utf-8") as spool_file:
+            spool_file.writelines(lines)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+    
+    def _truncate_partial_row(self):
+        """Drop a row left half-written by a crash so the next append starts on a new line"""
+        self._claim_slot()
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as spool_file:
+            size = spool_file.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                step = min(4096, end)
+                spool_file.seek(end - step)
+                newline = spool_file.read(step).rfind(b"\n")
+                if newline != -1:
+                    end = end - step + newline + 1
+                    break
+                end -= step
+            if end != size:
+                logger.warning(f"Dropping {size - end} bytes of a partially written response spool row")
+                spool_file.truncate(end)
+    
+    def _read_checkpoint(self) -> int:
+        try:
+            return int(self.checkpoint_path.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+    
+    def _write_checkpoint(self, offset: int):
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp_path, "w") as checkpoint_file:
+            checkpoint_file.write(str(offset))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def _reset(self):
+        """Empty a fully flushed spool
+        
+        The checkpoint goes back to 0 first: a crash before the truncation
+        only replays rows that are already written (upserts, so harmless),
+        whereas a stale offset past the end of an emptied file would skip
+        the rows appended after it.
+        """
+        self._write_checkpoint(0)
+        with open(self.path, "rb+") as spool_file:
+            spool_file.truncate(0)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+    
+    def _read_pending(self, offset: int) -> List[Tuple[Dict[str, Any], int]]:
+        """Read complete rows after offset with the offset just past each of them"""
+        if not self.path.exists():
+            return []
+        rows = []
+        with open(self.path, "rb") as spool_file:
+            spool_file.seek(offset)
+            for line in spool_file:
+                if not line.endswith(b"\n"):
+                    break  # partially written row; it was never acknowledged
+                offset += len(line)
+                try:
+                    rows.append((json.loads(line), offset))
+                except ValueError as e:
+                    logger.error(f"Skipping unreadable response spool row ending at {offset}: {e}")
+        return rows
+    
+    async def flush(self) -> bool:
+        """Write spooled rows to the database; returns False if some are still pending"""
+        async with self._flush_lock:
+            if not self._repaired:
+                async with self._file_lock:
+                    await asyncio.to_thread(self._truncate_partial_row)
+                self._repaired = True
+            
+            offset = self._read_checkpoint()
+            pending = await asyncio.to_thread(self._read_pending, offset)
+            
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                try:
+                    await self.supabase_service.create_responses([row for row, _ in batch])
+                except Exception as e:
+                    logger.warning(f"Response spool flush stopped, {len(pending) - start} rows pending: {e}")
+                    return False
+                offset = batch[-1][1]
+                await asyncio.to_thread(self._write_checkpoint, offset)
+            
+            if pending:
+                logger.info(f"Flushed {len(pending)} spooled responses")
+            
+            # Start a fresh file once everything written so far is in the database
+            async with self._file_lock:
+                if offset and self.path.exists() and self.path.stat().st_size == offset:
+                    await asyncio.to_thread(self._reset)
+            return True
+    
+    def start(self):
+        """Replay rows left from a previous run, then keep flushing in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        """Stop the background flusher after a last flush"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Response spool flush failed: {e}")
+            await asyncio.sleep(self.flush_seconds)
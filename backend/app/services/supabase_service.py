@@ -1,13 +1,22 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set
 from app.core.supabase import get_supabase
 from app.schemas.query import QueryCreate, QueryResponse
 from app.schemas.response import ResponseCreate, LLMResponse
+from app.schemas.recurring import RecurringQueryCreate, RecurringQueryResponse, DriftReport
+from app.services.evaluation import ANALYSIS_VERSION
 import logging
 import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+def _version_key(version: Optional[str]):
+    """Sort key for analysis versions, so that 1.10 comes after 1.9"""
+    try:
+        return (1, tuple(int(part) for part in (version or "").split(".")))
+    except ValueError:
+        return (0, (version or "",))
+
 class SupabaseService:
     """Service for interacting with Supabase database"""
     
@@ -23,6 +32,8 @@ class SupabaseService:
                 "category": query_data.category,
                 "tags": query_data.tags or [],
                 "user_id": query_data.user_id,
+                "providers": query_data.providers or [],
+                "mode": query_data.mode,
                 "status": "pending",
                 "created_at": datetime.utcnow().isoformat(),
                 "updated_at": datetime.utcnow().isoformat()
@@ -35,8 +46,9 @@ class SupabaseService:
                 # Add computed fields that don't exist in DB
                 db_query_data["response_count"] = 0
                 db_query_data["successful_responses"] = 0
-                # Add providers from the original request (not stored in DB)
-                db_query_data["providers"] = query_data.providers or []
+                db_query_data["providers"] = db_query_data.get("providers") or []
+                db_query_data["mode"] = db_query_data.get("mode") or "standard"
+                db_query_data["provider_states"] = db_query_data.get("provider_states") or {}
                 return QueryResponse(**db_query_data)
             else:
                 raise Exception("Failed to create query")
@@ -45,6 +57,49 @@ class SupabaseService:
             logger.error(f"Error creating query: {e}")
             raise
     
+    async def create_queries(self, queries_data: List[QueryCreate], batch_id: str = None) -> List[QueryResponse]:
+        """Create many queries with a single insert"""
+        try:
+            if not queries_data:
+                return []
+            
+            now = datetime.utcnow().isoformat()
+            query_dicts = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "prompt": query_data.prompt,
+                    "category": query_data.category,
+                    "tags": query_data.tags or [],
+                    "user_id": query_data.user_id,
+                    "providers": query_data.providers or [],
+                    "mode": query_data.mode,
+                    "batch_id": batch_id,
+                    "status": "pending",
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for query_data in queries_data
+            ]
+            
+            response = self.supabase.table('queries').insert(query_dicts).execute()
+            
+            if not response.data or len(response.data) != len(query_dicts):
+                raise Exception("Failed to create queries")
+            
+            queries = []
+            for db_query_data in response.data:
+                db_query_data["response_count"] = 0
+                db_query_data["successful_responses"] = 0
+                db_query_data["providers"] = db_query_data.get("providers") or []
+                db_query_data["mode"] = db_query_data.get("mode") or "standard"
+                db_query_data["provider_states"] = db_query_data.get("provider_states") or {}
+                queries.append(QueryResponse(**db_query_data))
+            return queries
+        
+        except Exception as e:
+            logger.error(f"Error creating queries in bulk: {e}")
+            raise
+    
     async def get_query(self, query_id: str) -> Optional[QueryResponse]:
         """Get a query by ID"""
         try:
@@ -52,6 +107,9 @@ class SupabaseService:
             
             if response.data:
                 query_data = response.data[0]
+                query_data["providers"] = query_data.get("providers") or []
+                query_data["mode"] = query_data.get("mode") or "standard"
+                query_data["provider_states"] = query_data.get("provider_states") or {}
                 # Get response count and successful responses
                 responses = await self.get_responses_for_query(query_id)
                 query_data["response_count"] = len(responses)
@@ -63,6 +121,23 @@ class SupabaseService:
             logger.error(f"Error getting query {query_id}: {e}")
             raise
     
+    async def get_queries_for_batch(self, batch_id: str) -> List[QueryResponse]:
+        """Get the queries submitted under a batch or sweep id"""
+        try:
+            response = self.supabase.table('queries').select('*').eq('batch_id', batch_id).execute()
+            
+            queries = []
+            for query_data in response.data:
+                query_data["providers"] = query_data.get("providers") or []
+                query_data["mode"] = query_data.get("mode") or "standard"
+                query_data["provider_states"] = query_data.get("provider_states") or {}
+                queries.append(QueryResponse(**query_data))
+            return queries
+        
+        except Exception as e:
+            logger.error(f"Error getting queries for batch {batch_id}: {e}")
+            raise
+    
     async def get_queries(self, limit: int = 100, offset: int = 0) -> List[QueryResponse]:
         """Get all queries with pagination"""
         try:
@@ -70,6 +145,9 @@ class SupabaseService:
             
             queries = []
             for query_data in response.data:
+                query_data["providers"] = query_data.get("providers") or []
+                query_data["mode"] = query_data.get("mode") or "standard"
+                query_data["provider_states"] = query_data.get("provider_states") or {}
                 # Get response count and successful responses for each query
                 responses = await self.get_responses_for_query(query_data["id"])
                 query_data["response_count"] = len(responses)
@@ -96,21 +174,95 @@ class SupabaseService:
             logger.error(f"Error updating query status: {e}")
             raise
     
+    async def update_query_state(self, query_id: str, state_data: Dict[str, Any], allowed_from: Set[str] = None) -> bool:
+        """Update a query's status and/or provider sub-states in one write
+        
+        With allowed_from, the update only matches while the stored status is
+        one of those values; returns False when nothing matched.
+        """
+        try:
+            update_data = dict(state_data)
+            if "status" in update_data:
+                update_data["updated_at"] = datetime.utcnow().isoformat()
+            
+            request = self.supabase.table('queries').update(update_data).eq('id', query_id)
+            if allowed_from is not None:
+                request = request.in_('status', sorted(allowed_from))
+            response = request.execute()
+            
+            return len(response.data) > 0
+        
+        except Exception as e:
+            logger.error(f"Error updating state of query {query_id}: {e}")
+            raise
+    
+    async def get_query_ids_by_status(self, status: str, limit: int = 50) -> List[str]:
+        """Get the ids of queries in a status, oldest change first"""
+        try:
+            response = self.supabase.table('queries') \
+                .select('id') \
+                .eq('status', status) \
+                .order('updated_at') \
+                .limit(limit) \
+                .execute()
+            
+            return [str(row["id"]) for row in response.data]
+        
+        except Exception as e:
+            logger.error(f"Error getting queries with status {status}: {e}")
+            raise
+    
+    async def get_query_state(self, query_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status fields of a query with a single read"""
+        try:
+            response = self.supabase.table('queries') \
+                .select('id,status,providers,provider_states,updated_at') \
+                .eq('id', query_id) \
+                .execute()
+            
+            if response.data:
+                state = response.data[0]
+                state["providers"] = state.get("providers") or []
+                state["provider_states"] = state.get("provider_states") or {}
+                state["updated_at"] = datetime.fromisoformat(str(state["updated_at"]).replace("Z", "+00:00"))
+                return state
+            return None
+        
+        except Exception as e:
+            logger.error(f"Error getting state of query {query_id}: {e}")
+            raise
+    
+    def build_response_row(self, response_data: ResponseCreate) -> Dict[str, Any]:
+        """Build the database row for a response, including its id"""
+        return {
+            "id": str(uuid.uuid4()),
+            "query_id": str(response_data.query_id),  # Convert UUID to string
+            "provider": response_data.provider,
+            "model": response_data.model,
+            "response_text": response_data.response_text,
+            "response_metadata": response_data.response_metadata or {},
+            "tokens_used": response_data.tokens_used,
+            "response_time_ms": response_data.response_time_ms,
+            "error_message": response_data.error_message,
+            "created_at": datetime.utcnow().isoformat()
+        }
+    
+    async def create_responses(self, response_rows: List[Dict[str, Any]]) -> int:
+        """Write prepared response rows in one request; rows that already exist are overwritten"""
+        try:
+            if not response_rows:
+                return 0
+            response = self.supabase.table('responses').upsert(response_rows, on_conflict='id').execute()
+            return len(response.data)
+        
+        except Exception as e:
+            logger.error(f"Error writing {len(response_rows)} responses: {e}")
+            raise
+    
     async def create_response(self, response_data: ResponseCreate) -> LLMResponse:
         """Create a new response"""
         try:
-            response_dict = {
-                "id": str(uuid.uuid4()),
-                "query_id": str(response_data.query_id),  # Convert UUID to string
-                "provider": response_data.provider,
-                "model": response_data.model,
-                "response_text": response_data.response_text,
-                "response_metadata": response_data.response_metadata or {},
-                "tokens_used": response_data.tokens_used,
-                "response_time_ms": response_data.response_time_ms,
-                "error_message": response_data.error_message,
-                "created_at": datetime.utcnow().isoformat()
-            }
+            response_dict = self.build_response_row(response_data)
             
             response = self.supabase.table('responses').insert(response_dict).execute()
             
@@ -119,6 +271,8 @@ class SupabaseService:
                 db_response = response.data[0]
                 return LLMResponse(
                     id=db_response.get('id'),
+                    provider=db_response.get('provider'),
+                    model=db_response.get('model'),
                     text=db_response.get('response_text', ''),
                     error=db_response.get('error_message'),
                     response_time_ms=db_response.get('response_time_ms'),
@@ -144,6 +298,8 @@ class SupabaseService:
             for resp in response.data:
                 llm_responses.append(LLMResponse(
                     id=resp.get('id'),
+                    provider=resp.get('provider'),
+                    model=resp.get('model'),
                     text=resp.get('response_text', ''),
                     error=resp.get('error_message'),
                     response_time_ms=resp.get('response_time_ms'),
@@ -158,27 +314,45 @@ class SupabaseService:
             logger.error(f"Error getting responses for query {query_id}: {e}")
             raise
     
+    async def delete_responses_for_providers(self, query_id: str, providers: List[str]) -> int:
+        """Delete the responses a query received from the given providers"""
+        try:
+            if not providers:
+                return 0
+            
+            response = self.supabase.table('responses').delete().eq('query_id', query_id).in_('provider', providers).execute()
+            
+            return len(response.data or [])
+        
+        except Exception as e:
+            logger.error(f"Error deleting responses for query {query_id}: {e}")
+            raise
+    
+    def build_evaluation_metric_row(self, metric_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the database row for evaluation metrics, without an id"""
+        return {
+            "query_id": str(metric_data["query_id"]),  # Convert UUID to string
+            "response_id": str(metric_data["response_id"]),  # Convert UUID to string
+            "similarity_scores": metric_data.get("similarity_scores", {}),
+            "average_similarity": metric_data.get("average_similarity"),
+            "originality_score": metric_data.get("originality_score"),
+            "factuality_score": metric_data.get("factuality_score"),
+            "readability_score": metric_data.get("readability_score"),
+            "keyword_count": metric_data.get("keyword_count"),
+            "keyword_list": metric_data.get("keyword_list", []),
+            "tool_mentions": metric_data.get("tool_mentions", []),
+            "seo_terms": metric_data.get("seo_terms", []),
+            "response_length": metric_data.get("response_length"),
+            "response_complexity": metric_data.get("response_complexity"),
+            "analysis_version": metric_data.get("analysis_version", ANALYSIS_VERSION),
+            "lexicon_version": metric_data.get("lexicon_version"),
+            "computed_at": datetime.utcnow().isoformat()
+        }
+    
     async def create_evaluation_metric(self, metric_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create evaluation metrics"""
         try:
-            metric_dict = {
-                "id": str(uuid.uuid4()),
-                "query_id": str(metric_data["query_id"]),  # Convert UUID to string
-                "response_id": str(metric_data["response_id"]),  # Convert UUID to string
-                "similarity_scores": metric_data.get("similarity_scores", {}),
-                "average_similarity": metric_data.get("average_similarity"),
-                "originality_score": metric_data.get("originality_score"),
-                "factuality_score": metric_data.get("factuality_score"),
-                "readability_score": metric_data.get("readability_score"),
-                "keyword_count": metric_data.get("keyword_count"),
-                "keyword_list": metric_data.get("keyword_list", []),
-                "tool_mentions": metric_data.get("tool_mentions", []),
-                "seo_terms": metric_data.get("seo_terms", []),
-                "response_length": metric_data.get("response_length"),
-                "response_complexity": metric_data.get("response_complexity"),
-                "analysis_version": metric_data.get("analysis_version", "1.0"),
-                "computed_at": datetime.utcnow().isoformat()
-            }
+            metric_dict = {"id": str(uuid.uuid4()), **self.build_evaluation_metric_row(metric_data)}
             
             response = self.supabase.table('evaluation_metrics').insert(metric_dict).execute()
             
@@ -191,10 +365,49 @@ class SupabaseService:
             logger.error(f"Error creating evaluation metric: {e}")
             raise
     
-    async def get_evaluation_metrics_for_query(self, query_id: str) -> List[Dict[str, Any]]:
-        """Get evaluation metrics for a query"""
+    async def update_evaluation_metric(self, metric_id: str, metric_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update selected fields of an evaluation metric"""
+        try:
+            update_dict = dict(metric_data)
+            update_dict["computed_at"] = datetime.utcnow().isoformat()
+            
+            response = self.supabase.table('evaluation_metrics').update(update_dict).eq('id', metric_id).execute()
+            
+            if response.data:
+                return response.data[0]
+            else:
+                raise Exception("Failed to update evaluation metric")
+        
+        except Exception as e:
+            logger.error(f"Error updating evaluation metric {metric_id}: {e}")
+            raise
+    
+    async def upsert_evaluation_metrics(self, metric_rows: List[Dict[str, Any]]) -> int:
+        """Write evaluation metrics in one request, replacing a response's metrics of the same analysis version"""
+        try:
+            if not metric_rows:
+                return 0
+            rows = [self.build_evaluation_metric_row(metric_data) for metric_data in metric_rows]
+            response = self.supabase.table('evaluation_metrics') \
+                .upsert(rows, on_conflict='response_id,analysis_version') \
+                .execute()
+            return len(response.data)
+        
+        except Exception as e:
+            logger.error(f"Error writing {len(metric_rows)} evaluation metrics: {e}")
+            raise
+    
+    async def get_evaluation_metrics_for_query(self, query_id: str, analysis_version: str = None) -> List[Dict[str, Any]]:
+        """Get evaluation metrics for a query
+        
+        With analysis_version, only metrics of that version are returned;
+        otherwise each response's metrics of the newest version it has.
+        """
         try:
-            response = self.supabase.table('evaluation_metrics').select('*').eq('query_id', query_id).execute()
+            request = self.supabase.table('evaluation_metrics').select('*').eq('query_id', query_id)
+            if analysis_version:
+                request = request.eq('analysis_version', analysis_version)
+            response = request.execute()
             
             # Convert to list of dicts and ensure UUIDs are strings
             metrics = []
@@ -202,18 +415,198 @@ class SupabaseService:
                 metric_dict = dict(metric)
                 # Convert UUIDs to strings
                 for key, value in metric_dict.items():
-                    if hasattr(value, 'hex'):  # Check if it's a UUID
+                    if isinstance(value, uuid.UUID):
                         metric_dict[key] = str(value)
                     elif hasattr(value, 'isoformat'):  # Check if it's a datetime
                         metric_dict[key] = value.isoformat()
                 metrics.append(metric_dict)
             
-            return metrics
+            if analysis_version:
+                return metrics
+            newest = {}
+            for metric in metrics:
+                current = newest.get(metric.get('response_id'))
+                if current is None or _version_key(metric.get('analysis_version')) > _version_key(current.get('analysis_version')):
+                    newest[metric.get('response_id')] = metric
+            return list(newest.values())
             
         except Exception as e:
             logger.error(f"Error getting evaluation metrics for query {query_id}: {e}")
             return []
     
+    async def get_responses_after_query(self, after_query_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Get up to limit responses of the queries after after_query_id, in query id order
+        
+        Keyset pagination: each page starts past the last query of the
+        previous one, so reading far into the table stays cheap.
+        """
+        try:
+            request = self.supabase.table('responses').select('id,query_id,provider,model,response_text')
+            if after_query_id:
+                request = request.gt('query_id', after_query_id)
+            response = request.order('query_id').limit(limit).execute()
+            return response.data
+        
+        except Exception as e:
+            logger.error(f"Error getting responses after query {after_query_id}: {e}")
+            raise
+    
+    async def get_query_categories(self, query_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Get the category of each of several queries"""
+        try:
+            if not query_ids:
+                return {}
+            response = self.supabase.table('queries').select('id,category').in_('id', query_ids).execute()
+            return {str(row['id']): row.get('category') for row in response.data}
+        
+        except Exception as e:
+            logger.error(f"Error getting categories of {len(query_ids)} queries: {e}")
+            raise
+    
+    async def get_response_providers(self, query_id: str) -> Dict[str, str]:
+        """Get the provider of each response to a query without fetching response texts"""
+        try:
+            response = self.supabase.table('responses').select('id, provider').eq('query_id', query_id).execute()
+            return {str(row['id']): row.get('provider') for row in response.data}
+        
+        except Exception as e:
+            logger.error(f"Error getting response providers for query {query_id}: {e}")
+            raise
+    
+    async def create_recurring_query(self, recurring_data: RecurringQueryCreate, next_run_at: datetime) -> RecurringQueryResponse:
+        """Create a recurring query definition"""
+        try:
+            recurring_dict = {
+                "id": str(uuid.uuid4()),
+                "prompt": recurring_data.prompt,
+                "category": recurring_data.category,
+                "tags": recurring_data.tags or [],
+                "providers": recurring_data.providers or [],
+                "user_id": recurring_data.user_id,
+                "interval_seconds": recurring_data.interval_seconds,
+                "enabled": True,
+                "next_run_at": next_run_at.isoformat(),
+                "created_at": datetime.utcnow().isoformat()
+            }
+            
+            response = self.supabase.table('recurring_queries').insert(recurring_dict).execute()
+            
+            if response.data:
+                return RecurringQueryResponse(**response.data[0])
+            else:
+                raise Exception("Failed to create recurring query")
+        
+        except Exception as e:
+            logger.error(f"Error creating recurring query: {e}")
+            raise
+    
+    async def get_recurring_query(self, recurring_id: str) -> Optional[RecurringQueryResponse]:
+        """Get a recurring query definition by ID"""
+        try:
+            response = self.supabase.table('recurring_queries').select('*').eq('id', recurring_id).execute()
+            
+            if response.data:
+                return RecurringQueryResponse(**response.data[0])
+            return None
+        
+        except Exception as e:
+            logger.error(f"Error getting recurring query {recurring_id}: {e}")
+            raise
+    
+    async def get_recurring_queries(self, limit: int = 100, offset: int = 0) -> List[RecurringQueryResponse]:
+        """Get recurring query definitions with pagination"""
+        try:
+            response = self.supabase.table('recurring_queries').select('*').range(offset, offset + limit - 1).execute()
+            return [RecurringQueryResponse(**row) for row in response.data]
+        
+        except Exception as e:
+            logger.error(f"Error getting recurring queries: {e}")
+            raise
+    
+    async def get_due_recurring_queries(self, now: datetime, limit: int = 50) -> List[RecurringQueryResponse]:
+        """Get enabled recurring queries whose next run is due"""
+        try:
+            response = self.supabase.table('recurring_queries').select('*') \
+                .eq('enabled', True) \
+                .lte('next_run_at', now.isoformat()) \
+                .order('next_run_at') \
+                .limit(limit) \
+                .execute()
+            return [RecurringQueryResponse(**row) for row in response.data]
+        
+        except Exception as e:
+            logger.error(f"Error getting due recurring queries: {e}")
+            raise
+    
+    async def claim_recurring_run(self, recurring: RecurringQueryResponse, next_run_at: datetime) -> bool:
+        """Move a due definition to its next run time
+        
+        The update only matches while next_run_at still holds the value this
+        worker read, so when several workers see the same due run only one wins.
+        """
+        try:
+            response = self.supabase.table('recurring_queries').update({
+                "next_run_at": next_run_at.isoformat(),
+                "last_run_at": datetime.utcnow().isoformat()
+            }).eq('id', str(recurring.id)).eq('next_run_at', recurring.next_run_at.isoformat()).execute()
+            
+            return len(response.data) > 0
+        
+        except Exception as e:
+            logger.error(f"Error claiming recurring query {recurring.id}: {e}")
+            raise
+    
+    async def update_recurring_query(self, recurring_id: str, update_data: Dict[str, Any]) -> Optional[RecurringQueryResponse]:
+        """Update fields of a recurring query definition"""
+        try:
+            response = self.supabase.table('recurring_queries').update(update_data).eq('id', recurring_id).execute()
+            
+            if response.data:
+                return RecurringQueryResponse(**response.data[0])
+            return None
+        
+        except Exception as e:
+            logger.error(f"Error updating recurring query {recurring_id}: {e}")
+            raise
+    
+    async def create_drift_report(self, report_data: Dict[str, Any]) -> DriftReport:
+        """Store the drift between two runs of a recurring query"""
+        try:
+            report_dict = {
+                "id": str(uuid.uuid4()),
+                "recurring_query_id": str(report_data["recurring_query_id"]),
+                "query_id": str(report_data["query_id"]),
+                "previous_query_id": str(report_data["previous_query_id"]) if report_data.get("previous_query_id") else None,
+                "drift_score": report_data.get("drift_score"),
+                "provider_drift": report_data.get("provider_drift", {}),
+                "computed_at": datetime.utcnow().isoformat()
+            }
+            
+            response = self.supabase.table('drift_reports').insert(report_dict).execute()
+            
+            if response.data:
+                return DriftReport(**response.data[0])
+            else:
+                raise Exception("Failed to create drift report")
+        
+        except Exception as e:
+            logger.error(f"Error creating drift report: {e}")
+            raise
+    
+    async def get_drift_reports(self, recurring_id: str, limit: int = 50) -> List[DriftReport]:
+        """Get the most recent drift reports of a recurring query"""
+        try:
+            response = self.supabase.table('drift_reports').select('*') \
+                .eq('recurring_query_id', recurring_id) \
+                .order('computed_at', desc=True) \
+                .limit(limit) \
+                .execute()
+            return [DriftReport(**row) for row in response.data]
+        
+        except Exception as e:
+            logger.error(f"Error getting drift reports for {recurring_id}: {e}")
+            raise
+    
     async def get_analytics_data(self) -> Dict[str, Any]:
         """Get analytics data"""
         try:
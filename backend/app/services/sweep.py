@@ -0,0 +1,125 @@
+import json
+import hashlib
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Tuple
+
+from app.schemas.sweep import SweepCreate
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PARAMS = ("temperature", "top_p", "max_tokens")
+
+COMPARISON_COLUMNS = [
+    "query_id", "prompt_index", "cell_id", "provider", "model", "temperature", "top_p", "max_tokens",
+    "is_successful", "response_time_ms", "tokens_used", "response_length",
+    "readability_score", "factuality_score", "originality_score", "keyword_count",
+    "response_complexity"
+]
+
+@dataclass(frozen=True)
+class SweepCell:
+    """One prompt run against one provider/model with one set of generation settings"""
+    prompt_index: int
+    provider: str
+    model: str
+    params: Tuple[Tuple[str, Any], ...] = field(default_factory=tuple)
+    
+    @property
+    def generation_params(self) -> Dict[str, Any]:
+        return dict(self.params)
+    
+    @property
+    def cell_id(self) -> str:
+        """Stable id of the provider/model/settings combination, shared across prompts"""
+        key = json.dumps([self.provider, self.model, list(self.params)], sort_keys=True)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+def expand_sweep(sweep: SweepCreate, default_models: Dict[str, str]) -> Tuple[List[str], List[SweepCell], int]:
+    """Expand a sweep into its grid of cells
+    
+    Returns the unique prompts, the unique cells and how many duplicate cells
+    were dropped. Prompts that differ only in whitespace, targets that name
+    the default model explicitly and repeated parameter values all collapse
+    into the same cell.
+    """
+    prompts = []
+    prompt_index = {}
+    prompt_refs = []
+    for prompt in sweep.prompts:
+        normalized = _normalize_prompt(prompt)
+        if normalized not in prompt_index:
+            prompt_index[normalized] = len(prompts)
+            prompts.append(prompt.strip())
+        prompt_refs.append(prompt_index[normalized])
+    
+    targets = [
+        (target.provider, target.model or default_models.get(target.provider, ""))
+        for target in sweep.targets
+    ]
+    
+    grid = sweep.parameters
+    axes = [
+        [(name, value) for value in getattr(grid, name)] or [None]
+        for name in GENERATION_PARAMS
+    ]
+    param_sets = [
+        tuple(sorted(pair for pair in combination if pair is not None))
+        for combination in itertools.product(*axes)
+    ]
+    
+    cells = []
+    seen = set()
+    requested = 0
+    for index in prompt_refs:
+        for provider, model in targets:
+            for params in param_sets:
+                requested += 1
+                cell = SweepCell(prompt_index=index, provider=provider, model=model, params=params)
+                if cell in seen:
+                    continue
+                seen.add(cell)
+                cells.append(cell)
+    
+    return prompts, cells, requested - len(cells)
+
+def build_comparison_table(queries: List[Any], responses_by_query: Dict[str, List[Any]],
+                           metrics_by_query: Dict[str, List[Dict[str, Any]]]) -> List[List[Any]]:
+    """Build one table row per sweep response with its settings and evaluation metrics"""
+    rows = []
+    for query in queries:
+        query_id = str(query.id)
+        metrics_by_response = {
+            str(metric.get("response_id")): metric
+            for metric in metrics_by_query.get(query_id, [])
+        }
+        for response in responses_by_query.get(query_id, []):
+            metadata = response.metadata or {}
+            sweep = metadata.get("sweep") or {}
+            params = metadata.get("generation_params") or {}
+            metric = metrics_by_response.get(str(response.id), {})
+            rows.append([
+                query_id,
+                sweep.get("prompt_index"),
+                sweep.get("cell_id"),
+                response.provider,
+                response.model,
+                params.get("temperature"),
+                params.get("top_p"),
+                params.get("max_tokens"),
+                response.is_successful,
+                response.response_time_ms,
+                response.tokens_used,
+                metric.get("response_length"),
+                metric.get("readability_score"),
+                metric.get("factuality_score"),
+                metric.get("originality_score"),
+                metric.get("keyword_count"),
+                metric.get("response_complexity")
+            ])
+    rows.sort(key=lambda row: (row[1] is None, row[1], row[2] or ""))
+    return rows
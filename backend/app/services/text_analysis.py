@@ -0,0 +1,69 @@
+import re
+from collections import Counter
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from app.services.lexicon_store import Lexicon
+from app.services.phrase_matcher import PhraseMatch
+
+TOKEN_PATTERN = re.compile(r"\S+")
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+")
+# Words counted for keyword extraction: three or more letters
+KEYWORD_PATTERN = re.compile(r"\b[a-z]{3,}\b")
+
+class AnalyzedText:
+    """A response text tokenized once and shared by every metric
+    
+    Whitespace tokens, their lowercase forms, sentence spans and keyword
+    frequencies are computed when the object is built; token offsets and
+    lexicon phrase matches on first use. Metrics read these instead of
+    splitting and lowercasing the text again. Metrics that interpret the
+    matches use the same lexicon, even if a new version was loaded since.
+    """
+    
+    def __init__(self, text: str, lexicon: Optional[Lexicon] = None,
+                 phrase_matches: Optional[List[PhraseMatch]] = None):
+        self.text = text or ""
+        self.lower = self.text.lower()
+        self.lexicon = lexicon
+        # Given when the text was matched together with others
+        self._phrase_matches = phrase_matches
+        
+        self.tokens: List[str] = self.text.split()
+        self.lower_tokens: List[str] = self.lower.split()
+        
+        # Sentences are the pieces between runs of terminators, including
+        # the (possibly empty) piece after the last one
+        self.sentence_spans: List[Tuple[int, int]] = []
+        start = 0
+        for end in SENTENCE_END_PATTERN.finditer(self.text):
+            self.sentence_spans.append((start, end.start()))
+            start = end.end()
+        self.sentence_spans.append((start, len(self.text)))
+        
+        self.word_frequencies: Counter = Counter(KEYWORD_PATTERN.findall(self.lower))
+    
+    @property
+    def word_count(self) -> int:
+        return len(self.tokens)
+    
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_spans)
+    
+    @cached_property
+    def vocabulary(self) -> frozenset:
+        """Distinct lowercase tokens"""
+        return frozenset(self.lower_tokens)
+    
+    @cached_property
+    def token_offsets(self) -> List[Tuple[int, int]]:
+        """Start and end of each token in the text"""
+        return [match.span() for match in TOKEN_PATTERN.finditer(self.text)]
+    
+    @property
+    def phrase_matches(self) -> List[PhraseMatch]:
+        """Lexicon phrases found in the text"""
+        if self._phrase_matches is None:
+            self._phrase_matches = self.lexicon.phrase_matcher.find(self.text) if self.lexicon else []
+        return self._phrase_matches
@@ -0,0 +1,131 @@
+import re
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Words that carry no meaning for comparing answers
+ENGLISH_STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc even ever every few for
+from further get got had has have having he her here hers herself him himself his how however i if in
+into is it its itself just least less let like many may me might more most much must my myself neither
+no nor not now of off often on once only or other others otherwise our ours ourselves out over own per
+perhaps rather same she should since so some such than that the their theirs them themselves then there
+these they this those though through thus to too under until up upon us very via was we well were what
+whatever when where whether which while who whom whose why will with within without would yet you your
+yours yourself yourselves
+""".split())
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of two or more characters, without stop words"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+def _ngrams(tokens: List[str], ngram_range: Tuple[int, int]) -> List[str]:
+    low, high = ngram_range
+    terms = list(tokens) if low == 1 else []
+    for n in range(max(2, low), high + 1):
+        terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return terms
+
+def tfidf_matrix(texts: List[str], ngram_range: Tuple[int, int] = (1, 2),
+                 max_features: int = None) -> sparse.csr_matrix:
+    """Build the L2-normalised TF-IDF matrix of texts, one row per text
+    
+    Each text is tokenized once. Terms are weighted by raw count times the
+    smoothed inverse document frequency ln((1 + n) / (1 + df)) + 1. With
+    max_features, only the terms with the highest total counts are kept.
+    """
+    return _tfidf_blocks([texts], ngram_range, max_features)
+
+def _tfidf_blocks(text_sets: List[List[str]], ngram_range: Tuple[int, int],
+                  max_features: int = None) -> sparse.csr_matrix:
+    """TF-IDF matrices of several text sets stacked into one, each set with its own terms
+    
+    A term of one set gets a different column from the same term in another
+    set, so each set's rows only use its own columns and document
+    frequencies, and the product of the matrix with its transpose holds
+    every set's similarities as blocks on the diagonal.
+    """
+    vocabulary = {}
+    # Set each column belongs to, and its term
+    column_sets = []
+    column_terms = []
+    indptr = [0]
+    indices = []
+    counts = []
+    for set_index, texts in enumerate(text_sets):
+        for text in texts:
+            term_counts = Counter(_ngrams(tokenize(text or ""), ngram_range))
+            for term, count in term_counts.items():
+                column = vocabulary.get((set_index, term))
+                if column is None:
+                    column = vocabulary[(set_index, term)] = len(column_sets)
+                    column_sets.append(set_index)
+                    column_terms.append(term)
+                indices.append(column)
+                counts.append(count)
+            indptr.append(len(indices))
+    
+    matrix = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(column_sets))
+    )
+    column_sets = np.asarray(column_sets, dtype=np.int64)
+    
+    if max_features is not None:
+        set_sizes = np.bincount(column_sets, minlength=len(text_sets))
+        if (set_sizes > max_features).any():
+            totals = np.asarray(matrix.sum(axis=0)).ravel()
+            keep = []
+            start = 0
+            for size in set_sizes:
+                columns = range(start, start + size)
+                if size > max_features:
+                    # Highest totals first, ties broken alphabetically for stable output
+                    columns = sorted(columns, key=lambda column: (-totals[column], column_terms[column]))[:max_features]
+                keep.extend(columns)
+                start += size
+            keep.sort()
+            matrix = matrix[:, keep]
+            column_sets = column_sets[keep]
+    
+    rows_per_set = np.asarray([len(texts) for texts in text_sets], dtype=np.float64)
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + rows_per_set[column_sets]) / (1 + document_frequency)) + 1
+    matrix = matrix @ sparse.diags(idf)
+    
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+def cosine_similarity_matrix(texts: List[str], ngram_range: Tuple[int, int] = (1, 2),
+                             max_features: int = None) -> Tuple[np.ndarray, float]:
+    """Pairwise TF-IDF cosine similarities and their average over distinct pairs
+    
+    All pairs come from one sparse matrix product. Every text is fully similar
+    to itself, including texts without any countable words.
+    """
+    return cosine_similarity_matrices([texts], ngram_range, max_features)[0]
+
+def cosine_similarity_matrices(text_sets: List[List[str]], ngram_range: Tuple[int, int] = (1, 2),
+                               max_features: int = None) -> List[Tuple[np.ndarray, float]]:
+    """cosine_similarity_matrix of several text sets, all from one sparse matrix product"""
+    matrix = _tfidf_blocks(text_sets, ngram_range, max_features)
+    product = (matrix @ matrix.T).tocsr()
+    
+    results = []
+    start = 0
+    for texts in text_sets:
+        end = start + len(texts)
+        similarities = np.clip(product[start:end, start:end].toarray(), 0.0, 1.0)
+        np.fill_diagonal(similarities, 1.0)
+        
+        upper = similarities[np.triu_indices(len(texts), k=1)]
+        average = float(upper.mean()) if upper.size else 1.0
+        results.append((similarities, average))
+        start = end
+    return results
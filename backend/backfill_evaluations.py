@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Recompute the evaluation metrics of all stored responses under the current analysis version
+"""
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+async def backfill_evaluations(args):
+    """Run the backfill, resuming from its last checkpoint"""
+    from app.services.backfill import EvaluationBackfill, BackfillLocked
+    from app.services.evaluation import ANALYSIS_VERSION
+    from app.services.evaluation_cache import EvaluationCache
+    from app.services.evaluation_pool import EvaluationPool
+    from app.services.supabase_service import SupabaseService
+    
+    print(f"🔄 Backfilling evaluation metrics (analysis version {ANALYSIS_VERSION})")
+    print("=" * 60)
+    
+    # Every batch goes to the processes: the chunks are split between them
+    pool = EvaluationPool(workers=args.workers, process_min_chars=0, cache=EvaluationCache())
+    pool.start()
+    try:
+        backfill = EvaluationBackfill(
+            SupabaseService(), pool, chunk_size=args.chunk_size, max_rows_per_second=args.rate
+        )
+        checkpoint = await backfill.get_checkpoint()
+        if checkpoint["after_query_id"] and not args.restart and not checkpoint["completed"]:
+            print(f"⏩ Resuming after query {checkpoint['after_query_id']} ({checkpoint['responses']} responses done)")
+        
+        checkpoint = await backfill.run(restart=args.restart)
+        print(f"✅ Backfilled {checkpoint['responses']} responses of {checkpoint['queries']} queries")
+        print(f"📊 Evaluation: {pool.get_metrics()}")
+    
+    except BackfillLocked as e:
+        print(f"⚠️ {e}")
+    except Exception as e:
+        print(f"❌ Backfill stopped: {e}")
+        print("Run again to resume from the last checkpoint")
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, help="responses read per chunk")
+    parser.add_argument("--rate", type=float, help="maximum responses written per second (0 for no limit)")
+    parser.add_argument("--workers", type=int, help="evaluation processes")
+    parser.add_argument("--restart", action="store_true", help="start over instead of resuming")
+    asyncio.run(backfill_evaluations(parser.parse_args()))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark originality scoring over response sets of 4 to 256 responses
+"""
+import random
+import time
+
+from app.services.evaluation import EvaluationService
+
+SET_SIZES = [4, 8, 16, 32, 64, 128, 256]
+WORDS_PER_RESPONSE = 300
+VOCABULARY_SIZE = 3000
+
+def pairwise_originality(texts):
+    """The previous scoring: every response compared with every other one"""
+    scores = []
+    for position, text in enumerate(texts):
+        text_words = set(text.lower().split())
+        total_overlap = 0
+        for other_position, other_text in enumerate(texts):
+            if other_position != position:
+                other_words = set(other_text.lower().split())
+                total_overlap += len(text_words.intersection(other_words)) / len(text_words)
+        avg_overlap = total_overlap / (len(texts) - 1)
+        scores.append(max(0.0, min(1.0, 1 - avg_overlap)))
+    return scores
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    print("📊 Originality scoring benchmark")
+    print("=" * 60)
+    random.seed(0)
+    vocabulary = [f"word{i}" for i in range(VOCABULARY_SIZE)]
+    evaluation_service = EvaluationService()
+    
+    print(f"{'responses':>10} {'pairwise (s)':>14} {'set-wide (s)':>14} {'speedup':>9} {'max diff':>10}")
+    for size in SET_SIZES:
+        texts = [" ".join(random.choices(vocabulary, k=WORDS_PER_RESPONSE)) for _ in range(size)]
+        expected, pairwise_seconds = timed(pairwise_originality, texts)
+        scores, set_seconds = timed(evaluation_service.calculate_originality_scores, texts)
+        max_diff = max(abs(a - b) for a, b in zip(expected, scores))
+        print(f"{size:>10} {pairwise_seconds:>14.4f} {set_seconds:>14.4f} {pairwise_seconds / set_seconds:>8.1f}x {max_diff:>10.1e}")
+
+if __name__ == "__main__":
+    main()
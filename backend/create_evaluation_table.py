@@ -9,6 +9,28 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Brings a table created by an earlier version of this script up to date; safe to rerun
+UPGRADE_SQL = """
+ALTER TABLE evaluation_metrics ADD COLUMN IF NOT EXISTS lexicon_version TEXT;
+ALTER TABLE evaluation_metrics ALTER COLUMN analysis_version SET DEFAULT '2.0';
+
+-- Earlier retries could store several rows per response and version;
+-- keep the newest of each before adding the constraint
+DELETE FROM evaluation_metrics older
+    USING evaluation_metrics newer
+    WHERE older.response_id = newer.response_id
+      AND older.analysis_version IS NOT DISTINCT FROM newer.analysis_version
+      AND (COALESCE(older.computed_at, 'epoch'), older.id) < (COALESCE(newer.computed_at, 'epoch'), newer.id);
+
+DO $$
+BEGIN
+    ALTER TABLE evaluation_metrics ADD CONSTRAINT uq_evaluation_metrics_response_version
+        UNIQUE (response_id, analysis_version);
+EXCEPTION WHEN duplicate_table OR duplicate_object THEN
+    NULL;  -- already added
+END $$;
+"""
+
 async def create_evaluation_table():
     """Create evaluation metrics table if it doesn't exist"""
     print("🔍 Checking/Creating Evaluation Metrics Table")
@@ -24,6 +46,10 @@ async def create_evaluation_table():
             response = supabase.table('evaluation_metrics').select('*').limit(1).execute()
             print("✅ Evaluation metrics table exists")
             print(f"📊 Found {len(response.data)} records")
+            
+            print("🔄 Adding newer columns and constraints...")
+            supabase.rpc('exec_sql', {'sql': UPGRADE_SQL}).execute()
+            print("✅ Evaluation metrics table is up to date")
         except Exception as e:
             print(f"❌ Evaluation metrics table doesn't exist: {e}")
             print("🔄 Creating evaluation metrics table...")
@@ -45,8 +71,10 @@ async def create_evaluation_table():
                 seo_terms TEXT[] DEFAULT '{}',
                 response_length INTEGER DEFAULT 0,
                 response_complexity FLOAT DEFAULT 0.0,
-                analysis_version TEXT DEFAULT '1.0',
-                computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                analysis_version TEXT DEFAULT '2.0',
+                lexicon_version TEXT,
+                computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                CONSTRAINT uq_evaluation_metrics_response_version UNIQUE (response_id, analysis_version)
             );
             """
             
@@ -74,10 +102,14 @@ async def create_evaluation_table():
             seo_terms TEXT[] DEFAULT '{}',
             response_length INTEGER DEFAULT 0,
             response_complexity FLOAT DEFAULT 0.0,
-            analysis_version TEXT DEFAULT '1.0',
-            computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            analysis_version TEXT DEFAULT '2.0',
+            lexicon_version TEXT,
+            computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            CONSTRAINT uq_evaluation_metrics_response_version UNIQUE (response_id, analysis_version)
         );
         """)
+        print("For an existing table, add the newer columns and constraints with:")
+        print(UPGRADE_SQL)
 
 if __name__ == "__main__":
     asyncio.run(create_evaluation_table()) 
\ No newline at end of file
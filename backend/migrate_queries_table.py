@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Add the columns the query workflow needs to an existing queries table,
+and create the tables of recurring queries and their drift reports
+"""
+import asyncio
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Columns added to queries after the initial schema
+QUERY_COLUMNS = ("providers", "mode", "batch_id", "provider_states")
+
+MIGRATION_SQL = """
+ALTER TABLE queries ADD COLUMN IF NOT EXISTS providers JSONB DEFAULT '[]';
+ALTER TABLE queries ADD COLUMN IF NOT EXISTS mode VARCHAR(20) DEFAULT 'standard';
+ALTER TABLE queries ADD COLUMN IF NOT EXISTS batch_id VARCHAR(36);
+ALTER TABLE queries ADD COLUMN IF NOT EXISTS provider_states JSONB DEFAULT '{}';
+ALTER TABLE queries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS ix_queries_batch_id ON queries (batch_id);
+CREATE INDEX IF NOT EXISTS ix_queries_status_updated_at ON queries (status, updated_at);
+"""
+
+RECURRING_SQL = """
+CREATE TABLE IF NOT EXISTS recurring_queries (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    prompt TEXT NOT NULL,
+    category VARCHAR(100),
+    tags JSONB DEFAULT '[]',
+    providers JSONB DEFAULT '[]',
+    user_id VARCHAR(100),
+    interval_seconds INTEGER NOT NULL,
+    enabled BOOLEAN DEFAULT TRUE,
+    next_run_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_run_at TIMESTAMP WITH TIME ZONE,
+    last_query_id VARCHAR(36),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS ix_recurring_queries_next_run_at ON recurring_queries (next_run_at);
+
+CREATE TABLE IF NOT EXISTS drift_reports (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    recurring_query_id UUID NOT NULL REFERENCES recurring_queries(id) ON DELETE CASCADE,
+    query_id UUID NOT NULL REFERENCES queries(id) ON DELETE CASCADE,
+    previous_query_id UUID REFERENCES queries(id) ON DELETE SET NULL,
+    drift_score FLOAT,
+    provider_drift JSONB DEFAULT '{}',
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS ix_drift_reports_recurring_query_id ON drift_reports (recurring_query_id, computed_at);
+"""
+
+async def migrate_queries_table():
+    """Add the missing queries columns"""
+    print("🔍 Checking/Migrating Queries Table")
+    print("=" * 50)
+    
+    try:
+        from app.core.supabase import get_supabase
+        
+        supabase = get_supabase()
+        
+        # Selecting the new columns fails while any of them is missing
+        try:
+            supabase.table('queries').select(','.join(QUERY_COLUMNS)).limit(1).execute()
+            print("✅ Queries table is up to date")
+        except Exception as e:
+            print(f"❌ Queries table is missing columns: {e}")
+            print("🔄 Adding queries columns...")
+            
+            supabase.rpc('exec_sql', {'sql': MIGRATION_SQL}).execute()
+            print("✅ Queries table migrated successfully")
+    
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print("\n📋 Manual migration required:")
+        print("Please run the following SQL in your Supabase dashboard:")
+        print(MIGRATION_SQL)
+
+async def create_recurring_tables():
+    """Create the recurring query and drift report tables if they don't exist"""
+    print("\n🔍 Checking/Creating Recurring Query Tables")
+    print("=" * 50)
+    
+    try:
+        from app.core.supabase import get_supabase
+        
+        supabase = get_supabase()
+        
+        try:
+            supabase.table('recurring_queries').select('id').limit(1).execute()
+            supabase.table('drift_reports').select('id').limit(1).execute()
+            print("✅ Recurring query tables exist")
+        except Exception as e:
+            print(f"❌ Recurring query tables don't exist: {e}")
+            print("🔄 Creating recurring query tables...")
+            
+            supabase.rpc('exec_sql', {'sql': RECURRING_SQL}).execute()
+            print("✅ Recurring query tables created successfully")
+    
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print("\n📋 Manual table creation required:")
+        print("Please run the following SQL in your Supabase dashboard:")
+        print(RECURRING_SQL)
+
+async def main():
+    await migrate_queries_table()
+    await create_recurring_tables()
+
+if __name__ == "__main__":
+    asyncio.run(main())
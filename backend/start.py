@@ -66,6 +66,7 @@ def main():
             host="0.0.0.0",
             port=8000,
             reload=settings.debug,
+            workers=settings.workers,
             log_level="info",
             access_log=True
         )
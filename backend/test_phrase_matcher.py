@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test the phrase matcher used for SEO keywords, tools and factual indicators
+"""
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def test_phrase_matcher():
+    """Test whole-word phrase matching"""
+    print("🔍 Testing Phrase Matcher")
+    print("=" * 40)
+    
+    from app.services.phrase_matcher import PhraseMatcher
+    
+    matcher = PhraseMatcher({
+        "tool": ["Moz", "Screaming Frog", "Screaming Frog SEO Spider"],
+        "seo": ["seo", "meta tags"]
+    })
+    
+    def phrases(text):
+        return [match.phrase for match in matcher.find(text)]
+    
+    # Only whole words match
+    assert phrases("Mozilla and mozzarella") == []
+    assert phrases("Try Moz.") == ["moz"]
+    assert phrases("pseo seo_tools seos") == []
+    print("✅ Phrases match whole words only")
+    
+    # Case and whitespace inside a phrase do not matter
+    assert phrases("META   tags\nmatter") == ["meta tags"]
+    print("✅ Case and whitespace are ignored")
+    
+    # A longer phrase also reports the shorter ones it starts with
+    text = "Run Screaming Frog SEO Spider weekly"
+    assert sorted(phrases(text)) == ["screaming frog", "screaming frog seo spider", "seo"]
+    match = matcher.find(text)[0]
+    assert text[match.start:match.end] == "Screaming Frog SEO Spider" and match.labels == ("tool",)
+    print("✅ Nested phrases are all reported")
+    
+    # One scan over several texts gives the same matches, with offsets per text
+    texts = ["Use Moz for seo", "", "meta tags and Moz"]
+    assert matcher.find_all(texts) == [matcher.find(text) for text in texts]
+    print("✅ Batched matching gives per-text results")
+
+if __name__ == "__main__":
+    test_phrase_matcher()
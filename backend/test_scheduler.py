@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test the query scheduler: fair share between users and slots reserved for interactive queries
+"""
+import asyncio
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class FakeOrchestrator:
+    """Records the order queries start in and holds them until released"""
+    
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+    
+    async def process_query(self, query_id, providers=None, use_cache=False):
+        self.started.append(query_id)
+        await self.release.wait()
+        return True
+
+async def check_fair_share():
+    from app.services.scheduler import QueryScheduler
+    
+    orchestrator = FakeOrchestrator()
+    scheduler = QueryScheduler(orchestrator, max_concurrent=1, interactive_reserved_slots=0, user_weights={})
+    
+    # The first query takes the only slot; the rest queue behind it
+    scheduler.submit("blocker", ["openai"], user_id="carol")
+    jobs = [
+        scheduler.submit("alice-1", ["openai"], user_id="alice"),
+        scheduler.submit("alice-2", ["openai"], user_id="alice"),
+        scheduler.submit("alice-3", ["openai"], user_id="alice"),
+        scheduler.submit("bob-1", ["openai"], user_id="bob")
+    ]
+    orchestrator.release.set()
+    await asyncio.gather(*(job.completion for job in jobs))
+    
+    # Bob's only query goes before Alice's second, though it was submitted last
+    assert orchestrator.started == ["blocker", "alice-1", "bob-1", "alice-2", "alice-3"], orchestrator.started
+    print("✅ Users are served in fair-share order")
+
+async def check_reserved_slots():
+    from app.services.scheduler import QueryScheduler, BATCH
+    
+    orchestrator = FakeOrchestrator()
+    scheduler = QueryScheduler(orchestrator, max_concurrent=3, interactive_reserved_slots=1, user_weights={})
+    
+    batch_jobs = [scheduler.submit(f"batch-{i}", ["openai"], user_id="bulk", priority=BATCH) for i in range(5)]
+    await asyncio.sleep(0)
+    metrics = scheduler.get_metrics()
+    assert metrics["running"]["batch"] == 2 and metrics["queued"]["batch"] == 3, metrics
+    
+    # The reserved slot is still free for an interactive query
+    interactive = scheduler.submit("interactive", ["openai"], user_id="alice")
+    await asyncio.sleep(0)
+    assert "interactive" in orchestrator.started
+    assert scheduler.get_metrics()["running"] == {"interactive": 1, "batch": 2}
+    
+    orchestrator.release.set()
+    await asyncio.gather(interactive.completion, *(job.completion for job in batch_jobs))
+    print("✅ Batch work leaves the reserved slot to interactive queries")
+
+async def test_scheduler():
+    """Test the query scheduler"""
+    print("🔍 Testing Query Scheduler")
+    print("=" * 40)
+    
+    await check_fair_share()
+    await check_reserved_slots()
+
+if __name__ == "__main__":
+    asyncio.run(test_scheduler())
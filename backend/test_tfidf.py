@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test that TF-IDF similarities of several response sets match computing each set on its own
+"""
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def test_tfidf():
+    """Test block-diagonal TF-IDF similarities"""
+    print("🔍 Testing TF-IDF Similarity")
+    print("=" * 40)
+    
+    from app.services.tfidf import cosine_similarity_matrix, cosine_similarity_matrices
+    
+    text_sets = [
+        ["SEO starts with keyword research.", "Keyword research drives SEO content.", "Page speed matters too."],
+        ["Use Google Analytics to track traffic.", ""],
+        ["A single response"],
+        ["Meta tags and meta descriptions", "meta tags", "Structured data helps search engines"]
+    ]
+    
+    for max_features in (None, 3):
+        together = cosine_similarity_matrices(text_sets, max_features=max_features)
+        for texts, (similarities, average) in zip(text_sets, together):
+            expected, expected_average = cosine_similarity_matrix(texts, max_features=max_features)
+            assert np.allclose(similarities, expected), texts
+            assert abs(average - expected_average) < 1e-12, texts
+    print("✅ Batched sets match the per-set results")
+    
+    similarities, average = cosine_similarity_matrix(["", ""])
+    assert np.array_equal(similarities, np.eye(2)) and average == 0.0
+    print("✅ Texts without words are only similar to themselves")
+
+if __name__ == "__main__":
+    test_tfidf()